@@ -0,0 +1,76 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Logging setup
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class CaptionCache:
+    def __init__(self, path="logs/caption_cache.json", max_entries=5000, ttl_seconds=30 * 24 * 3600):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.load()
+
+    @staticmethod
+    def make_key(gloss, model_name, template_hash):
+        return f"{model_name}|{template_hash}|{gloss}"
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r") as f:
+                self.entries = OrderedDict(json.load(f))
+            self.evict()
+        except Exception as e:
+            logger.error(f"Failed to load caption cache '{self.path}': {e}")
+            self.entries = OrderedDict()
+
+    def save(self):
+        if not self.path:
+            return
+        with self.lock:
+            self.evict()
+            data = json.dumps(self.entries)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(data)
+        os.replace(tmp_path, self.path)
+
+    def evict(self):
+        # Drop expired entries, then the least recently used ones above the size limit
+        cutoff = time.time() - self.ttl_seconds
+        for key in [k for k, e in self.entries.items() if e["created"] < cutoff]:
+            del self.entries[key]
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry["created"] < time.time() - self.ttl_seconds:
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry
+
+    def put(self, key, caption, latency=0.0):
+        with self.lock:
+            self.entries[key] = {"caption": caption, "latency": round(latency, 4), "created": time.time()}
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self.entries)
@@ -1,9 +1,17 @@
+import argparse
+import asyncio
+import hashlib
+import json
 import logging
+import os
 import re
-from langchain.chat_models import ChatOpenAI
-from langchain.prompts import PromptTemplate
-from langchain.schema import HumanMessage
-from langchain.chains import LLMChain
+import threading
+import time
+
+from agents.caption_cache import CaptionCache
+from agents.llm_client import get_client
+from agents.logger import SessionLogger
+from agents.metrics import metrics
 
 # Logging setup
 logging.basicConfig(level=logging.INFO)
@@ -11,10 +19,23 @@ logger = logging.getLogger(__name__)
 
 
 class Captioner:
-    def __init__(self, model_name="gpt-3.5-turbo"):
-        self.llm = ChatOpenAI(model_name=model_name, temperature=0.4)
+    def __init__(self, model_name="gpt-3.5-turbo", cache=None, use_exact_matches=True, client=None,
+                 backend="remote", local_model="google/flan-t5-base"):
+        self.model_name = model_name
+        # Shared LLMClient unless one is passed in (tests, replay)
+        self._client = client
+        # "remote" asks model_name through the LLM client, "local" runs local_model in-process
+        self.backend = backend
+        self.local_model = local_model
+        self._local = None
+        self.cache = cache if cache is not None else CaptionCache()
+        self.use_exact_matches = use_exact_matches
+        self.stats_lock = threading.Lock()
+        self.stats = {"exact_hits": 0, "cache_hits": 0, "misses": 0, "model_seconds": 0.0, "saved_seconds": 0.0,
+                      "batch_requests": 0, "batched_glosses": 0, "batch_fallbacks": 0,
+                      "round_trips_saved": 0, "prompt_tokens_saved": 0}
 
-        prompt_template = """
+        self.prompt_template = """
 You are an expert in translating sign language glosses into natural, grammatically correct English sentences. Glosses are concise, often in all caps, with words in a specific order. Your task is to interpret the glosses and generate a single, natural English sentence that conveys the most logical meaning. If the gloss implies a question, use question phrasing. If it implies a statement, use declarative phrasing. Ensure proper capitalization and punctuation. Only output the translated sentence, nothing else.
 
 Examples:
@@ -27,8 +48,51 @@ Examples:
 Now translate the following gloss into a natural English sentence:
 {glosses}
 →"""
-        prompt = PromptTemplate.from_template(prompt_template)
-        self.chain = LLMChain(llm=self.llm, prompt=prompt)
+        self.template_hash = hashlib.sha1(self.prompt_template.encode("utf-8")).hexdigest()[:12]
+
+        # Same instructions and examples, for all of a lesson's glosses at once
+        self.batch_template = self.prompt_template.split("Now translate")[0] + """Now translate each of the following glosses into a natural English sentence. Answer with a numbered list in the same order, one sentence per line, nothing else:
+{glosses}"""
+
+        # Glosses we can answer without the model, seeded with the few-shot examples
+        self.exact_matches = {}
+        for gloss, caption in re.findall(r"^- (.+?) → (.+)$", self.prompt_template, flags=re.MULTILINE):
+            self.exact_matches[self.preprocess_gloss(gloss)] = caption.strip()
+        # Learned ones are kept next to the caption cache, so startup never scans the session logs
+        self.learned_matches = {}
+        self.exact_path = (os.path.join(os.path.dirname(self.cache.path), "exact_matches.json")
+                           if self.cache.path else None)
+        self.load_exact_matches()
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = get_client()
+        return self._client
+
+    @client.setter
+    def client(self, client):
+        self._client = client
+
+    @property
+    def local(self):
+        # Shared micro-batching backend, the model itself loads on the first caption
+        if self._local is None:
+            from agents.local_captioner import get_local_backend
+            self._local = get_local_backend(self.local_model)
+        return self._local
+
+    def cache_key(self, glosses):
+        if self.backend == "local":
+            return CaptionCache.make_key(glosses, self.local.model_name, self.local.template_hash)
+        return CaptionCache.make_key(glosses, self.model_name, self.template_hash)
+
+    def generate(self, glosses):
+        if self.backend == "local":
+            return self.local.caption(glosses)
+        prompt = self.prompt_template.format(glosses=glosses)
+        return self.client.chat([{"role": "user", "content": prompt}], model=self.model_name,
+                                temperature=0.4, stage="caption")
 
     def preprocess_gloss(self, glosses: str) -> str:
         return glosses.strip().upper()
@@ -43,14 +107,231 @@ Now translate the following gloss into a natural English sentence:
             caption += "." if not caption.endswith("?") else ""
         return caption
 
+    def add_exact_match(self, glosses: str, caption: str):
+        glosses = self.preprocess_gloss(glosses)
+        if glosses and caption and caption != "Translation failed.":
+            self.exact_matches[glosses] = caption
+            self.learned_matches[glosses] = caption
+
+    def learn_from_results(self, results, min_similarity=0.9):
+        # Captions that matched the prompt almost perfectly become exact-match answers
+        for r in results:
+            if r["similarity"] >= min_similarity:
+                self.add_exact_match(r["gloss"], r["caption"])
+
+    def load_exact_matches(self):
+        if not self.exact_path or not os.path.exists(self.exact_path):
+            return
+        try:
+            with open(self.exact_path, "r") as f:
+                learned = json.load(f)
+        except Exception as e:
+            logger.error(f"Failed to load exact matches '{self.exact_path}': {e}")
+            return
+        self.learned_matches.update(learned)
+        self.exact_matches.update(learned)
+
+    def save_exact_matches(self):
+        if not self.exact_path:
+            return
+        data = json.dumps(dict(self.learned_matches))
+        os.makedirs(os.path.dirname(self.exact_path) or ".", exist_ok=True)
+        tmp_path = self.exact_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(data)
+        os.replace(tmp_path, self.exact_path)
+
+    def import_exact_matches(self, log_dir="logs", min_similarity=0.9):
+        # One-off: learn from the whole session history (e.g. logs written before the table
+        # was saved), afterwards finished lessons keep it up to date
+        before = len(self.learned_matches)
+        self.learn_from_results(SessionLogger(log_dir).results(), min_similarity)
+        self.save_exact_matches()
+        return len(self.learned_matches) - before
+
+    def record(self, key, seconds):
+        metrics.inc("caption_lookups_total", result=key)
+        with self.stats_lock:
+            self.stats[key] += 1
+            if key == "misses":
+                self.stats["model_seconds"] += seconds
+            else:
+                self.stats["saved_seconds"] += seconds
+
+    def cache_stats(self):
+        with self.stats_lock:
+            stats = dict(self.stats)
+        lookups = stats["exact_hits"] + stats["cache_hits"] + stats["misses"]
+        hits = stats["exact_hits"] + stats["cache_hits"]
+        stats["hit_rate"] = round(hits / lookups, 3) if lookups else 0.0
+        stats["model_seconds"] = round(stats["model_seconds"], 3)
+        stats["saved_seconds"] = round(stats["saved_seconds"], 3)
+        stats["cache_size"] = len(self.cache)
+        return stats
+
+    def average_model_latency(self):
+        with self.stats_lock:
+            return self.stats["model_seconds"] / self.stats["misses"] if self.stats["misses"] else 0.0
+
+    def save_cache(self):
+        self.cache.save()
+        self.save_exact_matches()
+
+    def lookup(self, glosses):
+        # (cache key, caption) for a preprocessed gloss, caption is None when the model is needed
+        if self.use_exact_matches and glosses in self.exact_matches:
+            caption = self.exact_matches[glosses]
+            self.record("exact_hits", self.average_model_latency())
+            logger.info(f"Exact-match caption: {caption}")
+            return None, caption
+
+        key = self.cache_key(glosses)
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.record("cache_hits", cached["latency"])
+            logger.info(f"Cached caption: {cached['caption']}")
+            return key, cached["caption"]
+        return key, None
+
     def caption(self, glosses: str) -> str:
         try:
             glosses = self.preprocess_gloss(glosses)
+            if not glosses:
+                return ""
             logger.info(f"Processing gloss: {glosses}")
-            raw_caption = self.chain.run({"glosses": glosses})
+
+            key, caption = self.lookup(glosses)
+            if caption is not None:
+                return caption
+
+            start = time.perf_counter()
+            raw_caption = self.generate(glosses)
+            elapsed = time.perf_counter() - start
             caption = self.postprocess_caption(raw_caption)
+            # An empty answer is not worth keeping, the next attempt asks the model again
+            if caption:
+                self.cache.put(key, caption, elapsed)
+            self.record("misses", elapsed)
             logger.info(f"Generated caption: {caption}")
             return caption
         except Exception as e:
             logger.error(f"Error processing gloss '{glosses}': {e}")
             return "Translation failed."
+
+    @staticmethod
+    def parse_numbered(text, glosses):
+        # {gloss: raw caption} for every well-formed "N. sentence" line; anything missing,
+        # repeated or echoing the gloss is left out and captioned on its own
+        items = {}
+        for line in text.splitlines():
+            match = re.match(r"^\s*(\d+)[.):]\s*(.+?)\s*$", line)
+            if not match:
+                continue
+            number, answer = int(match.group(1)), match.group(2)
+            if not 1 <= number <= len(glosses) or number in items:
+                continue
+            # "GLOSS → Sentence" echoes of the examples keep only the sentence
+            answer = answer.split("→")[-1].strip()
+            if answer and answer.upper() != glosses[number - 1]:
+                items[number] = answer
+        return {glosses[n - 1]: answer for n, answer in items.items()}
+
+    def generate_batch(self, glosses):
+        # One request (or one local forward pass) for several preprocessed glosses
+        start = time.perf_counter()
+        if self.backend == "local":
+            raw = dict(zip(glosses, self.local.generate_batch(glosses)))
+        else:
+            numbered = "\n".join(f"{i}. {g}" for i, g in enumerate(glosses, 1))
+            prompt = self.batch_template.format(glosses=numbered)
+            text = self.client.chat([{"role": "user", "content": prompt}], model=self.model_name,
+                                    temperature=0.4, stage="caption_batch")
+            raw = self.parse_numbered(text, glosses)
+        share = (time.perf_counter() - start) / len(glosses)
+
+        captions = {}
+        for gloss, answer in raw.items():
+            caption = self.postprocess_caption(answer)
+            if caption:
+                self.cache.put(self.cache_key(gloss), caption, share)
+                self.record("misses", share)
+                captions[gloss] = caption
+
+        # Versus one request per gloss: the instructions and examples were sent once
+        # (token counts are estimated at 4 characters per token)
+        round_trips_saved, tokens_saved = 0, 0
+        if self.backend != "local" and captions:
+            round_trips_saved = len(captions) - 1
+            singles = sum(len(self.prompt_template.format(glosses=g)) for g in captions)
+            tokens_saved = max(0, (singles - len(prompt)) // 4)
+        with self.stats_lock:
+            self.stats["batch_requests"] += 1
+            self.stats["batched_glosses"] += len(captions)
+            self.stats["batch_fallbacks"] += len(glosses) - len(captions)
+            self.stats["round_trips_saved"] += round_trips_saved
+            self.stats["prompt_tokens_saved"] += tokens_saved
+        metrics.inc("caption_batch_fallbacks_total", len(glosses) - len(captions))
+        metrics.inc("caption_round_trips_saved_total", round_trips_saved)
+        metrics.inc("caption_prompt_tokens_saved_total", tokens_saved)
+        return captions
+
+    def caption_batch(self, glosses):
+        # Captions for a whole lesson: known glosses are answered locally, the rest share one
+        # request, and whatever that request does not answer falls back to caption().
+        # Skipped prompts (empty glosses) get an empty caption without asking the model.
+        glosses = [self.preprocess_gloss(g) for g in glosses]
+        captions = [None if gloss else "" for gloss in glosses]
+        pending = {}
+        for i, gloss in enumerate(glosses):
+            if not gloss or gloss in pending:
+                continue
+            key, caption = self.lookup(gloss)
+            if caption is not None:
+                captions[i] = caption
+            else:
+                pending[gloss] = key
+
+        if len(pending) > 1:
+            logger.info(f"Captioning {len(pending)} glosses in one request")
+            try:
+                generated = self.generate_batch(list(pending))
+            except Exception as e:
+                logger.error(f"Batch captioning failed, captioning one by one: {e}")
+                generated = {}
+            for i, gloss in enumerate(glosses):
+                if captions[i] is None and gloss in generated:
+                    captions[i] = generated[gloss]
+
+        return [caption if caption is not None else self.caption(gloss) for gloss, caption in zip(glosses, captions)]
+
+    async def acaption_many(self, glosses, max_concurrency=4):
+        # Captions run in worker threads, at most max_concurrency requests in flight
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def run(gloss):
+            async with semaphore:
+                return await asyncio.to_thread(self.caption, gloss)
+
+        # gather keeps the results in the same order as the glosses
+        return await asyncio.gather(*(run(g) for g in glosses))
+
+    def caption_many(self, glosses, max_concurrency=4):
+        # For synchronous callers; from inside an event loop await acaption_many instead
+        return asyncio.run(self.acaption_many(list(glosses), max_concurrency))
+
+
+# python -m agents.captioner --log-dir logs --import-exact-matches [--state-dir logs/workers/0]
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Caption cache maintenance.")
+    parser.add_argument("--log-dir", default="logs")
+    parser.add_argument("--import-exact-matches", action="store_true",
+                        help="learn exact-match captions from every stored session")
+    parser.add_argument("--min-similarity", type=float, default=0.9)
+    parser.add_argument("--state-dir", default=None, help="where the caption cache lives, default: --log-dir")
+    args = parser.parse_args()
+
+    if args.import_exact_matches:
+        state_dir = args.state_dir or args.log_dir
+        captioner = Captioner(cache=CaptionCache(os.path.join(state_dir, "caption_cache.json")))
+        added = captioner.import_exact_matches(args.log_dir, args.min_similarity)
+        print(f"📦 Imported {added} exact-match caption(s) into {captioner.exact_path}.")
@@ -0,0 +1,248 @@
+import logging
+import os
+import re
+import threading
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+
+from agents.metrics import metrics
+from agents.startup import startup_timer
+
+# Logging setup
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text: str) -> str:
+    # all-MiniLM-L6-v2 is uncased, so lowercasing does not change the embedding
+    return re.sub(r"\s+", " ", text.strip().lower())
+
+
+class HashingEncoder:
+    # Deterministic bag-of-words stand-in for the sentence encoder, for replays and benchmarks
+    def __init__(self, dim=384):
+        self.dim = dim
+
+    def encode(self, texts, normalize_embeddings=True, **kwargs):
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for word in re.findall(r"[a-z0-9']+", text.lower()):
+                vectors[i, zlib.crc32(word.encode("utf-8")) % self.dim] += 1.0
+        if normalize_embeddings:
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors /= np.where(norms == 0, 1.0, norms)
+        return vectors
+
+
+ENCODER_BACKENDS = ("torch", "int8", "onnx")
+
+
+def hub_name(model_name):
+    # SentenceTransformer resolves bare names under sentence-transformers/, transformers does not
+    return model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+
+
+class OnnxEncoder:
+    # The MiniLM transformer exported to ONNX once and run by onnxruntime with every graph
+    # optimization enabled. Mean pooling and normalization match the SentenceTransformer pipeline,
+    # so scores stay comparable with the PyTorch model (check with benchmarks/bench_encoders.py).
+    def __init__(self, model_name="all-MiniLM-L6-v2", export_dir="logs/onnx", threads=None, max_length=256):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        self.model_name = model_name
+        self.max_length = max_length
+        self.dir = os.path.join(export_dir, hub_name(model_name).replace("/", "--"))
+        self.path = os.path.join(self.dir, "model.onnx")
+        if not os.path.exists(self.path):
+            self.export()
+        self.tokenizer = AutoTokenizer.from_pretrained(self.dir)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(self.path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def export(self):
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+
+        tokenizer = AutoTokenizer.from_pretrained(hub_name(self.model_name))
+        model = AutoModel.from_pretrained(hub_name(self.model_name)).eval()
+        sample = tokenizer(["an example sentence"], return_tensors="pt")
+        names = [n for n in ("input_ids", "attention_mask", "token_type_ids") if n in sample]
+        axes = {n: {0: "batch", 1: "sequence"} for n in names + ["last_hidden_state"]}
+        os.makedirs(self.dir, exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with torch.no_grad():
+            torch.onnx.export(model, tuple(sample[n] for n in names), tmp_path, input_names=names,
+                              output_names=["last_hidden_state"], dynamic_axes=axes, opset_version=17)
+        tokenizer.save_pretrained(self.dir)
+        os.replace(tmp_path, self.path)
+        logger.info(f"Exported {self.model_name} to {self.path}.")
+
+    def encode(self, texts, batch_size=64, normalize_embeddings=True, **kwargs):
+        batches = []
+        for start in range(0, len(texts), batch_size):
+            tokens = self.tokenizer(list(texts[start:start + batch_size]), padding=True, truncation=True,
+                                    max_length=self.max_length, return_tensors="np")
+            feeds = {k: v.astype(np.int64) for k, v in tokens.items() if k in self.input_names}
+            hidden = self.session.run(["last_hidden_state"], feeds)[0]
+            mask = tokens["attention_mask"][..., None].astype(np.float32)
+            batches.append((hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9))
+        vectors = np.concatenate(batches).astype(np.float32) if batches else np.zeros((0, 384), dtype=np.float32)
+        if normalize_embeddings:
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors /= np.where(norms == 0, 1.0, norms)
+        return vectors
+
+
+def load_encoder(model_name="all-MiniLM-L6-v2", backend="torch", threads=None):
+    # torch: the full-precision SentenceTransformer; int8: the same with its Linear layers
+    # dynamically quantized; onnx: the exported, graph-optimized model under onnxruntime
+    if backend not in ENCODER_BACKENDS:
+        raise ValueError(f"Unknown encoder backend '{backend}', expected one of {', '.join(ENCODER_BACKENDS)}")
+    if backend == "onnx":
+        return OnnxEncoder(model_name, threads=threads)
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    if threads:
+        torch.set_num_threads(threads)
+    # Dynamic quantization only has CPU kernels
+    model = SentenceTransformer(model_name, device="cpu" if backend == "int8" else None)
+    if backend == "int8":
+        # In place, so the full-precision weights are not kept around next to the int8 copy
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    return model
+
+
+class EmbeddingEngine:
+    def __init__(self, model_name="all-MiniLM-L6-v2", cache_size=5000, cache_path="logs/embedding_cache.npz", model=None,
+                 backend="torch", threads=None):
+        self.model_name = model_name
+        self.backend = backend
+        self.threads = threads
+        self.cache_size = cache_size
+        self.cache_path = cache_path
+        self._model = model
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.load_cache()
+
+    @property
+    def model(self):
+        # The encoder is only loaded once something actually needs to be embedded
+        if self._model is None:
+            with self.lock:
+                if self._model is None:
+                    with startup_timer.phase(f"load embedding model {self.model_name} ({self.backend})"):
+                        self._model = load_encoder(self.model_name, self.backend, self.threads)
+        return self._model
+
+    @property
+    def cache_name(self):
+        # Quantized and exported encoders give slightly different vectors, so each backend has its own cache
+        return self.model_name if self.backend == "torch" else f"{self.model_name}+{self.backend}"
+
+    def load_cache(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return
+        try:
+            data = np.load(self.cache_path, allow_pickle=False)
+            if str(data["model_name"]) != self.cache_name:
+                logger.info("Embedding cache was built with another model, ignoring it.")
+                return
+            for key, vector in zip(data["keys"], data["vectors"]):
+                self.cache[str(key)] = vector
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+            logger.info(f"Loaded {len(self.cache)} cached embeddings.")
+        except Exception as e:
+            logger.error(f"Failed to load embedding cache '{self.cache_path}': {e}")
+            self.cache = OrderedDict()
+
+    def save_cache(self):
+        if not self.cache_path:
+            return
+        with self.lock:
+            keys = list(self.cache.keys())
+            vectors = list(self.cache.values())
+        if not keys:
+            return
+        os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+        # np.savez appends ".npz" to names without it, so write to a name that already ends with it
+        tmp_path = self.cache_path + ".tmp.npz"
+        np.savez(tmp_path, model_name=np.array(self.cache_name), keys=np.array(keys), vectors=np.stack(vectors))
+        os.replace(tmp_path, self.cache_path)
+
+    def encode(self, texts):
+        return self.model.encode(
+            texts,
+            batch_size=64,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False,
+        ).astype(np.float32)
+
+    def embed(self, texts):
+        keys = [normalize_text(t) for t in texts]
+        vectors = {}
+        missing = []
+        hits = 0
+        with self.lock:
+            for key in keys:
+                if key in vectors:
+                    continue
+                if key in self.cache:
+                    self.cache.move_to_end(key)
+                    vectors[key] = self.cache[key]
+                    hits += 1
+                elif key not in missing:
+                    missing.append(key)
+                    self.misses += 1
+            self.hits += hits
+
+        metrics.inc("embedding_cache_total", hits, result="hit")
+        metrics.inc("embedding_cache_total", len(missing), result="miss")
+
+        # One batched encode call for everything we have not seen yet
+        if missing:
+            with metrics.span("embed.encode", count=len(missing)):
+                encoded = self.encode(missing)
+            with self.lock:
+                for key, vector in zip(missing, encoded):
+                    vectors[key] = vector
+                    self.cache[key] = vector
+                    self.cache.move_to_end(key)
+                while len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+
+        return np.stack([vectors[key] for key in keys])
+
+    def warm(self, texts):
+        if texts:
+            self.embed(list(texts))
+
+    def similarity(self, expected: str, actual: str) -> float:
+        embeddings = self.embed([expected, actual])
+        # Embeddings are unit length, so the dot product is the cosine similarity
+        return float(np.dot(embeddings[0], embeddings[1]))
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "size": len(self.cache),
+                "capacity": self.cache_size,
+            }
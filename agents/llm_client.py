@@ -0,0 +1,215 @@
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future
+
+from agents.metrics import metrics
+from agents.startup import startup_timer
+
+# Logging setup
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+RETRY_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
+    pass
+
+
+class TokenBucket:
+    # rate units per second, bursts up to capacity. Blocks until the budget allows the call.
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount=1):
+        amount = min(amount, self.capacity)
+        while True:
+            with self.lock:
+                self.refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def consume(self, amount):
+        # Charge usage we only learn about afterwards, the bucket may go into debt
+        with self.lock:
+            self.refill()
+            self.tokens -= amount
+
+
+class LLMClient:
+    # One OpenAI-compatible chat client per process: pooled keep-alive connections, request
+    # and token budgets, jittered exponential backoff, and identical in-flight requests
+    # coalesced into one upstream call.
+    def __init__(self, model_name="gpt-3.5-turbo", base_url=None, api_key=None, timeout=30.0,
+                 max_retries=4, backoff_base=0.5, backoff_max=8.0, requests_per_minute=3500,
+                 tokens_per_minute=90000, max_connections=20):
+        self.model_name = model_name
+        self.base_url = (base_url or os.environ.get("OPENAI_BASE_URL") or "https://api.openai.com/v1").rstrip("/")
+        self.api_key = api_key if api_key is not None else os.environ.get("OPENAI_API_KEY", "")
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_connections = max_connections
+        self.request_budget = TokenBucket(requests_per_minute / 60, max(1, requests_per_minute // 60))
+        self.token_budget = TokenBucket(tokens_per_minute / 60, max(1, tokens_per_minute // 6))
+        self.inflight = {}
+        self.inflight_lock = threading.Lock()
+        self._http = None
+        self.http_lock = threading.Lock()
+        self.stats_lock = threading.Lock()
+        self.stats = {"requests": 0, "coalesced": 0, "retries": 0, "failures": 0,
+                      "prompt_tokens": 0, "completion_tokens": 0}
+
+    @property
+    def http(self):
+        # httpx is imported and the pool opened on the first request
+        if self._http is None:
+            with self.http_lock:
+                if self._http is None:
+                    with startup_timer.phase("open llm client"):
+                        import httpx
+                        self._http = httpx.Client(
+                            base_url=self.base_url,
+                            headers={"Authorization": f"Bearer {self.api_key}"},
+                            timeout=self.timeout,
+                            limits=httpx.Limits(max_connections=self.max_connections,
+                                                max_keepalive_connections=self.max_connections),
+                        )
+        return self._http
+
+    def close(self):
+        if self._http is not None:
+            self._http.close()
+            self._http = None
+
+    def count(self, key, value=1):
+        with self.stats_lock:
+            self.stats[key] += value
+
+    def client_stats(self):
+        with self.stats_lock:
+            return dict(self.stats)
+
+    def chat(self, messages, model=None, temperature=0.7, max_tokens=None, timeout=None,
+             stage="llm", coalesce=True):
+        # Returns the assistant message text, raises LLMError once retries are exhausted
+        payload = {"model": model or self.model_name, "messages": messages, "temperature": temperature}
+        if max_tokens is not None:
+            payload["max_tokens"] = max_tokens
+        if not coalesce:
+            return self.request(payload, timeout, stage)
+
+        key = hashlib.sha1(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+        with self.inflight_lock:
+            future = self.inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self.inflight[key] = Future()
+        if not leader:
+            # Someone is already asking exactly this, wait for their answer
+            self.count("coalesced")
+            metrics.inc("llm_coalesced_total", stage=stage)
+            return future.result()
+        try:
+            result = self.request(payload, timeout, stage)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.inflight_lock:
+                self.inflight.pop(key, None)
+
+    def backoff(self, attempt, retry_after=None):
+        # Full jitter, or the server's Retry-After when it sends one
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def request(self, payload, timeout, stage):
+        import httpx
+
+        # Rough prompt size, the real usage is charged once the response arrives
+        estimate = sum(len(m["content"]) for m in payload["messages"]) // 4 + payload.get("max_tokens", 256)
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self.count("retries")
+                metrics.inc("llm_retries_total", stage=stage)
+            self.request_budget.acquire()
+            self.token_budget.acquire(estimate)
+            self.count("requests")
+            metrics.inc("llm_calls_total", stage=stage)
+            retry_after = None
+            try:
+                with metrics.span(f"llm.{stage}", attempt=attempt):
+                    response = self.http.post("/chat/completions", json=payload,
+                                              timeout=timeout if timeout is not None else self.timeout)
+                if response.status_code == 200:
+                    data = response.json()
+                    usage = data.get("usage") or {}
+                    self.record_usage(usage, estimate, stage)
+                    return data["choices"][0]["message"]["content"]
+                last_error = LLMError(f"HTTP {response.status_code}: {response.text[:200]}")
+                if response.status_code not in RETRY_STATUS:
+                    break
+                if response.headers.get("retry-after"):
+                    try:
+                        retry_after = float(response.headers["retry-after"])
+                    except ValueError:
+                        pass
+            except (httpx.TimeoutException, httpx.TransportError) as e:
+                last_error = LLMError(f"{type(e).__name__}: {e}")
+            if attempt < self.max_retries:
+                delay = self.backoff(attempt, retry_after)
+                logger.info(f"LLM request failed ({last_error}), retrying in {delay:.2f}s")
+                time.sleep(delay)
+
+        self.count("failures")
+        metrics.inc("llm_errors_total", stage=stage)
+        raise last_error
+
+    def record_usage(self, usage, estimate, stage):
+        prompt_tokens = usage.get("prompt_tokens", 0)
+        completion_tokens = usage.get("completion_tokens", 0)
+        self.count("prompt_tokens", prompt_tokens)
+        self.count("completion_tokens", completion_tokens)
+        metrics.inc("llm_tokens_total", prompt_tokens, stage=stage, kind="prompt")
+        metrics.inc("llm_tokens_total", completion_tokens, stage=stage, kind="completion")
+        if prompt_tokens + completion_tokens > estimate:
+            self.token_budget.consume(prompt_tokens + completion_tokens - estimate)
+
+
+shared_lock = threading.Lock()
+shared_client = None
+
+
+def get_client():
+    # The process-wide client every agent uses unless it is given its own
+    global shared_client
+    with shared_lock:
+        if shared_client is None:
+            # Budgets follow the account's rate limits, SIGN_LLM_RPM / SIGN_LLM_TPM override them
+            shared_client = LLMClient(requests_per_minute=int(os.environ.get("SIGN_LLM_RPM", 3500)),
+                                      tokens_per_minute=int(os.environ.get("SIGN_LLM_TPM", 90000)),
+                                      max_connections=int(os.environ.get("SIGN_LLM_CONNECTIONS", 20)))
+        return shared_client
@@ -0,0 +1,107 @@
+import hashlib
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from agents.metrics import metrics
+from agents.summary import load_seq2seq_model
+
+# Logging setup
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    # Collects concurrent calls for up to max_wait seconds (or max_batch items) and runs
+    # them through run_batch together; each caller blocks until its own result is ready.
+    def __init__(self, run_batch, max_batch=16, max_wait=0.005, name="micro-batcher"):
+        self.run_batch = run_batch
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.queue = queue.Queue()
+        self.worker = threading.Thread(target=self.run, name=name, daemon=True)
+        self.worker.start()
+
+    def submit(self, item):
+        future = Future()
+        self.queue.put((item, future))
+        return future.result()
+
+    def collect(self):
+        batch = [self.queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def run(self):
+        while True:
+            batch = self.collect()
+            items = [item for item, _ in batch]
+            try:
+                with metrics.span("local_caption.batch", size=len(items)):
+                    results = self.run_batch(items)
+                for (_, future), result in zip(batch, results):
+                    future.set_result(result)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+
+
+class LocalCaptionBackend:
+    # Gloss -> English with a small instruction-tuned seq2seq model on the local CPU/GPU.
+    # The prompt is much shorter than the remote one, encoder cost grows with input length.
+    def __init__(self, model_name="google/flan-t5-base", quantize=True, max_batch=16, max_wait_ms=5.0,
+                 max_new_tokens=32, num_beams=1):
+        self.model_name = model_name
+        self.quantize = quantize
+        self.max_new_tokens = max_new_tokens
+        self.num_beams = num_beams
+        self.prompt_template = """Translate the sign language gloss into a natural English sentence.
+Gloss: ME WANT FOOD
+Sentence: I want some food.
+Gloss: MOTHER DRIVE WHERE
+Sentence: Where is mother driving?
+Gloss: {glosses}
+Sentence:"""
+        self.template_hash = hashlib.sha1(self.prompt_template.encode("utf-8")).hexdigest()[:12]
+        self.batcher = MicroBatcher(self.generate_batch, max_batch, max_wait_ms / 1000, name="local-captioner")
+
+    @property
+    def model(self):
+        return load_seq2seq_model(self.model_name, self.quantize)
+
+    def generate_batch(self, glosses):
+        import torch
+
+        tokenizer, model, device = self.model
+        prompts = [self.prompt_template.format(glosses=g) for g in glosses]
+        inputs = tokenizer(prompts, return_tensors="pt", padding=True, truncation=True).to(device)
+        with torch.inference_mode():
+            output = model.generate(**inputs, max_new_tokens=self.max_new_tokens, num_beams=self.num_beams)
+        return [text.strip() for text in tokenizer.batch_decode(output, skip_special_tokens=True)]
+
+    def caption(self, glosses):
+        # Raw model output, Captioner applies postprocess_caption as for the remote model
+        return self.batcher.submit(glosses)
+
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_local_backend(model_name="google/flan-t5-base", quantize=True):
+    # One backend (and batcher) per model in the process, so every Captioner shares its batches
+    with _backends_lock:
+        key = (model_name, quantize)
+        if key not in _backends:
+            _backends[key] = LocalCaptionBackend(model_name, quantize)
+        return _backends[key]
@@ -1,26 +1,350 @@
+import argparse
+import base64
+import glob
+import hashlib
+import io
 import json
+import logging
 import os
+import re
+import threading
+import time
+import uuid
 from datetime import datetime
 
+import numpy as np
+import orjson
+import zstandard
+from filelock import FileLock
+
+# Logging setup
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def new_session_id():
+    # Sortable by time, unique across processes even within the same second
+    return f"{datetime.now().strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+
+
+def normalize_prompt(prompt):
+    return re.sub(r"\s+", " ", prompt.strip().lower())
+
+
+def prompt_hashes(prompt, n_bits, k=7):
+    # k bit positions for a Bloom filter, by double hashing one 128-bit digest
+    digest = hashlib.blake2b(normalize_prompt(prompt).encode("utf-8"), digest_size=16).digest()
+    h1, h2 = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+    return [(h1 + i * h2) % n_bits for i in range(k)]
+
+
+def prompt_filter(prompts):
+    # About 10 bits per prompt, 1% false positives; a false positive only costs reading a segment
+    n_bits = max(64, 10 * len(prompts))
+    bits = np.zeros(n_bits, dtype=bool)
+    for prompt in prompts:
+        bits[prompt_hashes(prompt, n_bits)] = True
+    return {"bits": n_bits, "filter": base64.b64encode(np.packbits(bits).tobytes()).decode("ascii")}
+
+
+def may_contain(summary, prompt):
+    bits = np.unpackbits(np.frombuffer(base64.b64decode(summary["filter"]), dtype=np.uint8))
+    return bool(bits[prompt_hashes(prompt, summary["bits"])].all())
+
 
 class SessionLogger:
-    def __init__(self, log_dir="logs"):
+    # Append-only session log store. Records are appended as compact JSON lines to
+    # <log_dir>/sessions/active.jsonl; once that passes segment_bytes it is sealed into
+    # segment-NNNNNN.jsonl and compressed in the background to segment-NNNNNN.jsonl.zst.
+    # index.json keeps, per compressed segment, its time range, learners and a Bloom filter
+    # of its prompts, so queries only decompress segments that can match.
+    def __init__(self, log_dir="logs", segment_bytes=32 * 1024 * 1024, level=10):
         self.log_dir = log_dir
-        os.makedirs(self.log_dir, exist_ok=True)
+        self.store_dir = os.path.join(log_dir, "sessions")
+        self.segment_bytes = segment_bytes
+        self.level = level
+        self.file_lock = FileLock(os.path.join(self.store_dir, ".lock"))
+        self.sealer = None
+        self.sealer_lock = threading.Lock()
+        self.sealer_pending = False
+        # Segments sealed by a process that stopped before compressing them
+        if self.sealed_segments():
+            self.compress_in_background()
+
+    @property
+    def active_path(self):
+        return os.path.join(self.store_dir, "active.jsonl")
+
+    @property
+    def index_path(self):
+        return os.path.join(self.store_dir, "index.json")
+
+    def segment_path(self, number, compressed=True):
+        name = f"segment-{number:06d}.jsonl"
+        return os.path.join(self.store_dir, name + ".zst" if compressed else name)
+
+    def segment_numbers(self, pattern):
+        return sorted(int(os.path.basename(p)[8:14]) for p in glob.glob(os.path.join(self.store_dir, pattern)))
+
+    def sealed_segments(self):
+        return self.segment_numbers("segment-*.jsonl")
+
+    def load_index(self):
+        if not os.path.exists(self.index_path):
+            return {}
+        try:
+            with open(self.index_path, "r") as f:
+                return {int(k): v for k, v in json.load(f).items()}
+        except Exception as e:
+            logger.error(f"Failed to load session index '{self.index_path}': {e}")
+            return {}
+
+    def save_index(self, index):
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({str(k): v for k, v in sorted(index.items())}, f)
+        os.replace(tmp_path, self.index_path)
+
+    # Writing
+
+    def append(self, record):
+        record = dict(record)
+        record.setdefault("session_id", new_session_id())
+        record.setdefault("ts", round(time.time(), 3))
+        record.setdefault("timestamp", datetime.fromtimestamp(record["ts"]).strftime("%Y-%m-%d_%H-%M-%S"))
+        line = orjson.dumps(record, option=orjson.OPT_APPEND_NEWLINE | orjson.OPT_SERIALIZE_NUMPY)
+        os.makedirs(self.store_dir, exist_ok=True)
+        with self.file_lock:
+            # One write per record on an O_APPEND file, a crash can only tear the last line
+            with open(self.active_path, "ab") as f:
+                f.write(line)
+                rotate = f.tell() >= self.segment_bytes
+            if rotate:
+                self.seal()
+        if rotate:
+            self.compress_in_background()
+        return record["session_id"]
+
+    def log_session(self, prompts, session_log, score, **fields):
+        return self.append({"score": score, "prompts": prompts, "results": session_log, **fields})
+
+    def seal(self):
+        # Caller holds file_lock
+        if not os.path.exists(self.active_path) or os.path.getsize(self.active_path) == 0:
+            return
+        numbers = self.segment_numbers("segment-*.jsonl*")
+        os.replace(self.active_path, self.segment_path((numbers[-1] + 1) if numbers else 0, compressed=False))
+
+    def rotate(self):
+        if not os.path.exists(self.active_path):
+            return
+        with self.file_lock:
+            self.seal()
+        self.compress_in_background()
+
+    def compress_in_background(self):
+        with self.sealer_lock:
+            self.sealer_pending = True
+            if self.sealer is not None:
+                # The running compressor picks the new segment up before it exits
+                return
+            self.sealer = threading.Thread(target=self.compress_sealed, daemon=True)
+            self.sealer.start()
+
+    def wait_for_compression(self):
+        sealer = self.sealer
+        if sealer is not None:
+            sealer.join()
+
+    def compress_sealed(self):
+        while True:
+            with self.sealer_lock:
+                if not self.sealer_pending:
+                    self.sealer = None
+                    return
+                self.sealer_pending = False
+            for number in self.sealed_segments():
+                try:
+                    self.compress_segment(number)
+                except Exception as e:
+                    logger.error(f"Failed to compress session segment {number}: {e}")
+
+    def compress_segment(self, number):
+        source = self.segment_path(number, compressed=False)
+        target = self.segment_path(number)
+        summary = {"sessions": 0, "min_ts": None, "max_ts": None, "users": []}
+        users, prompts = set(), set()
+        tmp_path = f"{target}.{os.getpid()}.tmp"
+        compressor = zstandard.ZstdCompressor(level=self.level)
+        with open(source, "rb") as src, open(tmp_path, "wb") as dst, compressor.stream_writer(dst) as out:
+            for line in src:
+                try:
+                    record = orjson.loads(line)
+                except ValueError:
+                    # Torn tail from a crash, everything before it is kept
+                    break
+                out.write(line)
+                ts = record.get("ts", 0)
+                summary["sessions"] += 1
+                summary["min_ts"] = ts if summary["min_ts"] is None else min(summary["min_ts"], ts)
+                summary["max_ts"] = ts if summary["max_ts"] is None else max(summary["max_ts"], ts)
+                users.add(record.get("user_id"))
+                prompts.update(normalize_prompt(r["prompt"]) for r in record.get("results", []))
+        summary["users"] = sorted(users, key=str)
+        summary.update(prompt_filter(prompts))
+
+        with self.file_lock:
+            if not os.path.exists(source):
+                # Another process compressed it first
+                os.remove(tmp_path)
+                return
+            os.replace(tmp_path, target)
+            index = self.load_index()
+            index[number] = summary
+            self.save_index(index)
+            os.remove(source)
+
+    # Reading
+
+    def segments(self, user_id=None, since=None, until=None, prompt=None):
+        # Paths to read in order, skipping compressed segments the index rules out
+        index = self.load_index()
+        numbers = sorted(set(self.segment_numbers("segment-*.jsonl*")))
+        paths = []
+        for number in numbers:
+            summary = index.get(number)
+            compressed = os.path.exists(self.segment_path(number))
+            if compressed and summary is not None and summary["sessions"]:
+                if since is not None and summary["max_ts"] < since:
+                    continue
+                if until is not None and summary["min_ts"] > until:
+                    continue
+                if user_id is not None and user_id not in summary["users"]:
+                    continue
+                if prompt is not None and not may_contain(summary, prompt):
+                    continue
+            paths.append(self.segment_path(number, compressed=compressed))
+        paths.append(self.active_path)
+        return paths
+
+    def open_segment(self, path):
+        try:
+            raw = open(path, "rb")
+        except FileNotFoundError:
+            if path.endswith(".zst") or path == self.active_path:
+                return None
+            # Compressed (or rotated) while we were listing
+            return self.open_segment(path + ".zst")
+        if path.endswith(".zst"):
+            return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(raw, closefd=True), 1 << 20)
+        return raw
+
+    def read(self, user_id=None, since=None, until=None, prompt=None, legacy=True):
+        # Streams matching session records, oldest first, one segment at a time.
+        # since/until are epoch seconds or datetimes.
+        since = since.timestamp() if isinstance(since, datetime) else since
+        until = until.timestamp() if isinstance(until, datetime) else until
+        if legacy:
+            yield from self.read_legacy(user_id, since, until, prompt)
+        for path in self.segments(user_id, since, until, prompt):
+            f = self.open_segment(path)
+            if f is None:
+                continue
+            with f:
+                for line in f:
+                    try:
+                        record = orjson.loads(line)
+                    except ValueError:
+                        # Torn last line of the active segment
+                        break
+                    if self.matches(record, user_id, since, until, prompt):
+                        yield record
+
+    def read_legacy(self, user_id, since, until, prompt):
+        # session_<timestamp>.json files written before the store existed
+        for path in sorted(glob.glob(os.path.join(self.log_dir, "session_*.json"))):
+            try:
+                with open(path, "r") as f:
+                    record = json.load(f)
+                timestamp = os.path.basename(path)[len("session_"):-len(".json")]
+                record.setdefault("session_id", timestamp)
+                record.setdefault("timestamp", timestamp)
+                try:
+                    ts = datetime.strptime(timestamp, "%Y-%m-%d_%H-%M-%S").timestamp()
+                except ValueError:
+                    ts = os.path.getmtime(path)
+                record.setdefault("ts", ts)
+            except Exception as e:
+                logger.error(f"Skipping session log '{path}': {e}")
+                continue
+            if self.matches(record, user_id, since, until, prompt):
+                yield record
+
+    @staticmethod
+    def matches(record, user_id, since, until, prompt):
+        if user_id is not None and record.get("user_id") != user_id:
+            return False
+        if since is not None and record.get("ts", 0) < since:
+            return False
+        if until is not None and record.get("ts", 0) > until:
+            return False
+        if prompt is not None:
+            wanted = normalize_prompt(prompt)
+            return any(normalize_prompt(r["prompt"]) == wanted for r in record.get("results", []))
+        return True
+
+    def results(self, **query):
+        # Every recorded attempt, for consumers that only need the per-prompt results
+        for record in self.read(**query):
+            yield from record.get("results", [])
+
+    def find(self, session_id, max_duration=24 * 60 * 60):
+        # Session ids carry the lesson's start time and records are stamped when it ends,
+        # so the time index narrows the search to lessons up to max_duration seconds long
+        try:
+            ts = datetime.strptime(session_id[:15], "%Y%m%dT%H%M%S").timestamp()
+            since, until = ts - 1, ts + max_duration
+        except ValueError:
+            since = until = None
+        for record in self.read(since=since, until=until):
+            if record.get("session_id") == session_id:
+                return record
+        return None
 
-    def log_session(self, prompts, session_log, score):
-        timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-        log_data = {
-            "timestamp": timestamp,
-            "score": score,
-            "prompts": prompts,
-            "results": session_log
-        }
+    def migrate(self, delete=True):
+        # Moves legacy session_*.json files into the store. Files already imported by an
+        # earlier (possibly interrupted) run are skipped, legacy ids are their timestamps.
+        imported = {r["session_id"] for r in self.read(legacy=False) if "T" not in r["session_id"]}
+        migrated = []
+        for record in self.read_legacy(None, None, None, None):
+            if record["session_id"] not in imported:
+                self.append(record)
+            migrated.append(record["timestamp"])
+        self.rotate()
+        self.wait_for_compression()
+        if delete:
+            # Only once everything is sealed and compressed
+            for timestamp in migrated:
+                os.remove(os.path.join(self.log_dir, f"session_{timestamp}.json"))
+        return len(migrated)
 
-        filename = f"session_{timestamp}.json"
-        filepath = os.path.join(self.log_dir, filename)
 
-        with open(filepath, "w") as f:
-            json.dump(log_data, f, indent=2)
+# python -m agents.logger --log-dir logs --migrate [--rotate]
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Session log store maintenance.")
+    parser.add_argument("--log-dir", default="logs")
+    parser.add_argument("--migrate", action="store_true", help="import legacy session_*.json files")
+    parser.add_argument("--keep", action="store_true",
+                        help="keep the legacy files (readers will then see those sessions twice)")
+    parser.add_argument("--rotate", action="store_true", help="seal and compress the active segment")
+    args = parser.parse_args()
 
-        print(f"\n💾 Session log saved to: {filepath}")
+    store = SessionLogger(args.log_dir)
+    if args.migrate:
+        print(f"📦 Migrated {store.migrate(delete=not args.keep)} legacy session log(s).")
+    if args.rotate:
+        store.rotate()
+        store.wait_for_compression()
+    sessions = sum(1 for _ in store.read(legacy=False))
+    size = sum(os.path.getsize(p) for p in glob.glob(os.path.join(store.store_dir, "*.jsonl*")))
+    print(f"{sessions} session(s) in {args.log_dir}/sessions ({size / 1024:.1f} KiB on disk)")
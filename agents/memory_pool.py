@@ -0,0 +1,68 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from agents.reinforce_memory import ReinforcementMemory
+
+# Logging setup
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class MemoryPool:
+    # Per-learner ReinforcementMemory shards, loaded on first use and dropped when idle,
+    # so memory use follows the number of active learners rather than all learners.
+    def __init__(self, log_dir="logs", max_active=1000, idle_seconds=15 * 60, **memory_kwargs):
+        self.log_dir = log_dir
+        self.max_active = max_active
+        self.idle_seconds = idle_seconds
+        self.memory_kwargs = memory_kwargs
+        self.shards = OrderedDict()
+        self.last_used = {}
+        self.lock = threading.Lock()
+
+    def get(self, user_id):
+        with self.lock:
+            shard = self.shards.get(user_id)
+            if shard is None:
+                shard = ReinforcementMemory(log_dir=self.log_dir, user_id=user_id, **self.memory_kwargs)
+                self.shards[user_id] = shard
+            self.shards.move_to_end(user_id)
+            self.last_used[user_id] = time.monotonic()
+            evicted = []
+            while len(self.shards) > self.max_active:
+                old_id, old_shard = self.shards.popitem(last=False)
+                self.last_used.pop(old_id, None)
+                evicted.append(old_shard)
+        for old_shard in evicted:
+            self.close_shard(old_shard)
+        return shard
+
+    def close_shard(self, shard):
+        shard.save_memory()
+        shard.wait_for_compaction()
+
+    def evict_idle(self, now=None):
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            idle = [u for u, t in self.last_used.items() if now - t >= self.idle_seconds]
+            evicted = [self.shards.pop(u) for u in idle]
+            for u in idle:
+                del self.last_used[u]
+        for shard in evicted:
+            self.close_shard(shard)
+        if evicted:
+            logger.info(f"Evicted {len(evicted)} idle learner memory shard(s).")
+        return len(evicted)
+
+    def close(self):
+        with self.lock:
+            shards = list(self.shards.values())
+            self.shards.clear()
+            self.last_used.clear()
+        for shard in shards:
+            self.close_shard(shard)
+
+    def __len__(self):
+        return len(self.shards)
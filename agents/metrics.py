@@ -0,0 +1,262 @@
+import contextvars
+import cProfile
+import json
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, defaultdict, deque
+from contextlib import contextmanager, nullcontext
+
+# Per-stage latency spans, counters and optional profiling for the lesson pipeline.
+# Everything is a no-op while metrics are disabled, so instrumented code pays one
+# attribute check. Enable with SIGN_METRICS=1 (or main.py --metrics); SIGN_PROFILE=cprofile
+# or SIGN_PROFILE=sample also profiles every lesson.
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Spans inherit the lesson they run in, asyncio.to_thread copies the context into workers
+current_trace = contextvars.ContextVar("current_trace", default=None)
+
+
+class NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+NOOP = NoopSpan()
+
+
+class Histogram:
+    # Recent samples for quantiles plus running totals for count and sum
+    def __init__(self, size=2048):
+        self.samples = deque(maxlen=size)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+        self.samples.append(value)
+        self.count += 1
+        self.total += value
+
+    def quantiles(self):
+        ordered = sorted(self.samples)
+        if not ordered:
+            return {q: 0.0 for q in QUANTILES}
+        return {q: ordered[min(int(q * len(ordered)), len(ordered) - 1)] for q in QUANTILES}
+
+
+class Span:
+    def __init__(self, metrics, name, attrs):
+        self.metrics = metrics
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        self.wall = time.time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self.start
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        self.metrics.record_span(self.name, self.wall, duration, self.attrs)
+        return False
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+
+class SamplingProfiler:
+    # Samples every thread's stack, cProfile only sees the thread that enabled it and most
+    # of a lesson runs in asyncio.to_thread workers. Output is in collapsed-stack format
+    # (one "frame;frame;frame count" line per stack), ready for flamegraph tools.
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def sample(self):
+        own = threading.get_ident()
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            stack = [f"{f.name} ({os.path.basename(f.filename)}:{f.lineno})"
+                     for f in traceback.extract_stack(frame)]
+            self.stacks[";".join(stack)] += 1
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+    def enable(self):
+        self.thread = threading.Thread(target=self.run, name="sampling-profiler", daemon=True)
+        self.thread.start()
+
+    def disable(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def dump_stats(self, path):
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class Metrics:
+    def __init__(self, enabled=False, log_dir="logs", prefix="sign", profiler=None):
+        self.enabled = enabled
+        self.log_dir = log_dir
+        self.prefix = prefix
+        # None, "cprofile" or "sample"
+        self.profiler = profiler
+        self.lock = threading.Lock()
+        # Exports may come from several threads at once, they share the output files
+        self.export_lock = threading.Lock()
+        # One profile at a time: cProfile.enable() fails while another profiler is active
+        self.profile_lock = threading.Lock()
+        self.histograms = defaultdict(Histogram)
+        self.counters = Counter()
+        self.pending = []
+
+    @classmethod
+    def from_env(cls):
+        return cls(enabled=os.environ.get("SIGN_METRICS", "") not in ("", "0"),
+                   log_dir=os.environ.get("SIGN_METRICS_DIR", "logs"),
+                   profiler=os.environ.get("SIGN_PROFILE") or None)
+
+    @property
+    def prometheus_path(self):
+        return os.path.join(self.log_dir, "metrics.prom")
+
+    @property
+    def trace_path(self):
+        return os.path.join(self.log_dir, "trace.jsonl")
+
+    def span(self, name, **attrs):
+        if not self.enabled:
+            return NOOP
+        return Span(self, name, attrs)
+
+    def record_span(self, name, wall, duration, attrs):
+        record = {"trace": current_trace.get(), "span": name, "ts": round(wall, 6),
+                  "duration_ms": round(duration * 1000, 3)}
+        if attrs:
+            record.update(attrs)
+        with self.lock:
+            self.histograms[name].observe(duration)
+            self.pending.append(record)
+
+    def inc(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] += value
+
+    @contextmanager
+    def trace(self, trace_id):
+        # Tags every span in the block (and in threads it starts) with trace_id
+        token = current_trace.set(trace_id)
+        try:
+            yield
+        finally:
+            current_trace.reset(token)
+
+    def profile(self, name):
+        if not self.enabled or not self.profiler:
+            return nullcontext()
+        # Lessons that overlap one already being profiled run unprofiled
+        if not self.profile_lock.acquire(blocking=False):
+            self.inc("profiles_skipped_total")
+            return nullcontext()
+        return self.run_profiler(name)
+
+    @contextmanager
+    def run_profiler(self, name):
+        # Called with profile_lock held
+        try:
+            profiler = cProfile.Profile() if self.profiler == "cprofile" else SamplingProfiler()
+            try:
+                profiler.enable()
+            except ValueError:
+                # Some other profiler (a debugger, coverage) is active in this process
+                self.inc("profiles_skipped_total")
+                yield
+                return
+            try:
+                yield
+            finally:
+                profiler.disable()
+                profile_dir = os.path.join(self.log_dir, "profiles")
+                os.makedirs(profile_dir, exist_ok=True)
+                suffix = "prof" if self.profiler == "cprofile" else "collapsed"
+                profiler.dump_stats(os.path.join(profile_dir, f"{name}.{suffix}"))
+        finally:
+            self.profile_lock.release()
+
+    def report(self):
+        with self.lock:
+            stages = {name: (h.quantiles(), h.count, h.total) for name, h in self.histograms.items()}
+            counters = dict(self.counters)
+        return {
+            "stages": {
+                name: {**{f"p{int(q * 100)}_ms": round(v * 1000, 3) for q, v in quantiles.items()},
+                       "count": count, "total_s": round(total, 3)}
+                for name, (quantiles, count, total) in sorted(stages.items())
+            },
+            "counters": {name + ("{" + ",".join(f"{k}={v}" for k, v in labels) + "}" if labels else ""): value
+                         for (name, labels), value in sorted(counters.items())},
+        }
+
+    def prometheus_text(self):
+        metric = f"{self.prefix}_stage_latency_seconds"
+        lines = [f"# HELP {metric} Latency of each lesson pipeline stage.", f"# TYPE {metric} summary"]
+        with self.lock:
+            for name, h in sorted(self.histograms.items()):
+                for q, value in h.quantiles().items():
+                    lines.append(f'{metric}{{stage="{name}",quantile="{q}"}} {value:.6f}')
+                lines.append(f'{metric}_sum{{stage="{name}"}} {h.total:.6f}')
+                lines.append(f'{metric}_count{{stage="{name}"}} {h.count}')
+            typed = set()
+            for (name, labels), value in sorted(self.counters.items()):
+                full_name = f"{self.prefix}_{name}"
+                if full_name not in typed:
+                    lines.append(f"# TYPE {full_name} counter")
+                    typed.add(full_name)
+                label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+                lines.append(f"{full_name}{{{label_text}}} {value}" if labels else f"{full_name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def export(self):
+        # Rewrites the Prometheus text file and appends the spans recorded since the last export.
+        # Blocking file I/O: from the event loop, run it with asyncio.to_thread
+        if not self.enabled:
+            return
+        with self.export_lock:
+            os.makedirs(self.log_dir, exist_ok=True)
+            text = self.prometheus_text()
+            tmp_path = self.prometheus_path + ".tmp"
+            with open(tmp_path, "w") as f:
+                f.write(text)
+            os.replace(tmp_path, self.prometheus_path)
+
+            with self.lock:
+                pending, self.pending = self.pending, []
+            if pending:
+                with open(self.trace_path, "a") as f:
+                    f.write("".join(json.dumps(r) + "\n" for r in pending))
+
+
+# Shared registry, instrumented modules import this instance
+metrics = Metrics.from_env()
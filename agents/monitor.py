@@ -1,9 +1,36 @@
 import logging
+import threading
+import time
+
+import numpy as np
+
+from agents.metrics import metrics
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+ADVICE = {
+    "Disengaged": "👋 Seems like the student is not engaging. Consider prompting them or suggesting a break.",
+    "Confused": "❓ The student seems confused. Try simpler signs or a quick review.",
+    "Distracted": "⏳ The student is skipping a lot. Ask if they need help or time.",
+    "Excelling": "🌟 Great progress! You can increase the difficulty or give praise.",
+    "Engaged": "✅ Student is doing okay. Keep the session going.",
+}
+
+
+def classify(engagement_rate, accuracy_rate, skip_rate):
+    if engagement_rate < 0.4:
+        return "Disengaged"
+    if accuracy_rate < 0.4:
+        return "Confused"
+    if skip_rate > 0.4:
+        return "Distracted"
+    if accuracy_rate > 0.8:
+        return "Excelling"
+    return "Engaged"
+
+
 class BehaviorMonitorAgent:
     def __init__(self):
         logger.info("Behavior Monitor Agent initialized.")
@@ -17,24 +44,207 @@ class BehaviorMonitorAgent:
         accuracy_rate = correct / total if total > 0 else 0
         skip_rate = skipped / total
 
-        # Determine behavior state
-        if engagement_rate < 0.4:
-            state = "Disengaged"
-            advice = "👋 Seems like the student is not engaging. Consider prompting them or suggesting a break."
-        elif accuracy_rate < 0.4:
-            state = "Confused"
-            advice = "❓ The student seems confused. Try simpler signs or a quick review."
-        elif skip_rate > 0.4:
-            state = "Distracted"
-            advice = "⏳ The student is skipping a lot. Ask if they need help or time."
-        elif accuracy_rate > 0.8:
-            state = "Excelling"
-            advice = "🌟 Great progress! You can increase the difficulty or give praise."
-        else:
-            state = "Engaged"
-            advice = "✅ Student is doing okay. Keep the session going."
-
-        return state, advice
+        state = classify(engagement_rate, accuracy_rate, skip_rate)
+        return state, ADVICE[state]
+
+
+class FleetMonitor:
+    # Streaming behavior state for many learners at once. Every attempt updates a per-learner
+    # sliding window (the last `window` attempts) kept as one row of a set of shared arrays,
+    # with running sums so an update costs the same whatever the window or fleet size.
+    # observe() returns a transition as soon as a learner's state changes mid-lesson, and
+    # rollup() summarizes all active learners with a few vectorized passes over the arrays.
+    STATES = ("Unknown",) + tuple(ADVICE)
+    RESULTS = ("Correct", "Incorrect", "Skipped")
+    ALERTS = ("Disengaged", "Confused")
+
+    def __init__(self, window=10, min_attempts=3, slow_seconds=20.0, idle_seconds=15 * 60, capacity=1024):
+        self.window = window
+        # No state until a learner has this many attempts in the window
+        self.min_attempts = min_attempts
+        # A window of responses this slow on average counts as disengaged, however accurate
+        self.slow_seconds = slow_seconds
+        self.idle_seconds = idle_seconds
+        self.lock = threading.Lock()
+        self.slots = {}
+        self.users = []
+        self.free = []
+        self.allocate_arrays(capacity)
+
+    def allocate_arrays(self, capacity):
+        old = getattr(self, "capacity", 0)
+        arrays = {
+            # Ring buffers of the window's attempts; latency is NaN when it was not measured
+            "outcomes": np.zeros((capacity, self.window), dtype=np.int8),
+            "similarity": np.zeros((capacity, self.window), dtype=np.float32),
+            "latency": np.full((capacity, self.window), np.nan, dtype=np.float32),
+            # Running sums over the window
+            "counts": np.zeros((capacity, len(self.RESULTS)), dtype=np.int32),
+            "similarity_sum": np.zeros(capacity, dtype=np.float64),
+            "latency_sum": np.zeros(capacity, dtype=np.float64),
+            "timed": np.zeros(capacity, dtype=np.int32),
+            "filled": np.zeros(capacity, dtype=np.int32),
+            "position": np.zeros(capacity, dtype=np.int32),
+            "state": np.zeros(capacity, dtype=np.int8),
+            "last_seen": np.zeros(capacity, dtype=np.float64),
+            "active": np.zeros(capacity, dtype=bool),
+        }
+        for name, array in arrays.items():
+            if old:
+                array[:old] = getattr(self, name)
+            setattr(self, name, array)
+        self.users.extend([None] * (capacity - old))
+        self.free.extend(range(capacity - 1, old - 1, -1))
+        self.capacity = capacity
+
+    def slot(self, user_id):
+        slot = self.slots.get(user_id)
+        if slot is None:
+            if not self.free:
+                self.allocate_arrays(self.capacity * 2)
+            slot = self.free.pop()
+            self.slots[user_id] = slot
+            self.users[slot] = user_id
+            self.active[slot] = True
+        return slot
+
+    def release(self, slot):
+        del self.slots[self.users[slot]]
+        self.users[slot] = None
+        self.active[slot] = False
+        self.outcomes[slot] = 0
+        self.similarity[slot] = 0
+        self.latency[slot] = np.nan
+        self.counts[slot] = 0
+        for name in ("similarity_sum", "latency_sum", "timed", "filled", "position", "state"):
+            getattr(self, name)[slot] = 0
+        self.free.append(slot)
+
+    def recompute(self, slot):
+        # Running float sums drift; rebuilt from the ring buffer once per lap of the window
+        self.similarity_sum[slot] = float(self.similarity[slot].sum(dtype=np.float64))
+        latencies = self.latency[slot]
+        timed = ~np.isnan(latencies)
+        self.latency_sum[slot] = float(latencies[timed].sum(dtype=np.float64))
+        self.timed[slot] = int(timed.sum())
+
+    def classify_slot(self, slot):
+        total = int(self.filled[slot])
+        if total < self.min_attempts:
+            return "Unknown"
+        correct, incorrect, skipped = (int(c) for c in self.counts[slot])
+        timed = int(self.timed[slot])
+        if timed and self.latency_sum[slot] / timed > self.slow_seconds:
+            return "Disengaged"
+        return classify((correct + incorrect) / total, correct / total, skipped / total)
+
+    def observe(self, user_id, result, similarity=0.0, latency=None, now=None):
+        # One attempt: result is "Correct", "Incorrect" or "Skipped", latency the seconds the
+        # learner took to respond. Returns the transition if the learner's state changed.
+        outcome = self.RESULTS.index(result)
+        now = time.time() if now is None else now
+        with self.lock:
+            slot = self.slot(user_id)
+            position = int(self.position[slot])
+            if self.filled[slot] == self.window:
+                # The oldest attempt leaves the window
+                self.counts[slot, self.outcomes[slot, position]] -= 1
+                self.similarity_sum[slot] -= self.similarity[slot, position]
+                old_latency = self.latency[slot, position]
+                if not np.isnan(old_latency):
+                    self.latency_sum[slot] -= old_latency
+                    self.timed[slot] -= 1
+            else:
+                self.filled[slot] += 1
+
+            self.outcomes[slot, position] = outcome
+            self.counts[slot, outcome] += 1
+            self.similarity[slot, position] = similarity
+            self.similarity_sum[slot] += similarity
+            self.latency[slot, position] = np.nan if latency is None else latency
+            if latency is not None:
+                self.latency_sum[slot] += latency
+                self.timed[slot] += 1
+            position = (position + 1) % self.window
+            self.position[slot] = position
+            if position == 0:
+                self.recompute(slot)
+            self.last_seen[slot] = now
+
+            previous = self.STATES[self.state[slot]]
+            state = self.classify_slot(slot)
+            if state == previous:
+                return None
+            self.state[slot] = self.STATES.index(state)
+
+        metrics.inc("behavior_transitions_total", state=state)
+        if state in self.ALERTS:
+            logger.debug(f"Behavior alert for learner {user_id}: {previous} -> {state}")
+        return {"user_id": user_id, "from": previous, "to": state, "advice": ADVICE.get(state, ""),
+                "alert": state in self.ALERTS}
+
+    def learner(self, user_id):
+        # Window statistics for one learner, None if it is not being tracked
+        with self.lock:
+            slot = self.slots.get(user_id)
+            if slot is None:
+                return None
+            total = int(self.filled[slot])
+            timed = int(self.timed[slot])
+            correct, incorrect, skipped = (int(c) for c in self.counts[slot])
+            return {
+                "user_id": user_id,
+                "state": self.STATES[self.state[slot]],
+                "attempts": total,
+                "accuracy": round(correct / total, 3) if total else 0.0,
+                "skip_rate": round(skipped / total, 3) if total else 0.0,
+                "mean_similarity": round(float(self.similarity_sum[slot]) / total, 3) if total else 0.0,
+                "mean_latency_s": round(float(self.latency_sum[slot]) / timed, 2) if timed else None,
+            }
+
+    def forget(self, user_id):
+        with self.lock:
+            if user_id in self.slots:
+                self.release(self.slots[user_id])
+
+    def evict_idle(self, now=None):
+        now = time.time() if now is None else now
+        with self.lock:
+            idle = np.flatnonzero(self.active & (self.last_seen <= now - self.idle_seconds))
+            for slot in idle:
+                self.release(int(slot))
+        return len(idle)
+
+    def rollup(self, alert_limit=20):
+        # Fleet-wide view over the active learners' windows
+        with self.lock:
+            active = np.flatnonzero(self.active)
+            states = np.bincount(self.state[active], minlength=len(self.STATES))
+            counts = self.counts[active].sum(axis=0)
+            attempts = int(counts.sum())
+            timed = self.timed[active]
+            mean_latency = self.latency_sum[active][timed > 0] / timed[timed > 0]
+            alert_codes = [self.STATES.index(s) for s in self.ALERTS]
+            alerting = active[np.isin(self.state[active], alert_codes)]
+            # Most recently active alerts first
+            alerting = alerting[np.argsort(-self.last_seen[alerting], kind="stable")[:alert_limit]]
+            alerts = [{"user_id": self.users[s], "state": self.STATES[self.state[s]]} for s in alerting]
+            similarity = float(self.similarity_sum[active].sum())
+
+        return {
+            "learners": len(active),
+            "states": {state: int(n) for state, n in zip(self.STATES, states)},
+            "attempts": attempts,
+            "accuracy": round(int(counts[0]) / attempts, 3) if attempts else 0.0,
+            "skip_rate": round(int(counts[2]) / attempts, 3) if attempts else 0.0,
+            "mean_similarity": round(similarity / attempts, 3) if attempts else 0.0,
+            "latency_p50_s": round(float(np.percentile(mean_latency, 50)), 2) if len(mean_latency) else None,
+            "latency_p95_s": round(float(np.percentile(mean_latency, 95)), 2) if len(mean_latency) else None,
+            "alerts": alerts,
+        }
+
+    def __len__(self):
+        return len(self.slots)
 
 # Simulate example use
 if __name__ == "__main__":
@@ -1,12 +1,31 @@
-from langchain.chat_models import ChatOpenAI
-from langchain.schema import HumanMessage
 import re
 
+from agents.llm_client import get_client
+
 class PromptLLMGenerator:
-    def __init__(self, model_name="gpt-3.5-turbo"):
-        self.llm = ChatOpenAI(model_name=model_name, temperature=0.9)
+    def __init__(self, model_name="gpt-3.5-turbo", client=None):
+        self.model_name = model_name
+        self._client = client
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = get_client()
+        return self._client
+
+    @client.setter
+    def client(self, client):
+        self._client = client
+
+    @staticmethod
+    def placeholder(difficulty):
+        return f"{difficulty.capitalize()} placeholder sentence."
+
+    @staticmethod
+    def is_placeholder(sentence):
+        return sentence.endswith(" placeholder sentence.")
 
-    def generate_prompts(self, difficulty="beginner", count=5):
+    def generate_prompts(self, difficulty="beginner", count=5, fallback=True):
         instruction_map = {
             "beginner": "You are a tutor agent, part of a personalised system, you are teaching students how to use sign language, your job is to generate sentences that are around 4 to 5 words, these should be easy day to day conversational sentences for the user to practice with, be as free and random with your sentences as you want and they should have variety, but they should make logical sense, and make sure to avoid duplicates",
             "intermediate": "You are a tutor agent, part of a personalised system, you are teaching students how to use sign language, your job is to generate sentences that are around 6 to 8 words, these should be sentences you would find in normal social conversations for the user to practice with, be as free and random with your sentences as you want and they should have variety, but they should make logical sense, and make sure to avoid duplicates",
@@ -16,8 +35,9 @@ class PromptLLMGenerator:
         system_prompt = instruction_map[difficulty] + f"\nProvide exactly {count} unique sentences in the format:\n1. Sentence\n2. Sentence\n..."
 
         try:
-            response = self.llm([HumanMessage(content=system_prompt)])
-            text = response.content.strip()
+            # Not coalesced: two pools asking at once should get different sentences
+            text = self.client.chat([{"role": "user", "content": system_prompt}], model=self.model_name,
+                                    temperature=0.9, stage="prompt_generation", coalesce=False).strip()
             lines = re.findall(r"\d+\.\s*(.+)", text)
 
             unique = []
@@ -39,10 +59,10 @@ class PromptLLMGenerator:
                     break
 
             # Fallback
-            while len(unique) < count:
-                unique.append(f"{difficulty.capitalize()} placeholder sentence.")
+            while fallback and len(unique) < count:
+                unique.append(self.placeholder(difficulty))
 
             return unique
         except Exception as e:
             print(f"Prompt generation failed: {e}")
-            return [f"{difficulty.capitalize()} placeholder sentence." for _ in range(count)]
\ No newline at end of file
+            return [self.placeholder(difficulty) for _ in range(count)] if fallback else []
\ No newline at end of file
@@ -0,0 +1,254 @@
+import argparse
+import json
+import logging
+import os
+import threading
+
+import numpy as np
+
+from agents.embedding_engine import normalize_text
+from agents.logger import SessionLogger
+
+# Logging setup
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class PromptIndex:
+    # Embeddings of every prompt we have seen, stored as float16 in a memory-mapped file.
+    # Small indexes are searched exactly; larger ones use random-hyperplane LSH tables with
+    # one-bit multi-probe, then rescore the candidates exactly. Bits per table grow with the
+    # index (about 16 prompts per bucket) so the candidate count stays roughly constant.
+    MAX_BITS = 15
+
+    def __init__(self, embeddings=None, path="logs/prompt_index", dim=384, n_tables=8,
+                 exact_below=20000, seed=0):
+        self.embeddings = embeddings
+        self.path = path
+        self.dim = dim
+        self.n_tables = n_tables
+        self.exact_below = exact_below
+        self.all_planes = np.random.default_rng(seed).standard_normal((dim, n_tables, self.MAX_BITS)).astype(np.float32)
+        self.set_bits(8)
+        self.lock = threading.RLock()
+        self.texts = []
+        self.ids = {}
+        self.count = 0
+        self.vectors = None
+        self.sorted_codes = None
+        self.order = None
+        self.indexed = 0
+        # float32 copy for exact search while the index is small, float16 -> float32 per query is slow.
+        # A view of the first count rows of dense_buffer, which grows geometrically like the vectors
+        self.dense = None
+        self.dense_buffer = None
+        self.load()
+
+    @property
+    def vectors_path(self):
+        return self.path + ".f16"
+
+    @property
+    def texts_path(self):
+        return self.path + ".jsonl"
+
+    def __len__(self):
+        return self.count
+
+    def load(self):
+        if not self.path or not os.path.exists(self.texts_path) or not os.path.exists(self.vectors_path):
+            return
+        with open(self.texts_path, "r") as f:
+            for line in f:
+                try:
+                    self.texts.append(json.loads(line))
+                except ValueError:
+                    # A torn last line from a crash mid-append
+                    break
+        self.count = len(self.texts)
+        self.ids = {normalize_text(t): i for i, t in enumerate(self.texts)}
+        capacity = os.path.getsize(self.vectors_path) // (2 * self.dim)
+        if capacity < self.count:
+            logger.error(f"Prompt index '{self.path}' is truncated, rebuilding it from scratch.")
+            self.texts, self.ids, self.count = [], {}, 0
+            return
+        self.vectors = np.memmap(self.vectors_path, dtype=np.float16, mode="r+", shape=(capacity, self.dim))
+        self.rebuild_tables()
+
+    def save(self):
+        # Texts are appended as they arrive, only the vectors need flushing
+        with self.lock:
+            if isinstance(self.vectors, np.memmap):
+                self.vectors.flush()
+
+    def reserve(self, capacity):
+        # Grow the backing file geometrically so appends stay amortized O(1)
+        current = 0 if self.vectors is None else self.vectors.shape[0]
+        if capacity <= current:
+            return
+        capacity = max(capacity, 2 * current, 1024)
+        if not self.path:
+            grown = np.zeros((capacity, self.dim), dtype=np.float16)
+            if current:
+                grown[:current] = self.vectors
+            self.vectors = grown
+            return
+        os.makedirs(os.path.dirname(self.vectors_path) or ".", exist_ok=True)
+        if self.vectors is not None:
+            self.vectors.flush()
+        with open(self.vectors_path, "ab") as f:
+            f.truncate(capacity * self.dim * 2)
+        self.vectors = np.memmap(self.vectors_path, dtype=np.float16, mode="r+", shape=(capacity, self.dim))
+
+    def set_bits(self, n_bits):
+        self.n_bits = n_bits
+        self.planes = np.ascontiguousarray(self.all_planes[:, :, :n_bits]).reshape(self.dim, -1)
+        self.bit_weights = (1 << np.arange(n_bits)).astype(np.int64)
+
+    def codes(self, vectors):
+        bits = (np.asarray(vectors, dtype=np.float32) @ self.planes) > 0
+        return bits.reshape(len(bits), self.n_tables, self.n_bits).astype(np.int64) @ self.bit_weights
+
+    def rebuild_tables(self):
+        with self.lock:
+            n = self.count
+            if n < self.exact_below:
+                self.sorted_codes, self.order, self.indexed = None, None, 0
+                self.dense_buffer = np.array(self.vectors[:n], dtype=np.float32) if n else None
+                self.dense = self.dense_buffer
+                return
+            self.dense = self.dense_buffer = None
+            self.set_bits(int(np.clip(np.log2(n / 16), 8, self.MAX_BITS)))
+            codes = np.concatenate([self.codes(self.vectors[i:i + 65536]) for i in range(0, n, 65536)])
+            self.order = np.argsort(codes, axis=0, kind="stable").T
+            self.sorted_codes = np.take_along_axis(codes, self.order.T, axis=0).T
+            self.indexed = n
+
+    def add_vectors(self, texts, vectors):
+        with self.lock:
+            new = [(t, v) for t, v in zip(texts, vectors) if normalize_text(t) not in self.ids]
+            if not new:
+                return 0
+            self.reserve(self.count + len(new))
+            added = []
+            for text, vector in new:
+                key = normalize_text(text)
+                if key in self.ids:
+                    continue
+                self.vectors[self.count] = vector
+                self.ids[key] = self.count
+                self.texts.append(text)
+                self.count += 1
+                added.append(text)
+            if self.path:
+                with open(self.texts_path, "a") as f:
+                    f.write("".join(json.dumps(t) + "\n" for t in added))
+            # Items past self.indexed are scanned exactly until the tables are rebuilt
+            if self.count < self.exact_below:
+                self.append_dense(self.vectors[self.count - len(added):self.count])
+            elif self.count - self.indexed > max(1024, self.indexed // 10):
+                self.rebuild_tables()
+            return len(added)
+
+    def append_dense(self, fresh):
+        # Called with self.lock held; amortized O(1) per row instead of a concatenate per add
+        n = 0 if self.dense is None else len(self.dense)
+        if self.dense_buffer is None or n + len(fresh) > len(self.dense_buffer):
+            grown = np.empty((max(n + len(fresh), 2 * n, 1024), self.dim), dtype=np.float32)
+            grown[:n] = self.dense
+            self.dense_buffer = grown
+        self.dense_buffer[n:n + len(fresh)] = fresh
+        self.dense = self.dense_buffer[:n + len(fresh)]
+
+    def add(self, texts, cache=True):
+        texts = [t for t in dict.fromkeys(texts) if t and normalize_text(t) not in self.ids]
+        if not texts:
+            return 0
+        # Bulk loads bypass the embedding cache, it holds the prompts and captions being graded now
+        vectors = self.embeddings.embed(texts) if cache else self.embeddings.encode([normalize_text(t) for t in texts])
+        return self.add_vectors(texts, vectors)
+
+    def build(self, memory=None, log_dir="logs", chunk_size=4096):
+        # Bootstrap from the reinforcement memory and every recorded session
+        prompts = list(memory.memory) if memory is not None else []
+        prompts.extend(r["prompt"] for r in SessionLogger(log_dir).results())
+        prompts = list(dict.fromkeys(prompts))
+        added = sum(self.add(prompts[i:i + chunk_size], cache=False) for i in range(0, len(prompts), chunk_size))
+        self.save()
+        logger.info(f"Prompt index holds {len(self)} prompts ({added} new).")
+        return added
+
+    def candidates(self, query):
+        found = []
+        query_codes = self.codes(query[None, :])[0]
+        for t in range(self.n_tables):
+            # Probe the query's bucket and every bucket one bit away
+            probes = np.concatenate([[query_codes[t]], query_codes[t] ^ self.bit_weights])
+            lo = np.searchsorted(self.sorted_codes[t], probes, side="left")
+            hi = np.searchsorted(self.sorted_codes[t], probes, side="right")
+            found.extend(self.order[t][a:b] for a, b in zip(lo, hi) if b > a)
+        found.append(np.arange(self.indexed, self.count))
+        return np.unique(np.concatenate(found)) if found else np.arange(0)
+
+    def search_vector(self, query, k=5, exclude=()):
+        with self.lock:
+            if self.count == 0:
+                return []
+            query = np.asarray(query, dtype=np.float32)
+            if self.sorted_codes is None:
+                ids = np.arange(self.count)
+                scores = self.dense @ query
+            else:
+                ids = self.candidates(query)
+                scores = self.vectors[ids].astype(np.float32) @ query
+            want = min(k + len(exclude), len(scores))
+            top = np.argpartition(-scores, want - 1)[:want]
+            top = top[np.argsort(-scores[top])]
+            results = []
+            for i in top:
+                text = self.texts[ids[i]]
+                if text in exclude:
+                    continue
+                results.append((text, float(scores[i])))
+                if len(results) >= k:
+                    break
+            return results
+
+    def search(self, text, k=5, exclude=()):
+        return self.search_vector(self.embeddings.embed([text])[0], k, exclude)
+
+    def is_near_duplicate(self, text, threshold=0.92):
+        match = self.search(text, k=1)
+        return bool(match) and match[0][1] >= threshold
+
+    def similar_prompts(self, prompts, count, exclude=(), min_score=0.6, max_score=0.95):
+        # Known prompts close to (but not the same as) the given ones, best matches first
+        if not prompts or count <= 0:
+            return []
+        found = {}
+        for vector in self.embeddings.embed(list(prompts)):
+            for text, score in self.search_vector(vector, k=count + len(prompts)):
+                if min_score <= score < max_score and text not in prompts and not any(text in seen for seen in exclude):
+                    found[text] = max(score, found.get(text, 0.0))
+        return sorted(found, key=found.get, reverse=True)[:count]
+
+
+# python -m agents.prompt_index --build [--log-dir logs] [--user <id>]
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prompt index maintenance.")
+    parser.add_argument("--log-dir", default="logs")
+    parser.add_argument("--build", action="store_true", help="index the prompt history (first run)")
+    parser.add_argument("--user", default=None, help="also index this learner's reinforcement memory")
+    args = parser.parse_args()
+
+    if args.build:
+        from agents.embedding_engine import EmbeddingEngine
+        from agents.reinforce_memory import ReinforcementMemory
+
+        # Same encoder as controller.py; build() bypasses the embedding cache anyway
+        engine = EmbeddingEngine("all-MiniLM-L6-v2", cache_path=None,
+                                 backend=os.environ.get("SIGN_ENCODER_BACKEND", "torch"),
+                                 threads=int(os.environ.get("SIGN_ENCODER_THREADS", 0)) or None)
+        index = PromptIndex(engine, path=os.path.join(args.log_dir, "prompt_index"))
+        added = index.build(ReinforcementMemory(args.log_dir, user_id=args.user), args.log_dir)
+        print(f"📦 Indexed {added} new prompt(s), {len(index)} in {index.path}.")
@@ -0,0 +1,169 @@
+import json
+import logging
+import os
+import threading
+from collections import deque
+
+from agents.metrics import metrics
+
+# Logging setup
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class PromptPool:
+    # Validated prompts generated ahead of time per difficulty level. A background worker
+    # refills a level once it drops below low_water, so starting a lesson is a pool read.
+    LEVELS = ("beginner", "intermediate", "advanced")
+
+    def __init__(self, generator, low_water=10, target=30, refill_batch=10,
+                 path="logs/prompt_pool.json", retry_seconds=30.0, recent_size=5000, index=None):
+        self.generator = generator
+        # Optional PromptIndex, generated sentences too close to a known prompt are rejected
+        self.index = index
+        self.low_water = low_water
+        self.target = target
+        self.refill_batch = refill_batch
+        self.path = path
+        self.retry_seconds = retry_seconds
+        self.pools = {level: deque() for level in self.LEVELS}
+        self.keys = set()
+        # Recently served prompts, so a refill does not bring them straight back
+        self.recent = deque(maxlen=recent_size)
+        self.recent_keys = set()
+        self.refilling = set()
+        self.cond = threading.Condition()
+        self.worker = None
+        self.stopped = False
+        self.load()
+
+    @staticmethod
+    def key(prompt):
+        return prompt.strip().lower()
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            for level in self.LEVELS:
+                self.add(level, data.get(level, []))
+        except Exception as e:
+            logger.error(f"Failed to load prompt pool '{self.path}': {e}")
+
+    def save(self):
+        if not self.path:
+            return
+        with self.cond:
+            data = {level: list(pool) for level, pool in self.pools.items()}
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def add(self, level, prompts):
+        added = 0
+        with self.cond:
+            for prompt in prompts:
+                k = self.key(prompt)
+                if not k or self.generator.is_placeholder(prompt) or k in self.keys or k in self.recent_keys:
+                    continue
+                self.pools[level].append(prompt.strip())
+                self.keys.add(k)
+                added += 1
+        return added
+
+    def take(self, level, count, exclude=()):
+        # Never blocks on the LLM: returns what is available, possibly fewer than count.
+        # exclude is a sequence of containers (sets, dicts) of prompts the learner already has.
+        taken, skipped = [], []
+        with self.cond:
+            pool = self.pools[level]
+            while pool and len(taken) < count:
+                prompt = pool.popleft()
+                k = self.key(prompt)
+                if any(prompt in seen for seen in exclude):
+                    # Already in this learner's history, leave it for someone else
+                    skipped.append(prompt)
+                    continue
+                self.keys.discard(k)
+                if len(self.recent) == self.recent.maxlen:
+                    self.recent_keys.discard(self.key(self.recent[0]))
+                self.recent.append(prompt)
+                self.recent_keys.add(k)
+                taken.append(prompt)
+            pool.extendleft(reversed(skipped))
+            self.cond.notify_all()
+        metrics.inc("prompt_pool_served_total", len(taken), level=level)
+        return taken
+
+    def replace_placeholders(self, prompts, level, exclude=()):
+        placeholders = [i for i, p in enumerate(prompts) if self.generator.is_placeholder(p)]
+        if not placeholders:
+            return prompts
+        replacements = self.take(level, len(placeholders), exclude=tuple(exclude) + (set(prompts),))
+        prompts = list(prompts)
+        for i, replacement in zip(placeholders, replacements):
+            prompts[i] = replacement
+        return prompts
+
+    def size(self, level):
+        with self.cond:
+            return len(self.pools[level])
+
+    def next_level_to_fill(self):
+        for level in self.LEVELS:
+            if len(self.pools[level]) < self.low_water:
+                self.refilling.add(level)
+            elif len(self.pools[level]) >= self.target:
+                self.refilling.discard(level)
+        if not self.refilling:
+            return None
+        return min(self.refilling, key=lambda level: len(self.pools[level]))
+
+    def fill_once(self, level):
+        try:
+            prompts = self.generator.generate_prompts(difficulty=level, count=self.refill_batch, fallback=False)
+        except Exception as e:
+            logger.error(f"Prompt pool refill for {level} failed: {e}")
+            prompts = []
+        if self.index is not None and prompts:
+            try:
+                prompts = [p for p in prompts if not self.index.is_near_duplicate(p)]
+            except Exception as e:
+                logger.error(f"Near-duplicate check failed: {e}")
+        added = self.add(level, prompts)
+        if added:
+            self.save()
+        return added
+
+    def run(self):
+        while True:
+            with self.cond:
+                level = self.next_level_to_fill()
+                while level is None and not self.stopped:
+                    self.cond.wait()
+                    level = self.next_level_to_fill()
+                if self.stopped:
+                    return
+            if not self.fill_once(level):
+                # Nothing usable came back, wait before asking the LLM again
+                metrics.inc("prompt_pool_empty_refills_total", level=level)
+                with self.cond:
+                    self.cond.wait(timeout=self.retry_seconds)
+
+    def start(self):
+        if self.worker is None or not self.worker.is_alive():
+            self.stopped = False
+            self.worker = threading.Thread(target=self.run, name="prompt-pool", daemon=True)
+            self.worker.start()
+        return self
+
+    def stop(self):
+        with self.cond:
+            self.stopped = True
+            self.cond.notify_all()
+        if self.worker is not None:
+            self.worker.join()
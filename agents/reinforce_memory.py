@@ -1,62 +1,294 @@
 import json
 import os
+import threading
 from collections import defaultdict, Counter
 from datetime import datetime
+from urllib.parse import quote
+
+from filelock import FileLock
+
+from agents.metrics import metrics
+from agents.review_scheduler import ReviewScheduler, record_time
+
+
+def learner_dir(log_dir, user_id):
+    # Directory of a learner's memory shard, log_dir itself for the shared memory. Percent-encoding
+    # keeps distinct ids apart ("a/b" and "a_b" used to share a shard); "." and ".." are escaped too
+    if user_id is None:
+        return log_dir
+    name = quote(str(user_id), safe="")
+    if name in ("", ".", ".."):
+        name = "%" + name.replace(".", "%2E")
+    return os.path.join(log_dir, "learners", name)
 
 
 class ReinforcementMemory:
-    def __init__(self, log_dir="logs", memory_file="reinforcement_memory.json"):
+    # Snapshot of all records plus an append-only journal of changes since that snapshot.
+    # Per-prompt failure/success counters are kept up to date as records arrive, so lesson-end
+    # work only depends on the size of the lesson, not on the stored history.
+    # With a user_id the memory is a per-learner shard under <log_dir>/learners/<quoted user_id>/.
+    def __init__(self, log_dir="logs", memory_file="reinforcement_memory.json", user_id=None,
+                 weak_threshold=0.6, strong_threshold=0.9, compact_every=5000):
+        log_dir = learner_dir(log_dir, user_id)
+        self.user_id = user_id
         self.log_dir = log_dir
         self.memory_path = os.path.join(log_dir, memory_file)
-        self.memory = defaultdict(list)
+        self.journal_path = os.path.splitext(self.memory_path)[0] + ".journal.jsonl"
+        # Review schedule of the weak prompts, written with every snapshot
+        self.schedule_path = os.path.splitext(self.memory_path)[0] + ".schedule.json"
+        self.weak_threshold = weak_threshold
+        self.strong_threshold = strong_threshold
+        self.compact_every = compact_every
+        # Lock order is always self.lock, then the file lock shared with other processes
+        self.lock = threading.RLock()
+        self.file_lock = FileLock(self.memory_path + ".lock")
+        self.compactor = None
+        self.reset_state()
         self.load_memory()
 
+    def reset_state(self):
+        self.memory = defaultdict(list)
+        self.failures = Counter()
+        self.successes = Counter()
+        self.schedule = ReviewScheduler(self.weak_threshold)
+        self.pending = []
+        self.seq = 0
+        self.journal_offset = 0
+        self.journal_entries = 0
+        self.snapshot_stamp = None
+
+    def file_stamp(self, path):
+        try:
+            st = os.stat(path)
+            return st.st_mtime_ns, st.st_size, st.st_ino
+        except FileNotFoundError:
+            return None
+
     def load_memory(self):
+        os.makedirs(self.log_dir, exist_ok=True)
+        with self.lock, self.file_lock:
+            self.load_from_disk()
+
+    def load_from_disk(self):
+        self.reset_state()
+        snapshot_seq = 0
         if os.path.exists(self.memory_path):
             with open(self.memory_path, "r") as f:
-                self.memory = defaultdict(list, json.load(f))
+                data = json.load(f)
+            # Older memory files are a bare {prompt: records} mapping
+            if "version" in data and "memory" in data:
+                snapshot_seq = data.get("seq", 0)
+                data = data["memory"]
+            for prompt, records in data.items():
+                for r in records:
+                    self.add_record(prompt, r)
+        if not self.schedule.load(self.schedule_path, snapshot_seq):
+            # No schedule for this snapshot (older file, or a crash between the two writes)
+            self.schedule.rebuild(self.memory)
+        self.snapshot_stamp = self.file_stamp(self.memory_path)
+        self.seq = snapshot_seq
+        self.read_journal(snapshot_seq)
+
+    def read_journal(self, min_seq):
+        # Apply journal entries past self.journal_offset, skipping ones already in the snapshot
+        if not os.path.exists(self.journal_path):
+            return
+        with open(self.journal_path, "rb") as f:
+            f.seek(self.journal_offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # A torn last line from a crash mid-append, the next append starts a new line
+                    break
+                self.journal_offset += len(line)
+                self.journal_entries += 1
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if entry["seq"] > min_seq:
+                    self.apply(entry)
+                    self.seq = max(self.seq, entry["seq"])
+
+    def catch_up(self):
+        # Called with both locks held: pick up whatever other writers added since our last look
+        journal_size = os.path.getsize(self.journal_path) if os.path.exists(self.journal_path) else 0
+        if self.file_stamp(self.memory_path) != self.snapshot_stamp or journal_size < self.journal_offset:
+            # Someone else compacted or cleared the shard, so rebuild and re-apply our own changes
+            pending = self.pending
+            self.load_from_disk()
+            for entry in pending:
+                self.apply(entry)
+            self.pending = pending
+        elif journal_size > self.journal_offset:
+            self.read_journal(self.seq)
+
+    def add_record(self, prompt, record):
+        self.memory[prompt].append(record)
+        if record["similarity"] < self.weak_threshold:
+            self.failures[prompt] += 1
+        if record["similarity"] >= self.strong_threshold:
+            self.successes[prompt] += 1
+
+    def drop_prompt(self, prompt):
+        self.memory.pop(prompt, None)
+        self.failures.pop(prompt, None)
+        self.successes.pop(prompt, None)
+        self.schedule.remove(prompt)
+
+    def apply(self, entry):
+        if entry["op"] == "add":
+            self.add_record(entry["prompt"], entry["record"])
+            self.schedule.review(entry["prompt"], entry["record"]["similarity"], record_time(entry["record"]))
+        elif entry["op"] == "drop":
+            self.drop_prompt(entry["prompt"])
+
+    def log(self, entry):
+        self.pending.append(entry)
+
+    def flush_pending(self):
+        # Called with both locks held
+        self.catch_up()
+        if not self.pending:
+            return
+        lines = []
+        for entry in self.pending:
+            self.seq += 1
+            entry["seq"] = self.seq
+            lines.append(json.dumps(entry) + "\n")
+        with open(self.journal_path, "ab") as f:
+            if f.tell() > self.journal_offset:
+                # Leftover torn line, terminate it so it is skipped on replay
+                f.write(b"\n")
+            f.write("".join(lines).encode("utf-8"))
+            self.journal_offset = f.tell()
+        self.journal_entries += len(lines)
+        self.pending = []
 
     def save_memory(self):
-        os.makedirs(self.log_dir, exist_ok=True)
-        with open(self.memory_path, "w") as f:
-            json.dump(self.memory, f, indent=2)
+        with self.lock:
+            if not self.pending:
+                return
+            os.makedirs(self.log_dir, exist_ok=True)
+            with metrics.span("memory.save", entries=len(self.pending)), self.file_lock:
+                self.flush_pending()
+            compact = self.journal_entries >= self.compact_every
+        if compact:
+            self.compact_in_background()
+
+    def compact_in_background(self):
+        if self.compactor is not None and self.compactor.is_alive():
+            return
+        self.compactor = threading.Thread(target=self.compact, daemon=True)
+        self.compactor.start()
+
+    def wait_for_compaction(self):
+        if self.compactor is not None:
+            self.compactor.join()
+
+    def write_snapshot(self, path, snapshot, snapshot_seq):
+        with open(path, "w") as f:
+            json.dump({"version": 2, "seq": snapshot_seq, "memory": snapshot}, f)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def compact(self):
+        # Copy the state under the locks, write the snapshot without them, then swap it in
+        with self.lock, self.file_lock:
+            self.flush_pending()
+            snapshot = {prompt: list(records) for prompt, records in self.memory.items()}
+            schedule = {prompt: list(entry) for prompt, entry in self.schedule.entries.items()}
+            failed = dict(self.schedule.failed)
+            snapshot_seq = self.seq
+            journal_offset = self.journal_offset
+            snapshot_stamp = self.snapshot_stamp
 
-    def prune_memory(self, threshold=0.9, min_successes=2):
+        tmp_path = f"{self.memory_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        self.write_snapshot(tmp_path, snapshot, snapshot_seq)
+        schedule_tmp_path = f"{self.schedule_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        self.schedule.save(schedule_tmp_path, snapshot_seq, schedule, failed)
+
+        with self.lock, self.file_lock:
+            if self.file_stamp(self.memory_path) != snapshot_stamp:
+                # Another writer compacted in the meantime, its snapshot wins
+                os.remove(tmp_path)
+                os.remove(schedule_tmp_path)
+                return
+            os.replace(tmp_path, self.memory_path)
+            os.replace(schedule_tmp_path, self.schedule_path)
+            # Entries that arrived while the snapshot was being written stay in the journal
+            tail = b""
+            if os.path.exists(self.journal_path):
+                with open(self.journal_path, "rb") as f:
+                    f.seek(journal_offset)
+                    tail = f.read()
+            tmp_path = self.journal_path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(tail)
+            os.replace(tmp_path, self.journal_path)
+            self.snapshot_stamp = self.file_stamp(self.memory_path)
+            self.journal_offset = len(tail)
+            self.journal_entries = tail.count(b"\n")
+
+    def prune_memory(self, threshold=0.9, min_successes=2, prompts=None):
         # Remove prompts with consistently high success
-        strong = self.get_strong_glosses(threshold, min_successes)
-        for prompt in strong:
-            if prompt in self.memory:
-                del self.memory[prompt]
+        with self.lock:
+            if threshold == self.strong_threshold:
+                candidates = self.successes if prompts is None else prompts
+                strong = [p for p in candidates if self.successes.get(p, 0) >= min_successes]
+            else:
+                strong = self.get_strong_glosses(threshold, min_successes)
+            for prompt in strong:
+                if prompt in self.memory:
+                    self.drop_prompt(prompt)
+                    self.log({"op": "drop", "prompt": prompt})
 
     def update(self, session_log):
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        for entry in session_log:
-            key = entry['prompt']
-            self.memory[key].append({
-                "gloss": entry['gloss'],
-                "caption": entry['caption'],
-                "similarity": entry['similarity'],
-                "result": entry['result'],
-                "timestamp": timestamp
-            })
-        self.prune_memory()
+        now = datetime.now().replace(microsecond=0)
+        timestamp = now.strftime("%Y-%m-%d %H:%M:%S")
+        with self.lock:
+            touched = set()
+            for entry in session_log:
+                key = entry['prompt']
+                record = {
+                    "gloss": entry['gloss'],
+                    "caption": entry['caption'],
+                    "similarity": entry['similarity'],
+                    "result": entry['result'],
+                    "timestamp": timestamp
+                }
+                self.add_record(key, record)
+                self.schedule.review(key, record["similarity"], now.timestamp())
+                self.log({"op": "add", "prompt": key, "record": record})
+                touched.add(key)
+            self.prune_memory(prompts=touched)
         self.save_memory()
 
+    def due_prompts(self, count, now=None, exclude=()):
+        # Weak prompts due for review, most overdue first
+        with self.lock:
+            return self.schedule.due(count, now, exclude)
+
     def get_weak_glosses(self, threshold=0.6, min_failures=2):
-        failures = Counter()
-        for prompt, records in self.memory.items():
-            for r in records:
-                if r["similarity"] < threshold:
-                    failures[prompt] += 1
-        return [g for g, count in failures.items() if count >= min_failures]
+        with self.lock:
+            if threshold == self.weak_threshold:
+                return [g for g, count in self.failures.items() if count >= min_failures]
+            failures = Counter()
+            for prompt, records in self.memory.items():
+                for r in records:
+                    if r["similarity"] < threshold:
+                        failures[prompt] += 1
+            return [g for g, count in failures.items() if count >= min_failures]
 
     def get_strong_glosses(self, threshold=0.9, min_successes=2):
-        successes = Counter()
-        for prompt, records in self.memory.items():
-            for r in records:
-                if r["similarity"] >= threshold:
-                    successes[prompt] += 1
-        return [g for g, count in successes.items() if count >= min_successes]
+        with self.lock:
+            if threshold == self.strong_threshold:
+                return [g for g, count in self.successes.items() if count >= min_successes]
+            successes = Counter()
+            for prompt, records in self.memory.items():
+                for r in records:
+                    if r["similarity"] >= threshold:
+                        successes[prompt] += 1
+            return [g for g, count in successes.items() if count >= min_successes]
 
     def summarize_history(self):
         summary = {
@@ -67,7 +299,18 @@ class ReinforcementMemory:
         return summary
 
     def clear_memory(self):
-        self.memory = defaultdict(list)
-        self.save_memory()
+        self.wait_for_compaction()
+        os.makedirs(self.log_dir, exist_ok=True)
+        with self.lock, self.file_lock:
+            self.catch_up()
+            seq = self.seq
+            self.reset_state()
+            self.seq = seq
+            tmp_path = self.memory_path + ".tmp"
+            self.write_snapshot(tmp_path, {}, seq)
+            os.replace(tmp_path, self.memory_path)
+            open(self.journal_path, "w").close()
+            if os.path.exists(self.schedule_path):
+                os.remove(self.schedule_path)
+            self.snapshot_stamp = self.file_stamp(self.memory_path)
         print("🧽 Reinforcement memory cleared.")
-
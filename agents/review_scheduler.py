@@ -0,0 +1,152 @@
+import heapq
+import os
+import time
+from datetime import datetime
+from functools import lru_cache
+
+import orjson
+
+DAY = 24 * 60 * 60
+
+
+@lru_cache(maxsize=4096)
+def parse_timestamp(timestamp):
+    # Records of one lesson share a timestamp, so most lookups are cache hits
+    try:
+        return datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S").timestamp()
+    except ValueError:
+        return 0.0
+
+
+def record_time(record):
+    # Memory records carry "%Y-%m-%d %H:%M:%S" timestamps
+    return parse_timestamp(record.get("timestamp", ""))
+
+
+class ReviewScheduler:
+    # SM-2 style spaced repetition for weak prompts. As with get_weak_glosses, a prompt is
+    # scheduled once it has been answered below weak_threshold min_failures times; every later
+    # result updates its ease and interval from the similarity score. A lapse makes the prompt
+    # due again after relearn_seconds, immediately by default, so the next lesson re-drills it.
+    # A heap ordered by due time, with stale entries skipped lazily, makes picking the k most
+    # overdue prompts O(k log n) instead of a scan over the whole history.
+    def __init__(self, weak_threshold=0.6, min_failures=2, relearn_seconds=0, first_interval=DAY,
+                 second_interval=6 * DAY, initial_ease=2.5, min_ease=1.3):
+        self.weak_threshold = weak_threshold
+        self.min_failures = min_failures
+        self.relearn_seconds = relearn_seconds
+        self.first_interval = first_interval
+        self.second_interval = second_interval
+        self.initial_ease = initial_ease
+        self.min_ease = min_ease
+        # prompt -> [due, interval, ease, reps]
+        self.entries = {}
+        # prompt -> failures so far, for prompts not scheduled yet
+        self.failed = {}
+        # (due, prompt); an item is stale once the prompt's due time has moved on
+        self.heap = []
+
+    def review(self, prompt, similarity, now=None):
+        now = time.time() if now is None else now
+        entry = self.entries.get(prompt)
+        if entry is None:
+            if similarity >= self.weak_threshold:
+                return None
+            failed = self.failed.get(prompt, 0) + 1
+            if failed < self.min_failures:
+                self.failed[prompt] = failed
+                return None
+            self.failed.pop(prompt, None)
+            entry = self.entries[prompt] = [0.0, 0.0, self.initial_ease, 0]
+
+        _, interval, ease, reps = entry
+        # Similarity as SM-2's 0-5 answer quality
+        quality = 5 * min(max(similarity, 0.0), 1.0)
+        ease = max(self.min_ease, ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+        if similarity < self.weak_threshold:
+            reps, interval = 0, self.relearn_seconds
+        else:
+            reps += 1
+            if reps == 1:
+                interval = self.first_interval
+            elif reps == 2:
+                interval = self.second_interval
+            else:
+                interval = interval * ease
+        entry[:] = [now + interval, interval, ease, reps]
+        self.push(prompt, entry[0])
+        return entry[0]
+
+    def push(self, prompt, due):
+        heapq.heappush(self.heap, (due, prompt))
+        # Lazy deletion leaves stale items behind, rebuild once they outnumber the live ones
+        if len(self.heap) > 2 * len(self.entries) + 64:
+            self.heap = [(entry[0], p) for p, entry in self.entries.items()]
+            heapq.heapify(self.heap)
+
+    def remove(self, prompt):
+        self.entries.pop(prompt, None)
+        self.failed.pop(prompt, None)
+
+    def due(self, k, now=None, exclude=()):
+        # Up to k prompts that are due, most overdue first. They stay scheduled until reviewed.
+        now = time.time() if now is None else now
+        picked, skipped, seen = [], [], set()
+        while self.heap and len(picked) < k:
+            due, prompt = self.heap[0]
+            if due > now:
+                break
+            heapq.heappop(self.heap)
+            entry = self.entries.get(prompt)
+            # Two reviews with the same time leave two live-looking items, keep one
+            if entry is None or entry[0] != due or prompt in seen:
+                continue
+            seen.add(prompt)
+            if any(prompt in group for group in exclude):
+                skipped.append((due, prompt))
+            else:
+                picked.append((due, prompt))
+        for item in picked + skipped:
+            heapq.heappush(self.heap, item)
+        return [prompt for _, prompt in picked]
+
+    def rebuild(self, memory):
+        # Schedule from scratch by replaying every stored record in time order
+        self.entries, self.failed, self.heap = {}, {}, []
+        records = sorted(((record_time(r), prompt, r["similarity"]) for prompt, rs in memory.items() for r in rs),
+                         key=lambda item: item[0])
+        for ts, prompt, similarity in records:
+            self.review(prompt, similarity, ts)
+
+    def save(self, path, seq, entries=None, failed=None):
+        # entries and failed default to the live state; callers swap the file into place themselves.
+        # Columns rather than one object per prompt keep the file small and quick to parse
+        entries = self.entries if entries is None else entries
+        failed = self.failed if failed is None else failed
+        prompts = list(entries)
+        columns = list(zip(*entries.values())) if prompts else [[], [], [], []]
+        data = {"version": 2, "seq": seq, "prompts": prompts, "due": columns[0], "interval": columns[1],
+                "ease": columns[2], "reps": columns[3], "failed": failed}
+        with open(path, "wb") as f:
+            f.write(orjson.dumps(data))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def load(self, path, seq):
+        # True if the file matches the memory snapshot at seq, otherwise the caller rebuilds
+        try:
+            with open(path, "rb") as f:
+                data = orjson.loads(f.read())
+        except (FileNotFoundError, orjson.JSONDecodeError):
+            return False
+        if data.get("version") != 2 or data.get("seq") != seq:
+            return False
+        self.entries = {p: [d, i, e, r] for p, d, i, e, r in
+                        zip(data["prompts"], data["due"], data["interval"], data["ease"], data["reps"])}
+        self.failed = data["failed"]
+        self.heap = [(entry[0], p) for p, entry in self.entries.items()]
+        heapq.heapify(self.heap)
+        return True
+
+    def __len__(self):
+        return len(self.entries)
@@ -1,23 +1,45 @@
+import os
 import random
 
 class RLAgent:
-    def __init__(self, environment):
+    def __init__(self, environment, q_table_path=None):
         self.env = environment
         self.q_table = {}  # In-memory Q-table for now
         self.epsilon = 0.2  # Exploration rate
         self.alpha = 0.5    # Learning rate
         self.gamma = 0.9    # Discount factor
 
+        # A table trained offline (agents/rl_training.py), one row of action values per encoded
+        # state. Kept as lists: per-element numpy indexing is slower than the dict lookups it replaces
+        self.q_rows = None
+        if q_table_path and os.path.exists(q_table_path):
+            from agents.rl_training import ACTIONS, encode_env_state, load_q_table
+            self.q_rows = load_q_table(q_table_path).tolist()
+            self.actions = ACTIONS
+            self.encode_state = encode_env_state
+
     def get_state_key(self, state):
         return f"{state['difficulty_level']}_{state['consecutive_successes']}_{state['consecutive_failures']}"
 
     def choose_action(self, state):
+        if self.q_rows is not None:
+            if random.random() < self.epsilon:
+                return random.choice(self.actions)
+            row = self.q_rows[self.encode_state(state)]
+            return self.actions[row.index(max(row))]
+
         state_key = self.get_state_key(state)
         if random.random() < self.epsilon or state_key not in self.q_table:
             return random.choice(self.env.get_available_actions())
         return max(self.q_table[state_key], key=self.q_table[state_key].get)
 
     def update_q_table(self, state, action, reward, new_state):
+        if self.q_rows is not None:
+            row, a = self.q_rows[self.encode_state(state)], self.actions.index(action)
+            future_reward = max(self.q_rows[self.encode_state(new_state)])
+            row[a] += self.alpha * (reward + self.gamma * future_reward - row[a])
+            return
+
         state_key = self.get_state_key(state)
         new_key = self.get_state_key(new_state)
 
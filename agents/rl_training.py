@@ -0,0 +1,174 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from agents.rl_environment import TeachingEnvironment
+
+# Offline training for RLAgent: many simulated learners step through lessons in vectorized
+# batches and the Q-table is a dense array indexed by encoded environment states.
+
+LEVELS = TeachingEnvironment().difficulty_levels
+ACTIONS = TeachingEnvironment().get_available_actions()
+MAX_STREAK = 5
+STREAKS = MAX_STREAK + 1
+N_STATES = len(LEVELS) * STREAKS * STREAKS
+N_ACTIONS = len(ACTIONS)
+INCREASE, DECREASE = ACTIONS.index("increase_difficulty"), ACTIONS.index("decrease_difficulty")
+
+# How hard each level is on the simulated learner's skill scale
+LEVEL_DIFFICULTY = np.array([-1.0, 0.5, 2.0])
+PROMPTS_PER_LESSON = 5
+
+
+def encode_state(level, successes, failures):
+    # Streaks are capped, beyond MAX_STREAK the policy does not need to tell them apart
+    return (level * STREAKS + np.minimum(successes, MAX_STREAK)) * STREAKS + np.minimum(failures, MAX_STREAK)
+
+
+def encode_env_state(state):
+    # encode_state for one environment state in plain ints, numpy scalar maths would cost more than the lookup
+    successes = min(state["consecutive_successes"], MAX_STREAK)
+    failures = min(state["consecutive_failures"], MAX_STREAK)
+    return (LEVELS.index(state["difficulty_level"]) * STREAKS + successes) * STREAKS + failures
+
+
+def new_q_table():
+    return np.zeros((N_STATES, N_ACTIONS), dtype=np.float32)
+
+
+def save_q_table(q_table, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp.npy"
+    np.save(tmp_path, np.asarray(q_table, dtype=np.float32))
+    os.replace(tmp_path, path)
+
+
+def load_q_table(path):
+    # The table is a few hundred floats, read it into memory; online updates stay in this process
+    return np.load(path)
+
+
+class SimulatedLearners:
+    # A batch of learners with their own skill and learning rate, all stepped at once
+    def __init__(self, count, rng):
+        self.rng = rng
+        self.skill = rng.normal(0.0, 1.0, count)
+        self.learn_rate = rng.uniform(0.0, 0.15, count)
+        self.level = np.zeros(count, dtype=np.int64)
+        self.successes = np.zeros(count, dtype=np.int64)
+        self.failures = np.zeros(count, dtype=np.int64)
+
+    def play_lesson(self):
+        p_correct = 1.0 / (1.0 + np.exp(-(self.skill - LEVEL_DIFFICULTY[self.level])))
+        correct = self.rng.binomial(PROMPTS_PER_LESSON, p_correct)
+        # Practice pays off most when the level is challenging but not out of reach
+        self.skill += self.learn_rate * 4 * p_correct * (1 - p_correct)
+        return correct
+
+    def state(self):
+        return encode_state(self.level, self.successes, self.failures)
+
+    def apply_action(self, actions):
+        self.level = np.clip(self.level + (actions == INCREASE) - (actions == DECREASE), 0, len(LEVELS) - 1)
+
+    def compute_reward(self, correct):
+        # Same rules as TeachingEnvironment.compute_reward, for the whole batch
+        success = correct / PROMPTS_PER_LESSON >= 0.85
+        self.successes = np.where(success, self.successes + 1, 0)
+        self.failures = np.where(success, 0, self.failures + 1)
+        return np.where(self.successes >= 2, 1.0, np.where(self.failures >= 2, -1.0, 0.0))
+
+
+def train_batch(q_table, learners, lessons, rng, epsilon=0.2, alpha=0.5, gamma=0.9):
+    visits = np.zeros_like(q_table, dtype=np.int64)
+    for _ in range(lessons):
+        correct = learners.play_lesson()
+        state = learners.state()
+        greedy = q_table[state].argmax(axis=1)
+        explore = rng.random(len(state)) < epsilon
+        actions = np.where(explore, rng.integers(0, N_ACTIONS, len(state)), greedy)
+        learners.apply_action(actions)
+        reward = learners.compute_reward(correct)
+        new_state = learners.state()
+
+        target = reward + gamma * q_table[new_state].max(axis=1)
+        delta = alpha * (target - q_table[state, actions])
+        # Learners hitting the same (state, action) share one averaged update
+        flat = state * N_ACTIONS + actions
+        counts = np.bincount(flat, minlength=q_table.size)
+        sums = np.bincount(flat, weights=delta, minlength=q_table.size)
+        hit = counts > 0
+        q_table.reshape(-1)[hit] += (sums[hit] / counts[hit]).astype(np.float32)
+        visits += counts.reshape(visits.shape)
+    return visits
+
+
+def train_worker(job):
+    q_table, episodes, batch_size, lessons, seed, epsilon = job
+    rng = np.random.default_rng(seed)
+    q_table = q_table.copy()
+    visits = np.zeros_like(q_table, dtype=np.int64)
+    for start in range(0, episodes, batch_size):
+        learners = SimulatedLearners(min(batch_size, episodes - start), rng)
+        visits += train_batch(q_table, learners, lessons, rng, epsilon)
+    return q_table, visits
+
+
+def train(episodes, workers=1, batch_size=100_000, lessons=20, rounds=5, epsilon=0.2, seed=0, q_table=None):
+    # Each round every worker trains a copy on its share of episodes, then the copies are
+    # merged, weighting each (state, action) by how often that worker visited it
+    q_table = new_q_table() if q_table is None else np.array(q_table, dtype=np.float32)
+    per_job = max(episodes // (rounds * workers), 1)
+    pool = ProcessPoolExecutor(workers) if workers > 1 else None
+    try:
+        for r in range(rounds):
+            jobs = [(q_table, per_job, batch_size, lessons, seed * 1_000_003 + r * workers + w, epsilon)
+                    for w in range(workers)]
+            outcomes = list(pool.map(train_worker, jobs)) if pool else [train_worker(j) for j in jobs]
+            tables = np.stack([o[0] for o in outcomes])
+            weights = np.stack([o[1] for o in outcomes]).astype(np.float64)
+            total = weights.sum(axis=0)
+            merged = (tables * weights).sum(axis=0) / np.where(total == 0, 1, total)
+            q_table = np.where(total > 0, merged, q_table).astype(np.float32)
+    finally:
+        if pool:
+            pool.shutdown()
+    return q_table, per_job * rounds * workers
+
+
+def describe_policy(q_table):
+    lines = []
+    for level, name in enumerate(LEVELS):
+        for successes in range(3):
+            for failures in range(3):
+                if successes and failures:
+                    continue
+                action = ACTIONS[int(q_table[encode_state(level, successes, failures)].argmax())]
+                lines.append(f"  {name:<12} successes={successes} failures={failures} -> {action}")
+    return "\n".join(lines)
+
+
+# python -m agents.rl_training --episodes 5000000 --workers 4 --output logs/rl_q_table.npy
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the difficulty policy on simulated learners.")
+    parser.add_argument("--episodes", type=int, default=1_000_000)
+    parser.add_argument("--lessons", type=int, default=20, help="lessons per episode")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--batch-size", type=int, default=100_000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--epsilon", type=float, default=0.2)
+    parser.add_argument("--output", default="logs/rl_q_table.npy")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    q_table, episodes = train(args.episodes, args.workers, args.batch_size, args.lessons, args.rounds, args.epsilon)
+    elapsed = time.perf_counter() - start
+    save_q_table(q_table, args.output)
+
+    print(f"Trained on {episodes:,} episodes in {elapsed:.1f}s ({episodes / elapsed * 60:,.0f} episodes/min)")
+    print("Learned policy:")
+    print(describe_policy(q_table))
+    print(f"💾 Q-table saved to {args.output}")
@@ -0,0 +1,67 @@
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+
+class StartupTimer:
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.phases = []
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append({
+                "phase": name,
+                "start_ms": round((start - self.origin) * 1000, 1),
+                "duration_ms": round((time.perf_counter() - start) * 1000, 1),
+            })
+
+    def report(self):
+        return {
+            "total_ms": round((time.perf_counter() - self.origin) * 1000, 1),
+            "phases": list(self.phases),
+        }
+
+    def print_report(self):
+        report = self.report()
+        print("\n⏱️ Startup report:")
+        for p in report["phases"]:
+            print(f"  {p['phase']:<32} {p['duration_ms']:>9.1f} ms (at {p['start_ms']:.1f} ms)")
+        print(f"  {'total':<32} {report['total_ms']:>9.1f} ms")
+
+    def write_report(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(self.report(), f, indent=2)
+
+
+# Shared timer, lazy loaders record their first load here
+startup_timer = StartupTimer()
+
+
+# Cold start measurement for CI: python -m agents.startup [--load-models] [--output report.json]
+if __name__ == "__main__":
+    # Run as __main__, so use the timer instance the lazy loaders import
+    from agents.startup import startup_timer
+
+    with startup_timer.phase("import controller"):
+        import controller
+
+    with startup_timer.phase("construct agents"):
+        captioner = controller.Captioner()
+        tutor = controller.AdaptiveTutorAgent()
+        monitor = controller.BehaviorMonitorAgent()
+
+    if "--load-models" in sys.argv:
+        controller.embedding_engine.model
+        captioner.client.http
+
+    startup_timer.print_report()
+    if "--output" in sys.argv:
+        startup_timer.write_report(sys.argv[sys.argv.index("--output") + 1])
@@ -1,43 +1,74 @@
 import logging
-from langchain_community.llms import HuggingFacePipeline
-from langchain.prompts import PromptTemplate
-from langchain.chains import LLMChain
-from transformers import AutoModelForSeq2SeqLM, AutoTokenizer, pipeline
-import torch
+import threading
+
+from agents.startup import startup_timer
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Short names for the selectable summary models, smaller ones are CPU friendly
+SUMMARY_MODELS = {
+    "xl": "google/flan-t5-xl",
+    "large": "google/flan-t5-large",
+    "base": "google/flan-t5-base",
+    "small": "google/flan-t5-small",
+}
 
-class SummaryAgent:
-    def __init__(self, model_name="google/flan-t5-xl"):
-        logger.info(f"Loading summary model: {model_name}")
-        try:
-            tokenizer = AutoTokenizer.from_pretrained(model_name)
-            model = AutoModelForSeq2SeqLM.from_pretrained(
-                model_name,
-                torch_dtype=torch.float16 if torch.cuda.is_available() else torch.float32,
-                low_cpu_mem_usage=True
-            )
+# Loaded models are shared by every SummaryAgent (and session) in the process,
+# and by the local captioning backend
+_shared_models = {}
+_shared_lock = threading.Lock()
 
-            device = 0 if torch.cuda.is_available() else -1
-            logger.info(f"Using device: {'GPU' if device == 0 else 'CPU'}")
-            pipe = pipeline(
-                "text2text-generation",
-                model=model,
-                tokenizer=tokenizer,
-                max_new_tokens=256,
-                num_beams=4,
-                device=device
-            )
 
-            self.llm = HuggingFacePipeline(pipeline=pipe)
-        except Exception as e:
-            logger.error(f"Failed to load summary model: {e}")
-            raise
+def load_seq2seq_model(model_name, quantize=False):
+    key = (model_name, quantize)
+    with _shared_lock:
+        if key not in _shared_models:
+            with startup_timer.phase(f"load seq2seq model {model_name}"):
+                _shared_models[key] = _load_model(model_name, quantize)
+        return _shared_models[key]
+
 
-        prompt_template = """
+def _load_model(model_name, quantize):
+    import torch
+    from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
+
+    logger.info(f"Loading seq2seq model: {model_name}")
+    try:
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModelForSeq2SeqLM.from_pretrained(
+            model_name,
+            torch_dtype=torch.float16 if torch.cuda.is_available() else torch.float32,
+            low_cpu_mem_usage=True
+        )
+        model.eval()
+
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+        logger.info(f"Using device: {'GPU' if device == 'cuda' else 'CPU'}")
+        if device == "cuda":
+            model = model.to(device)
+        elif quantize:
+            # int8 weights for the Linear layers, activations stay float
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+            logger.info("Applied int8 dynamic quantization.")
+        return tokenizer, model, device
+    except Exception as e:
+        logger.error(f"Failed to load seq2seq model {model_name}: {e}")
+        raise
+
+
+class SummaryAgent:
+    def __init__(self, model_name="google/flan-t5-xl", quantize=False, num_beams=4,
+                 max_new_tokens=256, chunk_tokens=400):
+        self.model_name = SUMMARY_MODELS.get(model_name, model_name)
+        self.quantize = quantize
+        self.num_beams = num_beams
+        self.max_new_tokens = max_new_tokens
+        # Logs longer than this are summarized chunk by chunk and the partial summaries merged
+        self.chunk_tokens = chunk_tokens
+
+        self.prompt_template = """
 You are a language learning assistant. Based on the following lesson performance log,
 generate a concise summary of how the student did. Highlight strengths, weaknesses,
 patterns, and suggest one area for improvement. Be encouraging.
@@ -45,25 +76,97 @@ patterns, and suggest one area for improvement. Be encouraging.
 Log:
 {log}
 """
+        self.merge_template = """
+You are a language learning assistant. The following are summaries of consecutive parts of
+one lesson. Combine them into one concise summary of how the student did. Highlight strengths,
+weaknesses, patterns, and suggest one area for improvement. Be encouraging.
+
+Partial summaries:
+{summaries}
+"""
+
+    @property
+    def model(self):
+        # Loaded on the first summary request, then shared
+        return load_seq2seq_model(self.model_name, self.quantize)
 
-        prompt = PromptTemplate.from_template(prompt_template)
-        self.chain = LLMChain(llm=self.llm, prompt=prompt)
+    def format_entry(self, entry):
+        formatted = f"- Prompt: {entry['prompt']}\n"
+        formatted += f"  Gloss: {entry['gloss']}\n"
+        formatted += f"  Caption: {entry['caption']}\n"
+        formatted += f"  Similarity: {entry['similarity']:.2f}\n"
+        formatted += f"  Result: {entry['result']}\n\n"
+        return formatted
 
     def format_log(self, session_log):
-        formatted = ""
+        return "".join(self.format_entry(entry) for entry in session_log).strip()
+
+    def chunk_log(self, session_log):
+        tokenizer = self.model[0]
+        chunks = []
+        current, current_tokens = "", 0
         for entry in session_log:
-            formatted += f"- Prompt: {entry['prompt']}\n"
-            formatted += f"  Gloss: {entry['gloss']}\n"
-            formatted += f"  Caption: {entry['caption']}\n"
-            formatted += f"  Similarity: {entry['similarity']:.2f}\n"
-            formatted += f"  Result: {entry['result']}\n\n"
-        return formatted.strip()
+            formatted = self.format_entry(entry)
+            tokens = len(tokenizer.encode(formatted, add_special_tokens=False))
+            if current and current_tokens + tokens > self.chunk_tokens:
+                chunks.append(current.strip())
+                current, current_tokens = "", 0
+            current += formatted
+            current_tokens += tokens
+        if current:
+            chunks.append(current.strip())
+        return chunks
+
+    def generate(self, text, streamer=None, num_beams=None):
+        import torch
+
+        tokenizer, model, device = self.model
+        inputs = tokenizer(text, return_tensors="pt", truncation=True).to(device)
+        with torch.inference_mode():
+            output = model.generate(
+                **inputs,
+                max_new_tokens=self.max_new_tokens,
+                num_beams=num_beams or self.num_beams,
+                streamer=streamer,
+            )
+        return tokenizer.decode(output[0], skip_special_tokens=True).strip()
+
+    def final_prompt(self, session_log):
+        chunks = self.chunk_log(session_log)
+        if len(chunks) <= 1:
+            return self.prompt_template.format(log=chunks[0] if chunks else "")
+        partials = [self.generate(self.prompt_template.format(log=chunk)) for chunk in chunks]
+        return self.merge_template.format(summaries="\n".join(f"- {p}" for p in partials))
 
     def summarize(self, session_log):
         try:
-            formatted_log = self.format_log(session_log)
-            summary = self.chain.run({"log": formatted_log})
-            return summary.strip()
+            return self.generate(self.final_prompt(session_log))
         except Exception as e:
             logger.error(f"Error generating summary: {e}")
             return "Summary generation failed."
+
+    def stream_summary(self, session_log):
+        # Yields the final summary piece by piece as tokens are generated (greedy decoding)
+        try:
+            from transformers import TextIteratorStreamer
+
+            prompt = self.final_prompt(session_log)
+            streamer = TextIteratorStreamer(self.model[0], skip_prompt=True, skip_special_tokens=True)
+
+            def run():
+                try:
+                    self.generate(prompt, streamer, num_beams=1)
+                except Exception as e:
+                    logger.error(f"Error generating summary: {e}")
+                    # Unblock the consumer below
+                    streamer.end()
+
+            worker = threading.Thread(target=run, daemon=True)
+            worker.start()
+            for text in streamer:
+                if text:
+                    yield text
+            worker.join()
+        except Exception as e:
+            logger.error(f"Error generating summary: {e}")
+            yield "Summary generation failed."
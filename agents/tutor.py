@@ -1,12 +1,21 @@
 import random
 from agents.reinforce_memory import ReinforcementMemory
 from agents.prompt_generator import PromptLLMGenerator
+from agents.prompt_pool import PromptPool
 
 class AdaptiveTutorAgent:
-    def __init__(self):
+    def __init__(self, user_id=None, memory_pool=None, prompt_pool=None, prompt_index=None):
         self.performance_level = "beginner"
-        self.memory = ReinforcementMemory()
+        self.user_id = user_id
+        if memory_pool is not None:
+            self.memory = memory_pool.get(user_id)
+        else:
+            self.memory = ReinforcementMemory(user_id=user_id)
         self.prompt_generator = PromptLLMGenerator()
+        # Shared between tutors when passed in; call prompt_pool.start() to refill in the background
+        self.prompt_index = prompt_index
+        self.prompt_pool = prompt_pool if prompt_pool is not None else PromptPool(self.prompt_generator, index=prompt_index)
+        self.history = set()
 
     def update_performance(self, correct, total):
         accuracy = correct / total if total else 0
@@ -20,9 +29,8 @@ class AdaptiveTutorAgent:
     def get_prompt_batch(self, batch_size=5):
         prompts = []
 
-        # 🧠 Always prioritize weak prompts first
-        weak = self.memory.get_weak_glosses()
-        weak_prompts_to_use = weak[:batch_size]
+        # 🧠 Always prioritize weak prompts that are due for review, most overdue first
+        weak_prompts_to_use = self.memory.due_prompts(batch_size)
 
         if weak_prompts_to_use:
             print(f"🔁 Reinforcing {len(weak_prompts_to_use)} weak prompt(s):")
@@ -30,13 +38,33 @@ class AdaptiveTutorAgent:
                 print(f"   - {prompt}")
             prompts.extend(weak_prompts_to_use)
 
-        # 🎯 Fill remaining slots with new prompts
+        # 🧭 Known prompts close to the weak ones, no LLM call needed
+        remaining = batch_size - len(prompts)
+        if remaining > 0 and weak_prompts_to_use and self.prompt_index is not None:
+            similar = self.prompt_index.similar_prompts(
+                weak_prompts_to_use, remaining, exclude=(self.history, set(prompts)))
+            if similar:
+                print(f"🧭 Adding {len(similar)} prompt(s) similar to weak ones.")
+                prompts.extend(similar)
+
+        # 🎯 Fill remaining slots with pre-generated prompts the learner has not seen yet
+        remaining = batch_size - len(prompts)
+        if remaining > 0:
+            exclude = (self.history, self.memory.memory, set(prompts))
+            prompts.extend(self.prompt_pool.take(self.performance_level, remaining, exclude=exclude))
+
+        # 🐢 Pool ran dry, ask the LLM directly and patch any placeholders from the pool
         remaining = batch_size - len(prompts)
         if remaining > 0:
             new_prompts = self.prompt_generator.generate_prompts(
                 difficulty=self.performance_level,
                 count=remaining
             )
+            new_prompts = self.prompt_pool.replace_placeholders(
+                new_prompts, self.performance_level, exclude=(self.history, set(prompts)))
             prompts.extend(new_prompts)
 
+        self.history.update(prompts)
+        if self.prompt_index is not None:
+            self.prompt_index.add(prompts)
         return prompts
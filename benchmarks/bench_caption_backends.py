@@ -0,0 +1,118 @@
+import argparse
+import os
+import re
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents.caption_cache import CaptionCache
+from agents.captioner import Captioner
+from agents.llm_client import LLMClient
+from agents.logger import SessionLogger
+
+# Remote versus local captioning: throughput and latency under concurrent load, then
+# parity of the local captions with the reference captions using the lesson grading function.
+# Without --remote-url the remote backend is the local fake server with --remote-latency-ms.
+# Usage: python benchmarks/bench_caption_backends.py [--log-dir logs] [--local-model google/flan-t5-small]
+
+
+class NoCache:
+    # Every caption goes to the backend being measured
+    def get(self, key):
+        return None
+
+    def put(self, key, caption, latency):
+        pass
+
+    def save(self):
+        pass
+
+    def __len__(self):
+        return 0
+
+
+def load_references(log_dir, limit):
+    # (gloss, reference caption) pairs: recorded remote captions, or the few-shot examples
+    pairs = {}
+    for r in SessionLogger(log_dir).results():
+        gloss = r["gloss"].strip().upper()
+        if gloss and r["caption"] != "Translation failed.":
+            pairs.setdefault(gloss, r["caption"])
+        if len(pairs) >= limit:
+            break
+    if not pairs:
+        template = Captioner(cache=CaptionCache(path=None)).prompt_template
+        pairs = {g: c.strip() for g, c in re.findall(r"^- (.+?) → (.+)$", template, flags=re.MULTILINE)}
+    return list(pairs.items())
+
+
+def load_test(captioner, glosses, concurrency):
+    latencies = []
+
+    def timed(gloss):
+        start = time.perf_counter()
+        caption = captioner.caption(gloss)
+        latencies.append(time.perf_counter() - start)
+        return caption
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        captions = list(pool.map(timed, glosses))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return captions, {
+        "per_sec": len(glosses) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(0.95 * (len(latencies) - 1))] * 1000,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--log-dir", default="logs")
+    parser.add_argument("--glosses", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--local-model", default="google/flan-t5-base")
+    parser.add_argument("--remote-url", default=None, help="OpenAI-compatible base URL, default: fake server")
+    parser.add_argument("--remote-latency-ms", type=float, default=400.0)
+    args = parser.parse_args()
+
+    pairs = load_references(args.log_dir, args.glosses)
+    glosses = [g for g, _ in pairs]
+    # Repeat the set so every backend sees the same amount of work
+    workload = (glosses * (args.glosses // len(glosses) + 1))[:args.glosses]
+
+    server = None
+    if args.remote_url is None:
+        from fake_llm_server import FakeLLMServer
+        server = FakeLLMServer(("127.0.0.1", 0), args.remote_latency_ms / 1000, args.remote_latency_ms / 4000).start()
+    client = LLMClient(base_url=args.remote_url or server.base_url, api_key=None if args.remote_url else "fake")
+
+    backends = {
+        "remote": Captioner(cache=NoCache(), use_exact_matches=False, client=client),
+        "local": Captioner(cache=NoCache(), use_exact_matches=False, backend="local", local_model=args.local_model),
+    }
+    # Load the local model before timing anything
+    backends["local"].local.caption(glosses[0])
+
+    print(f"{'backend':<8} {'captions/s':>11} {'p50 ms':>8} {'p95 ms':>8}")
+    outputs = {}
+    for name, captioner in backends.items():
+        captions, result = load_test(captioner, workload, args.concurrency)
+        outputs[name] = captions[:len(glosses)]
+        print(f"{name:<8} {result['per_sec']:>11.1f} {result['p50_ms']:>8.1f} {result['p95_ms']:>8.1f}")
+    if server is not None:
+        server.shutdown()
+
+    from controller import is_semantically_similar
+
+    agree, scores = 0, []
+    for (gloss, reference), local in zip(pairs, outputs["local"]):
+        similar, score = is_semantically_similar(reference, local)
+        agree += similar
+        scores.append(score)
+    print(f"\nLocal vs reference captions on {len(pairs)} glosses (grading threshold 0.75):")
+    print(f"  graded as the same: {agree / len(pairs):.1%}, mean similarity {statistics.mean(scores):.3f}")
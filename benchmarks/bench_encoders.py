@@ -0,0 +1,113 @@
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Parity and speed of the grading encoder backends (torch, int8, onnx) on recorded attempts.
+# Every stored (prompt, caption) pair is scored by each backend in a fresh process, so RSS is
+# per backend, and the scores are compared with full-precision torch at the grading threshold.
+# Usage: python benchmarks/bench_encoders.py --log-dir logs [--threads 4] [--limit 5000]
+
+BACKENDS = ["torch", "int8", "onnx"]
+
+
+def load_pairs(log_dir, limit):
+    from agents.logger import SessionLogger
+
+    pairs = []
+    for record in SessionLogger(log_dir).read():
+        for r in record.get("results", []):
+            if r.get("prompt") and r.get("caption"):
+                pairs.append((r["prompt"], r["caption"]))
+                if len(pairs) >= limit:
+                    return pairs
+    return pairs
+
+
+def run_child(backend, log_dir, limit, threads):
+    import psutil
+
+    from agents.embedding_engine import load_encoder, normalize_text
+
+    pairs = load_pairs(log_dir, limit)
+    texts = sorted({normalize_text(t) for pair in pairs for t in pair})
+
+    start = time.perf_counter()
+    encoder = load_encoder("all-MiniLM-L6-v2", backend, threads)
+    encoder.encode(["warm up"], normalize_embeddings=True)
+    load_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    vectors = encoder.encode(texts, batch_size=64, convert_to_numpy=True, normalize_embeddings=True,
+                             show_progress_bar=False).astype(np.float32)
+    encode_s = time.perf_counter() - start
+
+    rows = {text: i for i, text in enumerate(texts)}
+    a = vectors[[rows[normalize_text(p)] for p, _ in pairs]]
+    b = vectors[[rows[normalize_text(c)] for _, c in pairs]]
+    return {
+        "backend": backend,
+        "load_s": round(load_s, 2),
+        "texts": len(texts),
+        "texts_per_s": round(len(texts) / encode_s, 1) if encode_s else 0.0,
+        "rss_mb": round(psutil.Process().memory_info().rss / 2 ** 20, 1),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "scores": np.einsum("ij,ij->i", a, b).round(5).tolist(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare grading encoder backends on stored session logs.")
+    parser.add_argument("--log-dir", default="logs")
+    parser.add_argument("--backends", nargs="+", default=BACKENDS, choices=BACKENDS)
+    parser.add_argument("--threads", type=int, default=None, help="encoder threads, default: all cores")
+    parser.add_argument("--limit", type=int, default=5000, help="attempts to score")
+    parser.add_argument("--threshold", type=float, default=0.75)
+    parser.add_argument("--child", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_child(args.child, args.log_dir, args.limit, args.threads)))
+        return
+
+    backends = ["torch"] + [b for b in args.backends if b != "torch"]
+    results = {}
+    for backend in backends:
+        command = [sys.executable, __file__, "--child", backend, "--log-dir", args.log_dir, "--limit", str(args.limit)]
+        if args.threads:
+            command += ["--threads", str(args.threads)]
+        proc = subprocess.run(command, capture_output=True, text=True)
+        if proc.returncode != 0:
+            print(f"{backend:>6} failed: {proc.stderr.strip().splitlines()[-1:]}")
+            continue
+        results[backend] = json.loads(proc.stdout.strip().splitlines()[-1])
+
+    if "torch" not in results:
+        print("The torch reference did not run, nothing to compare against.")
+        sys.exit(1)
+    reference = np.array(results["torch"]["scores"])
+    if not len(reference):
+        print(f"No graded attempts found in {args.log_dir}.")
+        sys.exit(1)
+    passed = reference >= args.threshold
+
+    print(f"{len(reference)} attempts, {results['torch']['texts']} distinct texts, threshold {args.threshold}")
+    print(f"{'backend':>7} {'agree %':>8} {'flips':>6} {'mean |d|':>9} {'max |d|':>8} "
+          f"{'texts/s':>8} {'load s':>7} {'RSS MB':>7} {'peak MB':>8}")
+    for backend, r in results.items():
+        scores = np.array(r["scores"])
+        delta = np.abs(scores - reference)
+        flips = int(((scores >= args.threshold) != passed).sum())
+        print(f"{backend:>7} {100 * (1 - flips / len(reference)):>8.2f} {flips:>6} {delta.mean():>9.4f} "
+              f"{delta.max():>8.4f} {r['texts_per_s']:>8} {r['load_s']:>7} {r['rss_mb']:>7} {r['peak_rss_mb']:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents.monitor import FleetMonitor
+
+# Per-attempt update cost and fleet rollup latency of FleetMonitor for growing numbers of learners.
+# Usage: python benchmarks/bench_fleet_monitor.py [learners...]
+
+ATTEMPTS_PER_LEARNER = 20
+ROLLUPS = 50
+
+
+def make_events(learners, rng):
+    events = []
+    for _ in range(ATTEMPTS_PER_LEARNER * learners):
+        result = rng.choices(("Correct", "Incorrect", "Skipped"), (0.6, 0.3, 0.1))[0]
+        events.append((f"learner-{rng.randrange(learners)}", result, rng.uniform(0.2, 1.0), rng.uniform(1.0, 30.0)))
+    return events
+
+
+def bench(learners):
+    rng = random.Random(learners)
+    events = make_events(learners, rng)
+    fleet = FleetMonitor()
+
+    transitions = 0
+    start = time.perf_counter()
+    for event in events:
+        transitions += fleet.observe(*event) is not None
+    observe_s = time.perf_counter() - start
+
+    timings = []
+    for _ in range(ROLLUPS):
+        start = time.perf_counter()
+        fleet.rollup()
+        timings.append((time.perf_counter() - start) * 1000)
+
+    state_bytes = sum(getattr(fleet, name).nbytes for name in (
+        "outcomes", "similarity", "latency", "counts", "similarity_sum", "latency_sum", "timed",
+        "filled", "position", "state", "last_seen", "active"))
+    return {
+        "learners": learners,
+        "observe_us": round(observe_s / len(events) * 1e6, 2),
+        "transitions": transitions,
+        "rollup_p50_ms": round(statistics.median(timings), 3),
+        "state_mb": round(state_bytes / 2 ** 20, 2),
+    }
+
+
+if __name__ == "__main__":
+    sizes = [int(s) for s in sys.argv[1:]] or [1_000, 10_000, 100_000]
+    print(f"{'learners':>10} {'observe us':>11} {'transitions':>12} {'rollup ms':>10} {'state MB':>9}")
+    for size in sizes:
+        r = bench(size)
+        print(f"{r['learners']:>10} {r['observe_us']:>11} {r['transitions']:>12} {r['rollup_p50_ms']:>10} {r['state_mb']:>9}")
@@ -0,0 +1,81 @@
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents.llm_client import LLMClient
+from fake_llm_server import FakeLLMServer
+
+# Caption-style requests against the local fake server: throughput, upstream calls and
+# retries for a fresh connection per call versus the shared pooled, coalescing client.
+# Usage: python benchmarks/bench_llm_client.py [--requests 2000] [--distinct 200] [--burst 4] [--error-rate 0.05]
+
+TEMPLATE = "Translate the following gloss into a natural English sentence:\n{gloss}\n→"
+
+
+def messages(i, args):
+    # Identical requests arrive in bursts, like a class signing the same prompt
+    return [{"role": "user", "content": TEMPLATE.format(gloss=f"ME WANT FOOD {(i // args.burst) % args.distinct}")}]
+
+
+def run(client, args):
+    start = time.perf_counter()
+    failed = 0
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        futures = [pool.submit(client.chat, messages(i, args), stage="bench") for i in range(args.requests)]
+        for future in futures:
+            try:
+                future.result()
+            except Exception:
+                failed += 1
+    return time.perf_counter() - start, failed
+
+
+class PerCallClient:
+    # What each agent did before: a new connection per call, no coalescing, no retries
+    def __init__(self, base_url):
+        self.base_url = base_url
+
+    def chat(self, messages, **kwargs):
+        response = httpx.post(f"{self.base_url}/chat/completions", timeout=30.0,
+                              json={"model": "gpt-3.5-turbo", "messages": messages, "temperature": 0.4})
+        response.raise_for_status()
+        return response.json()["choices"][0]["message"]["content"]
+
+    def client_stats(self):
+        return {"retries": 0, "coalesced": 0}
+
+    def close(self):
+        pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--distinct", type=int, default=200)
+    parser.add_argument("--burst", type=int, default=4, help="identical requests in a row")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    args = parser.parse_args()
+
+    print(f"{'client':<10} {'req/s':>8} {'upstream':>9} {'retries':>8} {'coalesced':>10} {'failed':>7}")
+    for name in ("per-call", "shared"):
+        server = FakeLLMServer(("127.0.0.1", 0), args.latency_ms / 1000, 0.0, args.error_rate).start()
+        if name == "per-call":
+            client = PerCallClient(server.base_url)
+        else:
+            client = LLMClient(base_url=server.base_url, api_key="fake", backoff_base=0.05,
+                               requests_per_minute=10 ** 7, tokens_per_minute=10 ** 9,
+                               max_connections=args.concurrency)
+        elapsed, failed = run(client, args)
+        stats = client.client_stats()
+        print(f"{name:<10} {args.requests / elapsed:>8.1f} {server.counts['requests']:>9} {stats['retries']:>8} "
+              f"{stats['coalesced']:>10} {failed:>7}")
+        client.close()
+        server.shutdown()
@@ -0,0 +1,87 @@
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents.prompt_index import PromptIndex
+
+# Query latency and recall@10 of PromptIndex against exact search.
+# Usage: python benchmarks/bench_prompt_index.py [sizes...]
+
+DIM = 384
+QUERIES = 200
+K = 10
+
+
+CHUNK = 100_000
+
+
+def make_vectors(n, centers, rng):
+    # Clustered unit vectors, roughly like sentence embeddings of related prompts
+    vectors = centers[rng.integers(0, len(centers), n)] + 0.35 * rng.standard_normal((n, DIM)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def exact_top_k(vectors, n, queries):
+    # Chunked brute force over the memory-mapped float16 vectors
+    best_ids = np.zeros((len(queries), 0), dtype=np.int64)
+    best_scores = np.zeros((len(queries), 0), dtype=np.float32)
+    for i in range(0, n, CHUNK):
+        scores = queries @ np.asarray(vectors[i:i + CHUNK], dtype=np.float32).T
+        ids = np.broadcast_to(np.arange(i, i + scores.shape[1]), scores.shape)
+        best_scores = np.concatenate([best_scores, scores], axis=1)
+        best_ids = np.concatenate([best_ids, ids], axis=1)
+        keep = np.argsort(-best_scores, axis=1)[:, :K]
+        best_scores = np.take_along_axis(best_scores, keep, axis=1)
+        best_ids = np.take_along_axis(best_ids, keep, axis=1)
+    return best_ids
+
+
+def bench(n):
+    rng = np.random.default_rng(n)
+    centers = rng.standard_normal((max(n // 50, 1), DIM)).astype(np.float32)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index = PromptIndex(path=os.path.join(tmp, "prompt_index"), dim=DIM)
+        start = time.perf_counter()
+        for i in range(0, n, CHUNK):
+            size = min(CHUNK, n - i)
+            index.add_vectors([f"prompt {j}" for j in range(i, i + size)], make_vectors(size, centers, rng))
+        index.rebuild_tables()
+        build_s = time.perf_counter() - start
+
+        # Queries are slightly perturbed stored prompts
+        queries = np.asarray(index.vectors[rng.integers(0, n, QUERIES)], dtype=np.float32)
+        queries += 0.01 * rng.standard_normal(queries.shape).astype(np.float32)
+        queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+        truth = exact_top_k(index.vectors, n, queries)
+
+        timings = []
+        recall = []
+        for q, exact in zip(queries, truth):
+            start = time.perf_counter()
+            found = index.search_vector(q, k=K)
+            timings.append((time.perf_counter() - start) * 1e6)
+            recall.append(len({f"prompt {j}" for j in exact} & {text for text, _ in found}) / K)
+        del index
+
+    return {
+        "n": n,
+        "build_s": round(build_s, 2),
+        "p50_us": round(statistics.median(timings), 1),
+        "p95_us": round(sorted(timings)[int(0.95 * len(timings))], 1),
+        "recall_at_10": round(statistics.mean(recall), 3),
+    }
+
+
+if __name__ == "__main__":
+    sizes = [int(s) for s in sys.argv[1:]] or [10_000, 100_000, 1_000_000]
+    print(f"{'prompts':>9} {'build s':>8} {'p50 us':>9} {'p95 us':>9} {'recall@10':>10}")
+    for size in sizes:
+        r = bench(size)
+        print(f"{r['n']:>9} {r['build_s']:>8} {r['p50_us']:>9} {r['p95_us']:>9} {r['recall_at_10']:>10}")
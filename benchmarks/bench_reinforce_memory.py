@@ -0,0 +1,80 @@
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents.reinforce_memory import ReinforcementMemory
+
+# Lesson-end latency (update + prune + save) of ReinforcementMemory for growing histories.
+# Usage: python benchmarks/bench_reinforce_memory.py [sizes...]
+
+RECORDS_PER_PROMPT = 10
+LESSONS = 50
+
+
+def make_history(path, attempts):
+    rng = random.Random(attempts)
+    memory = {}
+    for i in range(attempts // RECORDS_PER_PROMPT):
+        memory[f"Practice sentence number {i}."] = [{
+            "gloss": "PRACTICE SENTENCE",
+            "caption": "Practice sentence.",
+            "similarity": round(rng.uniform(0.2, 0.85), 2),
+            "result": "Incorrect",
+            "timestamp": "2025-01-01 00:00:00"
+        } for _ in range(RECORDS_PER_PROMPT)]
+    with open(path, "w") as f:
+        json.dump(memory, f)
+
+
+def make_lesson(rng, attempts):
+    return [{
+        "prompt": f"Practice sentence number {rng.randrange(attempts // RECORDS_PER_PROMPT)}.",
+        "gloss": "PRACTICE SENTENCE",
+        "caption": "Practice sentence.",
+        "similarity": round(rng.uniform(0.2, 1.0), 2),
+        "result": "Correct"
+    } for _ in range(5)]
+
+
+def bench(attempts):
+    with tempfile.TemporaryDirectory() as log_dir:
+        make_history(os.path.join(log_dir, "reinforcement_memory.json"), attempts)
+
+        start = time.perf_counter()
+        memory = ReinforcementMemory(log_dir=log_dir)
+        load_s = time.perf_counter() - start
+
+        rng = random.Random(0)
+        timings = []
+        for _ in range(LESSONS):
+            lesson = make_lesson(rng, attempts)
+            start = time.perf_counter()
+            memory.update(lesson)
+            timings.append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        memory.get_weak_glosses()
+        weak_ms = (time.perf_counter() - start) * 1000
+        memory.wait_for_compaction()
+
+    return {
+        "attempts": attempts,
+        "load_s": round(load_s, 2),
+        "lesson_end_p50_ms": round(statistics.median(timings), 3),
+        "lesson_end_max_ms": round(max(timings), 3),
+        "get_weak_glosses_ms": round(weak_ms, 3),
+    }
+
+
+if __name__ == "__main__":
+    sizes = [int(s) for s in sys.argv[1:]] or [1_000, 10_000, 100_000, 1_000_000]
+    print(f"{'attempts':>10} {'load s':>8} {'p50 ms':>9} {'max ms':>9} {'weak ms':>9}")
+    for size in sizes:
+        r = bench(size)
+        print(f"{r['attempts']:>10} {r['load_s']:>8} {r['lesson_end_p50_ms']:>9} "
+              f"{r['lesson_end_max_ms']:>9} {r['get_weak_glosses_ms']:>9}")
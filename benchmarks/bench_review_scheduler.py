@@ -0,0 +1,85 @@
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents.review_scheduler import DAY, ReviewScheduler
+
+# Picking a lesson's review prompts from the heap scheduler versus the old full scan over the
+# failure counters, plus the cost of saving and loading the schedule, for growing numbers of prompts.
+# Usage: python benchmarks/bench_review_scheduler.py [sizes...]
+
+LESSONS = 200
+BATCH = 5
+
+
+def make_schedule(prompts, now):
+    rng = random.Random(prompts)
+    scheduler = ReviewScheduler()
+    failures = Counter()
+    for i in range(prompts):
+        prompt = f"Practice sentence number {i}."
+        # Failed at some point in the last month, some of them reviewed successfully since
+        start = now - rng.uniform(0, 30 * DAY)
+        # Failed twice, which is when a prompt gets scheduled
+        scheduler.review(prompt, rng.uniform(0.1, 0.59), start - DAY)
+        scheduler.review(prompt, rng.uniform(0.1, 0.59), start)
+        failures[prompt] += 2
+        if rng.random() < 0.5:
+            scheduler.review(prompt, rng.uniform(0.6, 1.0), start + rng.uniform(0, DAY))
+    return scheduler, failures
+
+
+def bench(prompts):
+    now = time.time()
+    start = time.perf_counter()
+    scheduler, failures = make_schedule(prompts, now)
+    build_s = time.perf_counter() - start
+
+    rng = random.Random(0)
+    pick, scan = [], []
+    for _ in range(LESSONS):
+        start = time.perf_counter()
+        batch = scheduler.due(BATCH, now)
+        pick.append((time.perf_counter() - start) * 1e6)
+        # The lesson's results reschedule what was picked
+        for prompt in batch:
+            scheduler.review(prompt, rng.uniform(0.2, 1.0), now)
+
+        start = time.perf_counter()
+        [p for p, count in failures.items() if count >= 2][:BATCH]
+        scan.append((time.perf_counter() - start) * 1e6)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        path = os.path.join(work_dir, "schedule.json")
+        start = time.perf_counter()
+        scheduler.save(path, 1)
+        save_s = time.perf_counter() - start
+        size_mb = os.path.getsize(path) / 2 ** 20
+        start = time.perf_counter()
+        ReviewScheduler().load(path, 1)
+        load_s = time.perf_counter() - start
+
+    return {
+        "prompts": prompts,
+        "build_s": round(build_s, 2),
+        "pick_p50_us": round(statistics.median(pick), 1),
+        "scan_p50_us": round(statistics.median(scan), 1),
+        "save_s": round(save_s, 2),
+        "load_s": round(load_s, 2),
+        "file_mb": round(size_mb, 1),
+    }
+
+
+if __name__ == "__main__":
+    sizes = [int(s) for s in sys.argv[1:]] or [10_000, 100_000, 1_000_000]
+    print(f"{'prompts':>10} {'build s':>8} {'pick us':>9} {'scan us':>11} {'save s':>7} {'load s':>7} {'file MB':>8}")
+    for size in sizes:
+        r = bench(size)
+        print(f"{r['prompts']:>10} {r['build_s']:>8} {r['pick_p50_us']:>9} {r['scan_p50_us']:>11} "
+              f"{r['save_s']:>7} {r['load_s']:>7} {r['file_mb']:>8}")
@@ -0,0 +1,104 @@
+import glob
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents.logger import SessionLogger
+
+# Disk use and full-history scan time: one pretty-printed JSON file per session versus
+# the compressed segment store.
+# Usage: python benchmarks/bench_session_logs.py [sessions...]
+
+WORDS = "I you we like want need go eat drink see school home work friend family today tomorrow".split()
+
+
+def make_session(rng, i):
+    results = []
+    for _ in range(5):
+        prompt = " ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 9))).capitalize() + "."
+        similarity = round(rng.random(), 2)
+        results.append({
+            "prompt": prompt,
+            "gloss": prompt.upper().rstrip("."),
+            "caption": prompt,
+            "similarity": similarity,
+            "result": "Correct" if similarity >= 0.75 else "Incorrect",
+        })
+    return {
+        "user_id": f"learner-{i % 500}",
+        "results": results,
+        "score": 60.0,
+        "difficulty": "intermediate",
+        "state": "engaged",
+        "behavior_action": "Keep going!",
+        "caption_cache": {"exact_hits": 1, "cache_hits": 2, "misses": 2, "hit_rate": 0.6},
+    }
+
+
+def disk_usage(paths):
+    # Allocated blocks, small files each take at least one
+    return sum(os.stat(p).st_blocks * 512 for p in paths)
+
+
+def bench(n):
+    rng = random.Random(n)
+    sessions = [make_session(rng, i) for i in range(n)]
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_dir = os.path.join(tmp, "legacy")
+        os.makedirs(legacy_dir)
+        for i, session in enumerate(sessions):
+            with open(os.path.join(legacy_dir, f"session_2025-01-01_00-00-{i:08d}.json"), "w") as f:
+                json.dump(session, f, indent=2)
+        legacy_files = glob.glob(os.path.join(legacy_dir, "session_*.json"))
+        legacy_bytes = disk_usage(legacy_files)
+
+        start = time.perf_counter()
+        attempts = 0
+        for path in sorted(legacy_files):
+            with open(path, "r") as f:
+                attempts += len(json.load(f)["results"])
+        legacy_scan = time.perf_counter() - start
+
+        store = SessionLogger(os.path.join(tmp, "store"), segment_bytes=8 * 1024 * 1024)
+        start = time.perf_counter()
+        for session in sessions:
+            store.append(session)
+        store.rotate()
+        store.wait_for_compression()
+        write_s = time.perf_counter() - start
+        store_bytes = disk_usage(glob.glob(os.path.join(store.store_dir, "*")))
+
+        start = time.perf_counter()
+        scanned = sum(len(r["results"]) for r in store.read(legacy=False))
+        store_scan = time.perf_counter() - start
+        assert scanned == attempts
+
+        start = time.perf_counter()
+        learner = sum(1 for _ in store.read(user_id="learner-7", legacy=False))
+        learner_s = time.perf_counter() - start
+
+    return {
+        "n": n,
+        "legacy_mb": legacy_bytes / 1e6,
+        "store_mb": store_bytes / 1e6,
+        "legacy_scan_s": legacy_scan,
+        "store_scan_s": store_scan,
+        "write_us": write_s / n * 1e6,
+        "learner_sessions": learner,
+        "learner_s": learner_s,
+    }
+
+
+if __name__ == "__main__":
+    sizes = [int(s) for s in sys.argv[1:]] or [10_000, 100_000]
+    print(f"{'sessions':>9} {'files MB':>9} {'store MB':>9} {'files scan s':>13} {'store scan s':>13} "
+          f"{'append us':>10} {'1 learner s':>12}")
+    for size in sizes:
+        r = bench(size)
+        print(f"{r['n']:>9} {r['legacy_mb']:>9.1f} {r['store_mb']:>9.2f} {r['legacy_scan_s']:>13.2f} "
+              f"{r['store_scan_s']:>13.2f} {r['write_us']:>10.1f} {r['learner_s']:>12.2f}")
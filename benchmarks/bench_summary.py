@@ -0,0 +1,86 @@
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Peak RSS, load time and time to first token for SummaryAgent configurations.
+# Each configuration runs in a fresh process so peak RSS is not shared between them.
+# Usage: python benchmarks/bench_summary.py [--entries 5]
+
+CONFIGS = [
+    {"model": "xl", "quantize": False, "num_beams": 4},
+    {"model": "base", "quantize": False, "num_beams": 1},
+    {"model": "base", "quantize": True, "num_beams": 1},
+    {"model": "small", "quantize": False, "num_beams": 1},
+    {"model": "small", "quantize": True, "num_beams": 1},
+]
+
+
+def make_log(entries):
+    return [{
+        "prompt": f"Where is the library number {i}?",
+        "gloss": "LIBRARY WHERE",
+        "caption": "Where is the library?",
+        "similarity": 0.82 if i % 3 else 0.41,
+        "result": "Correct" if i % 3 else "Incorrect",
+    } for i in range(entries)]
+
+
+def run_child(config, entries):
+    from agents.summary import SummaryAgent
+
+    agent = SummaryAgent(config["model"], quantize=config["quantize"], num_beams=config["num_beams"])
+    log = make_log(entries)
+
+    start = time.perf_counter()
+    agent.model
+    load_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    first_token_s = None
+    pieces = []
+    if config["num_beams"] == 1:
+        for piece in agent.stream_summary(log):
+            if first_token_s is None:
+                first_token_s = time.perf_counter() - start
+            pieces.append(piece)
+    else:
+        # Beam search cannot stream, the first token arrives with the whole summary
+        pieces.append(agent.summarize(log))
+        first_token_s = time.perf_counter() - start
+    total_s = time.perf_counter() - start
+
+    return {
+        **config,
+        "entries": entries,
+        "load_s": round(load_s, 2),
+        "first_token_s": round(first_token_s or total_s, 2),
+        "total_s": round(total_s, 2),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "summary_chars": len("".join(pieces)),
+    }
+
+
+if __name__ == "__main__":
+    entries = int(sys.argv[sys.argv.index("--entries") + 1]) if "--entries" in sys.argv else 5
+
+    if "--child" in sys.argv:
+        print(json.dumps(run_child(json.loads(sys.argv[sys.argv.index("--child") + 1]), entries)))
+        sys.exit(0)
+
+    print(f"{'model':>6} {'int8':>5} {'beams':>5} {'load s':>7} {'ttft s':>7} {'total s':>8} {'peak MB':>8}")
+    for config in CONFIGS:
+        proc = subprocess.run(
+            [sys.executable, __file__, "--child", json.dumps(config), "--entries", str(entries)],
+            capture_output=True, text=True,
+        )
+        if proc.returncode != 0:
+            print(f"{config['model']:>6} failed: {proc.stderr.strip().splitlines()[-1:]}")
+            continue
+        r = json.loads(proc.stdout.strip().splitlines()[-1])
+        print(f"{r['model']:>6} {str(r['quantize']):>5} {r['num_beams']:>5} {r['load_s']:>7} "
+              f"{r['first_token_s']:>7} {r['total_s']:>8} {r['peak_rss_mb']:>8}")
@@ -0,0 +1,75 @@
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_llm_server import FakeLLMServer
+from load_lessons import REPO, free_port, run_load, wait_for_server
+
+# Scaling of lesson_supervisor.py with the worker count: aggregate sessions per second and what
+# each worker adds to memory (USS, the pages only that worker has) next to the supervisor that
+# holds the shared models. Each worker count gets a fresh supervisor against the fake LLM server.
+# Usage: python benchmarks/bench_workers.py [--workers 1 2 4 8] [--encoder minilm] [--sessions 1000]
+
+
+def run_fleet(args, workers, fake_llm):
+    work_dir = tempfile.TemporaryDirectory()
+    port = free_port()
+    env = dict(os.environ, OPENAI_BASE_URL=fake_llm.base_url, OPENAI_API_KEY="fake",
+               SIGN_LLM_RPM=str(10 ** 7), SIGN_LLM_TPM=str(10 ** 9), SIGN_LLM_CONNECTIONS=str(args.threads))
+    server = subprocess.Popen(
+        [sys.executable, "lesson_supervisor.py", "--port", str(port), "--workers", str(workers),
+         "--encoder", args.encoder, "--log-dir", work_dir.name, "--threads", str(args.threads)],
+        cwd=REPO, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        wait_for_server(base_url, server, timeout=300.0)
+        return asyncio.run(run_load(args, base_url))
+    finally:
+        server.terminate()
+        server.wait()
+        work_dir.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sessions per second and memory per worker for the lesson supervisor.")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--encoder", choices=["hashing", "minilm"], default="hashing")
+    parser.add_argument("--sessions", type=int, default=1000, help="lessons per worker count")
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--think-ms", type=float, default=50.0)
+    parser.add_argument("--skip-rate", type=float, default=0.1)
+    parser.add_argument("--llm-latency-ms", type=float, default=100.0)
+    parser.add_argument("--threads", type=int, default=32, help="per worker")
+    args = parser.parse_args()
+
+    fake_llm = FakeLLMServer(("127.0.0.1", 0), args.llm_latency_ms / 1000, args.llm_latency_ms / 4000).start()
+    print(f"{'workers':>7} {'sess/s':>7} {'p95 s':>6} {'models MB':>9} {'worker RSS':>10} "
+          f"{'worker USS':>10} {'+MB/worker':>10} {'total MB':>8} {'restarts':>8}")
+    first = None
+    try:
+        for workers in args.workers:
+            idle, samples, totals, elapsed = run_fleet(args, workers, fake_llm)
+            peak = max(samples, key=lambda s: s["rss_mb"]) if samples else idle
+            up = [w for w in peak["workers"] if w["up"]]
+            latencies = sorted(totals["latencies"])
+            p95 = latencies[int(0.95 * (len(latencies) - 1))] if latencies else 0.0
+            worker_uss = statistics.mean(w["uss_mb"] for w in up)
+            first = first or (workers, peak["rss_mb"])
+            # Growth of the whole fleet's footprint per worker added since the first run
+            added = (peak["rss_mb"] - first[1]) / (workers - first[0]) if workers != first[0] else worker_uss
+            print(f"{workers:>7} {len(latencies) / elapsed:>7.1f} {p95:>6.2f} {peak['supervisor_rss_mb']:>9.1f} "
+                  f"{statistics.mean(w['rss_mb'] for w in up):>10.1f} {worker_uss:>10.1f} {added:>10.1f} "
+                  f"{peak['rss_mb']:>8.1f} {peak['restarts']:>8}")
+    finally:
+        fake_llm.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+import argparse
+import asyncio
+import base64
+import os
+import random
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+import orjson
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_llm_server import FakeLLMServer
+from lesson_server import OP_TEXT, ws_encode, ws_read_message
+
+# Load generator for lesson_server.py: many simulated learners run whole lessons over WebSockets,
+# reporting sessions per second, lesson latency and server memory per concurrent session.
+# Without --url it starts a server with the hashing encoder against the local fake LLM server.
+# Usage: python benchmarks/load_lessons.py [--sessions 2000] [--concurrency 500] [--url http://127.0.0.1:8080]
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class Busy(Exception):
+    pass
+
+
+async def ws_connect(host, port, path):
+    reader, writer = await asyncio.open_connection(host, port)
+    key = base64.b64encode(os.urandom(16)).decode("ascii")
+    writer.write((f"GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                  f"Sec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n").encode("latin-1"))
+    await writer.drain()
+    head = await reader.readuntil(b"\r\n\r\n")
+    status = int(head.split(b" ", 2)[1])
+    if status != 101:
+        writer.close()
+        raise Busy(status)
+    return reader, writer
+
+
+async def send(writer, message):
+    writer.write(ws_encode(OP_TEXT, orjson.dumps(message), mask=True))
+    await writer.drain()
+
+
+async def run_learner(i, args, host, port, totals):
+    rng = random.Random(i)
+    path = f"/ws?user=load-{i % args.users}"
+    while True:
+        try:
+            reader, writer = await ws_connect(host, port, path)
+            break
+        except Busy:
+            totals["rejected"] += 1
+            await asyncio.sleep(rng.uniform(0.1, 0.5))
+        except ConnectionError:
+            totals["connect_errors"] += 1
+            await asyncio.sleep(rng.uniform(0.1, 0.5))
+
+    start = time.perf_counter()
+    try:
+        await send(writer, {"type": "start"})
+        while True:
+            text = await ws_read_message(reader, writer, 1 << 20, mask=True)
+            if text is None:
+                totals["dropped"] += 1
+                return
+            event = orjson.loads(text)
+            if event["event"] == "prompt":
+                await asyncio.sleep(rng.uniform(0, 2 * args.think_ms / 1000))
+                # Sign the prompt word for word, now and then skip it
+                gloss = "" if rng.random() < args.skip_rate else re.sub(r"[^A-Za-z ]", "", event["prompt"]).upper()
+                await send(writer, {"type": "gloss", "gloss": gloss})
+            elif event["event"] == "lesson_end":
+                totals["latencies"].append(time.perf_counter() - start)
+                await send(writer, {"type": "end"})
+                return
+            elif event["event"] == "timeout":
+                totals["timeouts"] += 1
+    finally:
+        writer.close()
+
+
+async def sample_stats(base_url, samples, stop):
+    async with httpx.AsyncClient(base_url=base_url, timeout=5.0) as client:
+        while not stop.is_set():
+            try:
+                samples.append((await client.get("/stats")).json())
+            except httpx.HTTPError:
+                pass
+            try:
+                await asyncio.wait_for(stop.wait(), 0.25)
+            except asyncio.TimeoutError:
+                pass
+
+
+async def run_load(args, base_url):
+    host, port = base_url.split("//", 1)[1].rsplit(":", 1)
+    totals = {"latencies": [], "rejected": 0, "connect_errors": 0, "dropped": 0, "timeouts": 0}
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        idle = (await client.get("/stats")).json()
+
+    samples, stop = [], asyncio.Event()
+    sampler = asyncio.create_task(sample_stats(base_url, samples, stop))
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def limited(i):
+        async with semaphore:
+            await run_learner(i, args, host, int(port), totals)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(limited(i) for i in range(args.sessions)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await sampler
+    return idle, samples, totals, elapsed
+
+
+def wait_for_server(base_url, process, timeout=60.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("lesson server exited during startup")
+        try:
+            httpx.get(f"{base_url}/health", timeout=1.0).raise_for_status()
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError("lesson server did not start")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the lesson server with simulated learners.")
+    parser.add_argument("--url", default=None, help="running server, default: start one with fake backends")
+    parser.add_argument("--sessions", type=int, default=2000, help="lessons to run in total")
+    parser.add_argument("--concurrency", type=int, default=500, help="learners connected at once")
+    parser.add_argument("--users", type=int, default=1000, help="distinct learner ids")
+    parser.add_argument("--think-ms", type=float, default=200.0, help="mean time a learner takes to sign")
+    parser.add_argument("--skip-rate", type=float, default=0.1)
+    parser.add_argument("--llm-latency-ms", type=float, default=300.0)
+    parser.add_argument("--max-sessions", type=int, default=500)
+    parser.add_argument("--threads", type=int, default=64, help="server worker threads and LLM connections")
+    args = parser.parse_args()
+
+    server, fake_llm, work_dir = None, None, None
+    base_url = args.url
+    if base_url is None:
+        fake_llm = FakeLLMServer(("127.0.0.1", 0), args.llm_latency_ms / 1000, args.llm_latency_ms / 4000).start()
+        work_dir = tempfile.TemporaryDirectory()
+        port = free_port()
+        # The fake server has no rate limits, so neither does the server's client
+        env = dict(os.environ, OPENAI_BASE_URL=fake_llm.base_url, OPENAI_API_KEY="fake",
+                   SIGN_LLM_RPM=str(10 ** 7), SIGN_LLM_TPM=str(10 ** 9), SIGN_LLM_CONNECTIONS=str(args.threads))
+        server = subprocess.Popen(
+            [sys.executable, "lesson_server.py", "--port", str(port), "--encoder", "hashing",
+             "--log-dir", work_dir.name, "--max-sessions", str(args.max_sessions), "--threads", str(args.threads)],
+            cwd=REPO, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        base_url = f"http://127.0.0.1:{port}"
+
+    try:
+        if server is not None:
+            wait_for_server(base_url, server)
+        idle, samples, totals, elapsed = asyncio.run(run_load(args, base_url))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+            fake_llm.shutdown()
+            work_dir.cleanup()
+
+    latencies = sorted(totals["latencies"])
+    peak = max(samples, key=lambda s: s["sessions_active"]) if samples else idle
+    peak_rss = max((s["rss_mb"] for s in samples), default=idle["rss_mb"])
+    per_session = (peak_rss - idle["rss_mb"]) / peak["sessions_active"] if peak["sessions_active"] else 0.0
+    last = samples[-1] if samples else idle
+
+    print(f"Lessons completed:      {len(latencies)} / {args.sessions} in {elapsed:.1f} s")
+    print(f"Sessions per second:    {len(latencies) / elapsed:.1f}")
+    if latencies:
+        print(f"Lesson time p50 / p95:  {statistics.median(latencies):.2f} s / "
+              f"{latencies[int(0.95 * (len(latencies) - 1))]:.2f} s")
+    print(f"Peak concurrent:        {peak['sessions_active']} (limit {peak['max_sessions']})")
+    print(f"Rejected (503, retried): {totals['rejected']}, dropped: {totals['dropped']}, "
+          f"timeouts: {last['timeouts']}")
+    print(f"Server RSS idle / peak: {idle['rss_mb']:.1f} MB / {peak_rss:.1f} MB")
+    print(f"Memory per session:     {per_session * 1024:.1f} KB")
+    print(f"Fleet states:           {last['fleet']['states']}")
+
+
+if __name__ == "__main__":
+    main()
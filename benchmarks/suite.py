@@ -0,0 +1,356 @@
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import controller
+from agents.caption_cache import CaptionCache
+from agents.captioner import Captioner
+from agents.embedding_engine import EmbeddingEngine, HashingEncoder
+from agents.memory_pool import MemoryPool
+from agents.monitor import BehaviorMonitorAgent, FleetMonitor
+from agents.prompt_generator import PromptLLMGenerator
+from agents.prompt_pool import PromptPool
+from agents.reinforce_memory import ReinforcementMemory
+from agents.rl_agent import RLAgent
+from agents.rl_environment import TeachingEnvironment
+from agents.rl_training import new_q_table, save_q_table
+from agents.tutor import AdaptiveTutorAgent
+from bench_reinforce_memory import make_history, make_lesson
+from fake_llm_server import fake_batch_captions, fake_caption, fake_sentences
+from lesson_engine import LessonEngine
+
+# Offline benchmark suite for the agents, with a regression gate against a saved baseline.
+# LLM calls are answered in-process by StubLLM and embeddings come from the hashing encoder
+# (--encoder minilm for the real one), so timings measure our code, not the network.
+# Usage: python benchmarks/suite.py run [--output benchmarks/baseline.json] [--quick] [--only memory]
+#        python benchmarks/suite.py compare [benchmarks/baseline.json] [--current results.json] [--max-regression 20]
+#            [--allow-missing]
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+MEMORY_SIZES = [1_000, 10_000, 100_000]
+QUICK_MEMORY_SIZES = [1_000, 10_000]
+
+RAW_CAPTIONS = [
+    "  i want some food  ",
+    "Where is mother driving?\nMOTHER DRIVE WHERE",
+    "how was the weather yesterday → WEATHER YESTERDAY HOW",
+    "Please help me - polite request",
+    "the teacher reads a book at school",
+]
+GLOSSES = ["ME WANT FOOD", "MOTHER DRIVE WHERE", "TEACHER READ BOOK SCHOOL", "FRIEND VISIT PARK TOMORROW",
+           "YESTERDAY WEATHER HOW", "WE COOK LUNCH HOME"]
+
+
+class StubLLM:
+    # Answers prompt generation, single and batch caption requests like the fake server, without HTTP
+    def __init__(self, seed=0):
+        self.rng = random.Random(seed)
+        self.requests = 0
+
+    def chat(self, messages, **kwargs):
+        self.requests += 1
+        prompt = messages[-1]["content"]
+        if "unique sentences" in prompt:
+            return fake_sentences(prompt, self.rng)
+        if "numbered list" in prompt:
+            return fake_batch_captions(prompt)
+        return fake_caption(prompt)
+
+
+def measure(fn, rounds, number=1, setup=None):
+    # Per-call timings in microseconds: `rounds` samples, each the mean of `number` calls.
+    # setup runs before every round and is not timed.
+    samples = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(rounds):
+            if setup is not None:
+                setup()
+            start = time.perf_counter()
+            for _ in range(number):
+                fn()
+            samples.append((time.perf_counter() - start) / number * 1e6)
+    samples.sort()
+    return {
+        "p50_us": round(statistics.median(samples), 3),
+        "p95_us": round(samples[int(0.95 * (len(samples) - 1))], 3),
+        "min_us": round(samples[0], 3),
+        "rounds": rounds,
+        "number": number,
+    }
+
+
+def bench_postprocess(args):
+    captioner = Captioner(cache=CaptionCache(path=None), use_exact_matches=False, client=StubLLM())
+    raw = itertools.cycle(RAW_CAPTIONS)
+    yield "captioner.postprocess_caption", measure(lambda: captioner.postprocess_caption(next(raw)),
+                                                   args.rounds, 1000)
+
+
+def bench_similarity(args):
+    # is_semantically_similar grades through the controller's engine, swapped for an offline one
+    model = HashingEncoder() if args.encoder == "hashing" else None
+    controller.embedding_engine = EmbeddingEngine(cache_path=None, model=model, cache_size=1000)
+    controller.is_semantically_similar("I want some food.", "I want food.")
+    yield "similarity.cached", measure(
+        lambda: controller.is_semantically_similar("I want some food.", "I want food."), args.rounds, 200)
+
+    # A new caption every call against a cached prompt, the usual grading case
+    counter = itertools.count()
+    yield "similarity.new_caption", measure(
+        lambda: controller.is_semantically_similar("I want some food.", f"I want food {next(counter)}."),
+        args.rounds, 20)
+
+
+def bench_memory(args):
+    for size in QUICK_MEMORY_SIZES if args.quick else MEMORY_SIZES:
+        with tempfile.TemporaryDirectory() as log_dir:
+            make_history(os.path.join(log_dir, "reinforcement_memory.json"), size)
+            memory = ReinforcementMemory(log_dir=log_dir)
+            rng = random.Random(size)
+
+            yield f"memory.update[{size}]", measure(lambda: memory.update(make_lesson(rng, size)), args.rounds)
+            yield f"memory.get_weak_glosses[{size}]", measure(memory.get_weak_glosses, args.rounds)
+            yield f"memory.due_prompts[{size}]", measure(lambda: memory.due_prompts(5), args.rounds)
+
+            def pending_lesson():
+                # What update() leaves for save_memory: five journal entries
+                with memory.lock:
+                    for entry in make_lesson(rng, size):
+                        record = {k: entry[k] for k in ("gloss", "caption", "similarity", "result")}
+                        record["timestamp"] = "2025-01-01 00:00:00"
+                        memory.add_record(entry["prompt"], record)
+                        memory.log({"op": "add", "prompt": entry["prompt"], "record": record})
+
+            yield f"memory.save_memory[{size}]", measure(memory.save_memory, args.rounds, setup=pending_lesson)
+            memory.wait_for_compaction()
+
+
+def make_tutor(log_dir, client, pool_prompts=0):
+    generator = PromptLLMGenerator(client=client)
+    pool = PromptPool(generator, path=None)
+    pool.add("beginner", [f"Beginner pool sentence {i}." for i in range(pool_prompts)])
+    tutor = AdaptiveTutorAgent(user_id="bench", memory_pool=MemoryPool(log_dir=log_dir), prompt_pool=pool)
+    tutor.prompt_generator = generator
+    return tutor
+
+
+def bench_tutor(args):
+    with tempfile.TemporaryDirectory() as log_dir:
+        # Pool hits for a new learner
+        tutor = make_tutor(log_dir, StubLLM(), pool_prompts=5 * args.rounds)
+        yield "tutor.get_prompt_batch[pool]", measure(tutor.get_prompt_batch, args.rounds)
+
+        # Pool dry, every batch goes to the (stub) LLM
+        tutor = make_tutor(log_dir, StubLLM())
+        yield "tutor.get_prompt_batch[generate]", measure(tutor.get_prompt_batch, args.rounds)
+
+    with tempfile.TemporaryDirectory() as log_dir:
+        # A learner with a long weak history, served from memory
+        learner_dir = os.path.join(log_dir, "learners", "bench")
+        os.makedirs(learner_dir)
+        make_history(os.path.join(learner_dir, "reinforcement_memory.json"), 10_000)
+        tutor = make_tutor(log_dir, StubLLM())
+        yield "tutor.get_prompt_batch[weak]", measure(tutor.get_prompt_batch, args.rounds)
+
+
+def bench_monitor(args):
+    monitor = BehaviorMonitorAgent()
+    counts = itertools.cycle([(5, 0, 0), (1, 3, 1), (0, 1, 4), (3, 2, 0), (0, 0, 0)])
+    yield "monitor.analyze_behavior", measure(lambda: monitor.analyze_behavior(*next(counts)), args.rounds, 1000)
+
+    # Streaming monitor with 10k learners in flight
+    fleet = FleetMonitor()
+    rng = random.Random(0)
+    events = [(f"learner-{rng.randrange(10_000)}", rng.choice(FleetMonitor.RESULTS), rng.random(), rng.uniform(1, 30))
+              for _ in range(100_000)]
+    for event in events:
+        fleet.observe(*event)
+    replay = itertools.cycle(events)
+    yield "monitor.observe[10000]", measure(lambda: fleet.observe(*next(replay)), args.rounds, 1000)
+    yield "monitor.rollup[10000]", measure(fleet.rollup, args.rounds)
+
+
+def bench_rl(args):
+    random.seed(0)
+    outcomes = itertools.cycle([(5, 5), (4, 5), (1, 5), (3, 5), (0, 5)])
+    agent = RLAgent(TeachingEnvironment())
+    yield "rl.act_and_learn[dict]", measure(lambda: agent.act_and_learn(*next(outcomes)), args.rounds, 1000)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        path = os.path.join(work_dir, "q_table.npy")
+        save_q_table(new_q_table(), path)
+        agent = RLAgent(TeachingEnvironment(), q_table_path=path)
+        yield "rl.act_and_learn[array]", measure(lambda: agent.act_and_learn(*next(outcomes)), args.rounds, 1000)
+
+
+def bench_lesson(args):
+    for batch_captions in (False, True):
+        with tempfile.TemporaryDirectory() as work_dir:
+            client = StubLLM()
+            model = HashingEncoder() if args.encoder == "hashing" else None
+            embeddings = EmbeddingEngine(cache_path=None, model=model)
+
+            def grade(expected, actual):
+                score = embeddings.similarity(expected, actual)
+                return score >= 0.75, score
+
+            engine = LessonEngine(Captioner(cache=CaptionCache(path=None), use_exact_matches=False, client=client),
+                                  make_tutor(work_dir, client), BehaviorMonitorAgent(), grade, embeddings,
+                                  log_dir=os.path.join(work_dir, "sessions"), batch_captions=batch_captions,
+                                  fleet=FleetMonitor())
+            responses = itertools.cycle(GLOSSES + [""])
+            name = "lesson.headless[batch]" if batch_captions else "lesson.headless"
+            yield name, measure(lambda: engine.run_lesson(responses), args.rounds)
+            engine.tutor.memory.wait_for_compaction()
+            engine.session_log.wait_for_compression()
+
+
+BENCHMARKS = {
+    "postprocess": bench_postprocess,
+    "similarity": bench_similarity,
+    "memory": bench_memory,
+    "tutor": bench_tutor,
+    "monitor": bench_monitor,
+    "rl": bench_rl,
+    "lesson": bench_lesson,
+}
+
+
+def run_suite(args):
+    logging.getLogger().setLevel(logging.WARNING)
+    results = {}
+    print(f"{'benchmark':<36} {'p50 us':>12} {'p95 us':>12} {'min us':>12}")
+    for group, bench in BENCHMARKS.items():
+        if args.only and group not in args.only:
+            continue
+        for name, result in bench(args):
+            results[name] = {**result, "group": group}
+            print(f"{name:<36} {result['p50_us']:>12.2f} {result['p95_us']:>12.2f} {result['min_us']:>12.2f}")
+    return {
+        "meta": {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "encoder": args.encoder,
+            "quick": args.quick,
+            "groups": [group for group in BENCHMARKS if not args.only or group in args.only],
+        },
+        "results": results,
+    }
+
+
+def save_results(data, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def compare(baseline, current, metric="p50_us", max_regression=20.0, allow_missing=False):
+    # (rows, failed): one row per benchmark, failed lists the ones slower than allowed and, unless
+    # allow_missing, baseline benchmarks the current run should have had but did not (renamed or crashed)
+    rows, failed = [], []
+    ran = current["meta"].get("groups")
+    for name in sorted(set(baseline["results"]) | set(current["results"])):
+        old = baseline["results"].get(name, {}).get(metric)
+        new = current["results"].get(name, {}).get(metric)
+        if old is None:
+            rows.append((name, old, new, None, "new"))
+            continue
+        if new is None:
+            if ran is not None and baseline["results"][name].get("group", ran[0]) not in ran:
+                # Group left out with --only
+                rows.append((name, old, new, None, "skipped"))
+            elif allow_missing:
+                rows.append((name, old, new, None, "missing"))
+            else:
+                rows.append((name, old, new, None, "MISSING"))
+                failed.append(name)
+            continue
+        change = (new - old) / old * 100 if old else 0.0
+        status = "ok"
+        if change > max_regression:
+            status = "REGRESSED"
+            failed.append(name)
+        elif change < -max_regression:
+            status = "faster"
+        rows.append((name, old, new, change, status))
+    return rows, failed
+
+
+def main():
+    suite = argparse.ArgumentParser(add_help=False)
+    suite.add_argument("--rounds", type=int, default=30, help="timed samples per benchmark")
+    suite.add_argument("--quick", action="store_true", help="skip the largest memory history")
+    suite.add_argument("--only", nargs="+", default=None, choices=list(BENCHMARKS), help="benchmark groups to run")
+    suite.add_argument("--encoder", choices=["hashing", "minilm"], default="hashing")
+
+    parser = argparse.ArgumentParser(description="Offline agent benchmarks and regression gate.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run = commands.add_parser("run", parents=[suite], help="run the suite and save the results as a baseline")
+    run.add_argument("--output", default=DEFAULT_BASELINE)
+
+    check = commands.add_parser("compare", parents=[suite], help="exit with status 1 if a benchmark got slower than allowed")
+    check.add_argument("baseline", nargs="?", default=DEFAULT_BASELINE)
+    check.add_argument("--current", default=None, help="saved results to check, default: run the suite now")
+    check.add_argument("--save", default=None, help="also save the fresh results here")
+    check.add_argument("--metric", choices=["p50_us", "p95_us", "min_us"], default="p50_us")
+    check.add_argument("--max-regression", type=float, default=20.0, help="allowed slowdown in percent")
+    check.add_argument("--allow-missing", action="store_true",
+                       help="do not fail on baseline benchmarks missing from this run, e.g. --quick against a full baseline")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        save_results(run_suite(args), args.output)
+        print(f"\nSaved results to {args.output}")
+        return 0
+
+    with open(args.baseline, "r") as f:
+        baseline = json.load(f)
+    if args.current:
+        with open(args.current, "r") as f:
+            current = json.load(f)
+    else:
+        current = run_suite(args)
+        if args.save:
+            save_results(current, args.save)
+        print()
+
+    for key in ("python", "machine", "cpus", "encoder"):
+        if baseline["meta"].get(key) != current["meta"].get(key):
+            print(f"⚠️ Baseline {key} is {baseline['meta'].get(key)}, now {current['meta'].get(key)}")
+
+    rows, failed = compare(baseline, current, args.metric, args.max_regression, args.allow_missing)
+    print(f"{'benchmark':<36} {'baseline':>12} {'current':>12} {'change':>9}  status")
+    for name, old, new, change, status in rows:
+        old_text = f"{old:.2f}" if old is not None else "-"
+        new_text = f"{new:.2f}" if new is not None else "-"
+        change_text = f"{change:+.1f}%" if change is not None else "-"
+        print(f"{name:<36} {old_text:>12} {new_text:>12} {change_text:>9}  {status}")
+
+    if failed:
+        missing = sum(1 for row in rows if row[4] == "MISSING")
+        print(f"\n{len(failed) - missing} benchmark(s) regressed by more than {args.max_regression:g}% ({args.metric}), "
+              f"{missing} missing from this run")
+        return 1
+    print(f"\nNo regressions over {args.max_regression:g}% ({args.metric})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
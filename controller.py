@@ -1,31 +1,43 @@
 import os
-import json
-import datetime
 from agents.captioner import Captioner
 from agents.tutor import AdaptiveTutorAgent
-from agents.monitor import BehaviorMonitorAgent
-from sentence_transformers import SentenceTransformer, util
+from agents.monitor import BehaviorMonitorAgent, FleetMonitor
+from agents.embedding_engine import EmbeddingEngine
+from agents.prompt_index import PromptIndex
 from agents.reinforce_memory import ReinforcementMemory
-from langchain.memory import ConversationBufferMemory
+from agents.startup import startup_timer
+from lesson_engine import LessonEngine
 
-# Semantic similarity model
-semantic_model = SentenceTransformer('all-MiniLM-L6-v2')
+# Semantic similarity model with a cache of prompt and caption embeddings.
+# SIGN_ENCODER_BACKEND=int8|onnx grades with a quantized or exported encoder instead of full-precision
+# PyTorch, SIGN_ENCODER_THREADS caps the threads it uses
+embedding_engine = EmbeddingEngine('all-MiniLM-L6-v2', backend=os.environ.get("SIGN_ENCODER_BACKEND", "torch"),
+                                   threads=int(os.environ.get("SIGN_ENCODER_THREADS", 0)) or None)
 
 def is_semantically_similar(expected: str, actual: str, threshold: float = 0.75):
-    embeddings = semantic_model.encode([expected, actual], convert_to_tensor=True)
-    score = util.pytorch_cos_sim(embeddings[0], embeddings[1]).item()
+    score = embedding_engine.similarity(expected, actual)
     return score >= threshold, score
 
 class ControllerAgent:
-    def __init__(self):
-        self.captioner = Captioner()
-        self.tutor = AdaptiveTutorAgent()
+    def __init__(self, user_id=None, memory_pool=None):
+        self.user_id = user_id
+        # SIGN_CAPTION_BACKEND=local captions with a local seq2seq model instead of the API
+        self.captioner = Captioner(backend=os.environ.get("SIGN_CAPTION_BACKEND", "remote"))
+        self.prompt_index = PromptIndex(embedding_engine)
+        self.tutor = AdaptiveTutorAgent(user_id=user_id, memory_pool=memory_pool, prompt_index=self.prompt_index)
+        # Filled by each lesson's prompts; index older history once with
+        # python -m agents.prompt_index --build, never here, so startup stays lazy
+        self.tutor.prompt_pool.start()
         self.monitor = BehaviorMonitorAgent()
-        self.memory = ConversationBufferMemory(memory_key="history", return_messages=True)
-
-        # Always clear LLM memory to prevent semantic repetition
-        self.memory.clear()
-        print("🧠 Chat memory cleared.")
+        # Per-attempt sliding window, so disengagement or confusion is flagged during the lesson
+        self.fleet = FleetMonitor()
+        # SIGN_BATCH_CAPTIONS=1 captions each lesson in a single request once all glosses are in
+        self.engine = LessonEngine(self.captioner, self.tutor, self.monitor,
+                                   grade=is_semantically_similar, embeddings=embedding_engine,
+                                   batch_captions=os.environ.get("SIGN_BATCH_CAPTIONS", "") not in ("", "0"),
+                                   fleet=self.fleet)
+        # Chat memory is created on first use, so every run starts without one
+        self._memory = None
 
         # Ask about reinforcement memory only
         clear_reinforcement = input("🧪 Also clear reinforcement memory (weak/strong prompts)? (y/n): ").lower()
@@ -33,81 +45,54 @@ class ControllerAgent:
             self.tutor.memory.clear_memory()
             print("🧽 Reinforcement memory cleared.\n")
 
-    def run_lesson(self):
-        batch = self.tutor.get_prompt_batch()
-        results = []
-
-        print("\n📘 Starting full sign language lesson...\n")
-
-        for prompt in batch:
-            print(f"Tutor says: Please sign – '{prompt}'")
-            gloss = input("✋ Please enter your gloss: ")
-
-            caption = self.captioner.caption(gloss)
-            print(f"📝 Captioner translated: {caption}")
-
-            similar, similarity_score = is_semantically_similar(prompt, caption)
-            correct = similar
-
-            results.append({
-                "prompt": prompt,
-                "gloss": gloss,
-                "caption": caption,
-                "similarity": round(similarity_score, 2),
-                "result": "Correct" if correct else "Incorrect"
-            })
-
-        correct_count = sum(1 for r in results if r["result"] == "Correct")
-        skipped_count = sum(1 for r in results if r["gloss"].strip() == "")
-        total = len(results)
-        score = round(100 * correct_count / total, 1) if total else 0
-        incorrect_count = total - correct_count - skipped_count  # ✅ Added this
-
-        # Save feedback
-        self.tutor.memory.update(results)
-        self.tutor.update_performance(correct_count, total)
-
-        difficulty = self.tutor.performance_level
-        state, behavior_action = self.monitor.analyze_behavior(correct_count, incorrect_count, skipped_count)  # ✅ Fixed variable use
-
-        print(f"📊 Behavior State: {state}")
-        print(f"{behavior_action}")  # ✅ Correct reference
-
-        timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-        os.makedirs("logs", exist_ok=True)
-        log_path = f"logs/session_{timestamp}.json"
-
-        with open(log_path, "w") as f:
-            json.dump({
-                "results": results,
-                "score": score,
-                "difficulty": difficulty,
-                "state": state,
-                "behavior_action": behavior_action
-            }, f, indent=2)
+    @property
+    def memory(self):
+        # langchain is only imported if the chat memory is actually used
+        if self._memory is None:
+            with startup_timer.phase("load chat memory"):
+                from langchain.memory import ConversationBufferMemory
+                self._memory = ConversationBufferMemory(memory_key="history", return_messages=True)
+        return self._memory
+
+    def show_event(self, event):
+        kind = event["event"]
+        if kind == "lesson_start":
+            print("\n📘 Starting full sign language lesson...\n")
+        elif kind == "prompt":
+            print(f"Tutor says: Please sign – '{event['prompt']}'")
+        elif kind == "behavior" and event["alert"]:
+            print(f"\n📊 Behavior changed to {event['to']}: {event['advice']}\n")
+        elif kind == "waiting":
+            print(f"\n⏳ Waiting for {event['pending']} translation(s)...")
+        elif kind == "lesson_end":
+            self.show_summary(event)
+
+    def show_summary(self, summary):
+        print(f"📊 Behavior State: {summary['state']}")
+        print(f"{summary['behavior_action']}")
 
         print("\n🎓 Lesson Summary:")
-        print(f"Correct: {correct_count}")
-        print(f"Skipped: {skipped_count}")
-        print(f"Total: {total}")
-        print(f"Score: {score}%")
+        print(f"Correct: {summary['correct']}")
+        print(f"Skipped: {summary['skipped']}")
+        print(f"Total: {summary['total']}")
+        print(f"Score: {summary['score']}%")
 
-        print(f"\n🧠 RL Agent selected new difficulty level: {difficulty}")
-        print(f"🧠 Based on score: {correct_count}/{total}\n")
+        print(f"\n🧠 RL Agent selected new difficulty level: {summary['difficulty']}")
+        print(f"🧠 Based on score: {summary['correct']}/{summary['total']}\n")
 
         print("📘 Prompt-by-Prompt Feedback:")
-        for r in results:
+        for r in summary["results"]:
             print(f"- Prompt: {r['prompt']}")
             print(f"  Gloss: {r['gloss']}")
             print(f"  Caption: {r['caption']}")
             print(f"  Similarity: {r['similarity']}")
             print(f"  Result: {r['result']}\n")
 
-        print(f"📊 Behavior Monitor Action:\n{behavior_action}")
-        print(f"\n💾 Session log saved to: {log_path}")
+        print(f"📊 Behavior Monitor Action:\n{summary['behavior_action']}")
+        print(f"\n💾 Session log saved to: {summary['log_path']} (session {summary['session_id']})")
 
-        cont = input("\n🔁 Would you like to continue with a new set of prompts? (y/n): ")
-        if cont.lower() == "y":
-            self.run_lesson()
-        else:
-            print("\n👋 Ending session. Great job!")
+    def run_lesson(self):
+        glosses = iter(lambda: input("✋ Please enter your gloss: "), None)
+        continues = iter(lambda: input("\n🔁 Would you like to continue with a new set of prompts? (y/n): "), None)
+        self.engine.run_session(glosses, continues, emit=self.show_event)
+        print("\n👋 Ending session. Great job!")
@@ -0,0 +1,149 @@
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Local OpenAI-compatible chat completions endpoint for tests and load runs, no network needed.
+# Usage: python fake_llm_server.py --port 8099 --latency-ms 300 --error-rate 0.05
+# then point the agents at it with OPENAI_BASE_URL=http://127.0.0.1:8099/v1
+
+WORDS = ("we you they friends family teacher school home park market coffee lunch book music "
+         "weekend today tomorrow morning evening like need want visit watch cook read play").split()
+WORD_RANGES = {"4 to 5": (4, 5), "6 to 8": (6, 8), "9 to 11": (9, 11)}
+
+
+def fake_sentences(prompt, rng):
+    count = int(re.search(r"exactly (\d+) unique sentences", prompt).group(1))
+    low, high = next((r for k, r in WORD_RANGES.items() if k in prompt), (4, 5))
+    lines = []
+    for i in range(count):
+        words = [rng.choice(WORDS) for _ in range(rng.randint(low, high))]
+        lines.append(f"{i + 1}. {' '.join(words).capitalize()}.")
+    return "\n".join(lines)
+
+
+def fake_batch_captions(prompt):
+    glosses = re.findall(r"^(\d+)\. (.+)$", prompt.rsplit("nothing else:", 1)[-1], flags=re.MULTILINE)
+    return "\n".join(f"{n}. {fake_caption(gloss + chr(10) + '→')}" for n, gloss in glosses)
+
+
+def fake_caption(prompt):
+    # Caption prompts end with the gloss and an arrow
+    gloss = prompt.rsplit("\n→", 1)[0].rsplit("\n", 1)[-1].strip()
+    sentence = gloss.lower().capitalize()
+    return sentence + ("?" if gloss.split()[-1:] in (["WHERE"], ["WHAT"], ["HOW"], ["WHO"]) else ".")
+
+
+class FakeLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+    def __init__(self, address, latency=0.0, jitter=0.0, error_rate=0.0, rate_limit_rate=0.0, seed=0):
+        super().__init__(address, FakeLLMHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counts = {"requests": 0, "errors": 0, "rate_limited": 0}
+
+    @property
+    def base_url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}/v1"
+
+    def count(self, key):
+        with self.lock:
+            self.counts[key] += 1
+
+    def handle_error(self, request, client_address):
+        # Clients dropping idle keep-alive connections are not worth a traceback
+        pass
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="fake-llm", daemon=True).start()
+        return self
+
+
+class FakeLLMHandler(BaseHTTPRequestHandler):
+    # Keep-alive, so the client's connection pool is exercised like against the real API
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/stats":
+            with self.server.lock:
+                self.send_json(200, dict(self.server.counts))
+        else:
+            self.send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if self.path.rstrip("/") != "/v1/chat/completions":
+            self.send_json(404, {"error": {"message": "not found"}})
+            return
+        server.count("requests")
+        with server.lock:
+            roll = server.rng.random()
+            delay = server.latency + server.rng.uniform(0, server.jitter)
+        if roll < server.rate_limit_rate:
+            server.count("rate_limited")
+            self.send_json(429, {"error": {"message": "rate limited"}}, {"Retry-After": "0.05"})
+            return
+        time.sleep(delay)
+        if roll < server.rate_limit_rate + server.error_rate:
+            server.count("errors")
+            self.send_json(500, {"error": {"message": "simulated failure"}})
+            return
+
+        prompt = body["messages"][-1]["content"]
+        if "unique sentences" in prompt:
+            with server.lock:
+                content = fake_sentences(prompt, server.rng)
+        elif "numbered list" in prompt:
+            content = fake_batch_captions(prompt)
+        else:
+            content = fake_caption(prompt)
+        self.send_json(200, {
+            "id": f"chatcmpl-fake-{server.counts['requests']}",
+            "object": "chat.completion",
+            "model": body.get("model", "fake"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4,
+                      "total_tokens": (len(prompt) + len(content)) // 4},
+        })
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake OpenAI-compatible chat completions server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency-ms", type=float, default=200.0)
+    parser.add_argument("--jitter-ms", type=float, default=100.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with HTTP 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction answered with HTTP 429")
+    args = parser.parse_args()
+
+    server = FakeLLMServer((args.host, args.port), args.latency_ms / 1000, args.jitter_ms / 1000,
+                           args.error_rate, args.rate_limit_rate)
+    print(f"🧪 Fake LLM listening on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
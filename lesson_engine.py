@@ -0,0 +1,215 @@
+import asyncio
+import time
+
+from agents.logger import SessionLogger, new_session_id
+from agents.metrics import metrics
+
+
+class LessonSession:
+    # Everything one lesson needs between prompts, kept small so many can be held at once
+    def __init__(self, prompts, max_in_flight=3, session_id=None):
+        self.session_id = session_id or new_session_id()
+        self.prompts = list(prompts)
+        self.index = 0
+        self.tasks = []
+        # Glosses waiting for the lesson-end batch caption (batch_captions mode)
+        self.glosses = []
+        # Seconds the learner took to answer each prompt
+        self.latencies = []
+        self.semaphore = asyncio.Semaphore(max_in_flight)
+        self.started = time.perf_counter()
+
+    @property
+    def current_prompt(self):
+        return self.prompts[self.index] if self.index < len(self.prompts) else None
+
+    @property
+    def done(self):
+        return self.index >= len(self.prompts)
+
+
+class LessonEngine:
+    # Headless lesson flow: learner responses come from an iterator and everything that
+    # happens is reported as structured events, so lessons can run without a terminal.
+    def __init__(self, captioner, tutor, monitor, grade, embeddings=None, log_dir="logs", max_in_flight=3,
+                 batch_captions=False, fleet=None, session_log=None, save_caches=True):
+        self.captioner = captioner
+        self.tutor = tutor
+        self.monitor = monitor
+        self.grade = grade
+        self.embeddings = embeddings
+        self.log_dir = log_dir
+        # A server shares one session_log between the engines of all its learners
+        self.session_log = session_log if session_log is not None else SessionLogger(log_dir) if log_dir else None
+        self.max_in_flight = max_in_flight
+        # Caption the whole lesson in one request at the end instead of one request per response
+        self.batch_captions = batch_captions
+        # Optional FleetMonitor, fed every graded attempt so behavior changes show up mid-lesson
+        self.fleet = fleet
+        # Servers save the shared caches on a timer instead of after every lesson
+        self.save_caches = save_caches
+
+    def start_lesson(self, prompts=None, session_id=None):
+        if prompts is None:
+            with metrics.span("prompts"):
+                prompts = self.tutor.get_prompt_batch()
+        # Embed the whole lesson in one batch so grading only embeds the captions
+        if self.embeddings is not None:
+            with metrics.span("embed.warm", count=len(prompts)):
+                self.embeddings.warm(prompts)
+        return LessonSession(prompts, self.max_in_flight, session_id)
+
+    async def grade_response(self, session, index, prompt, gloss, emit, caption=None):
+        if caption is None:
+            async with session.semaphore:
+                with metrics.span("caption", index=index):
+                    caption = await asyncio.to_thread(self.captioner.caption, gloss)
+        with metrics.span("grade", index=index):
+            similar, similarity_score = await asyncio.to_thread(self.grade, prompt, caption)
+        result = {
+            "prompt": prompt,
+            "gloss": gloss,
+            "caption": caption,
+            "similarity": round(similarity_score, 2),
+            "result": "Correct" if similar else "Incorrect"
+        }
+        emit({"event": "result", "index": index, **result})
+        if self.fleet is not None:
+            outcome = "Skipped" if not gloss.strip() else result["result"]
+            latency = session.latencies[index] if index < len(session.latencies) else None
+            transition = self.fleet.observe(self.tutor.user_id, outcome, result["similarity"], latency)
+            if transition is not None:
+                emit({"event": "behavior", "index": index, **transition})
+        return result
+
+    def submit(self, session, gloss, emit, latency=None):
+        session.latencies.append(latency)
+        if self.batch_captions:
+            session.glosses.append(gloss)
+            session.index += 1
+            return None
+        # Caption and grade in the background, the learner can move on to the next prompt
+        prompt = session.current_prompt
+        task = asyncio.create_task(self.grade_response(session, session.index, prompt, gloss, emit))
+        session.tasks.append(task)
+        session.index += 1
+        return task
+
+    async def caption_lesson(self, session, emit):
+        # All of the lesson's glosses in one captioning request, then grade each in the background
+        before = self.captioner.cache_stats()
+        with metrics.span("caption_batch", count=len(session.glosses)):
+            captions = await asyncio.to_thread(self.captioner.caption_batch, session.glosses)
+        after = self.captioner.cache_stats()
+        session.tasks = [
+            asyncio.create_task(self.grade_response(session, i, prompt, gloss, emit, caption))
+            for i, (prompt, gloss, caption) in enumerate(zip(session.prompts, session.glosses, captions))
+        ]
+        return {key: after[key] - before[key] for key in
+                ("batch_requests", "batch_fallbacks", "round_trips_saved", "prompt_tokens_saved")}
+
+    def save_feedback(self, results):
+        with metrics.span("memory.update"):
+            self.tutor.memory.update(results)
+        self.captioner.learn_from_results(results)
+        if self.save_caches:
+            with metrics.span("save_caches"):
+                self.captioner.save_cache()
+                if self.embeddings is not None:
+                    self.embeddings.save_cache()
+
+    async def finish_lesson(self, session, emit=None):
+        batch = await self.caption_lesson(session, emit or (lambda event: None)) if session.glosses else None
+        # Results come back in prompt order regardless of which caption finished first
+        with metrics.span("wait_results"):
+            results = list(await asyncio.gather(*session.tasks))
+
+        correct_count = sum(1 for r in results if r["result"] == "Correct")
+        skipped_count = sum(1 for r in results if r["gloss"].strip() == "")
+        total = len(results)
+        score = round(100 * correct_count / total, 1) if total else 0
+        incorrect_count = total - correct_count - skipped_count
+
+        # Save feedback; file writes run on a worker thread so other sessions keep going
+        await asyncio.to_thread(self.save_feedback, results)
+        self.tutor.update_performance(correct_count, total)
+
+        difficulty = self.tutor.performance_level
+        state, behavior_action = self.monitor.analyze_behavior(correct_count, incorrect_count, skipped_count)
+
+        log = {
+            "session_id": session.session_id,
+            "user_id": self.tutor.user_id,
+            "results": results,
+            "score": score,
+            "difficulty": difficulty,
+            "state": state,
+            "behavior_action": behavior_action,
+            "caption_cache": self.captioner.cache_stats()
+        }
+        if self.embeddings is not None:
+            log["embedding_cache"] = self.embeddings.stats()
+        if batch is not None:
+            log["caption_batch"] = batch
+        with metrics.span("save_log"):
+            if self.session_log is not None:
+                await asyncio.to_thread(self.session_log.append, log)
+        duration = time.perf_counter() - session.started
+        metrics.inc("lessons_total")
+        metrics.inc("prompts_total", total)
+        if metrics.enabled:
+            await asyncio.to_thread(metrics.export)
+
+        return {
+            "event": "lesson_end",
+            **log,
+            "correct": correct_count,
+            "skipped": skipped_count,
+            "incorrect": incorrect_count,
+            "total": total,
+            "log_path": self.session_log.store_dir if self.session_log is not None else None,
+            "duration_s": round(duration, 3),
+        }
+
+    async def arun_lesson(self, responses, emit, prompts=None):
+        # The session id is also the trace id, spans in trace.jsonl point at the session log
+        session_id = new_session_id()
+        with metrics.trace(session_id), metrics.profile(f"lesson_{session_id}"):
+            return await self.traced_lesson(responses, emit, prompts, session_id)
+
+    async def traced_lesson(self, responses, emit, prompts=None, session_id=None):
+        # Prompt selection may call the LLM and warming embeds, neither should block the loop
+        session = await asyncio.to_thread(self.start_lesson, prompts, session_id)
+        emit({"event": "lesson_start", "session_id": session.session_id, "prompts": list(session.prompts)})
+        while not session.done:
+            emit({"event": "prompt", "index": session.index, "prompt": session.current_prompt})
+            # Async iterators (server connections) are awaited, plain ones are read on a worker
+            # thread so background captions keep going; a finished iterator skips the rest
+            asked = time.perf_counter()
+            if hasattr(responses, "__anext__"):
+                gloss = await anext(responses, "")
+            else:
+                gloss = await asyncio.to_thread(next, responses, "")
+            self.submit(session, gloss, emit, time.perf_counter() - asked)
+
+        pending = len(session.glosses) + sum(1 for t in session.tasks if not t.done())
+        if pending:
+            emit({"event": "waiting", "pending": pending})
+
+        summary = await self.finish_lesson(session, emit)
+        emit(summary)
+        return summary
+
+    def run_lesson(self, responses, emit=None, prompts=None):
+        emit = emit or (lambda event: None)
+        return asyncio.run(self.arun_lesson(iter(responses), emit, prompts))
+
+    def run_session(self, responses, continues, emit=None):
+        # Iterative "continue?" loop, a long session does not grow the stack
+        responses, continues = iter(responses), iter(continues)
+        summaries = []
+        while True:
+            summaries.append(self.run_lesson(responses, emit))
+            if str(next(continues, "n")).lower() != "y":
+                break
+        return summaries
@@ -0,0 +1,500 @@
+import argparse
+import asyncio
+import base64
+import hashlib
+import logging
+import os
+import struct
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+import orjson
+import psutil
+
+from agents.caption_cache import CaptionCache
+from agents.captioner import Captioner
+from agents.embedding_engine import EmbeddingEngine, HashingEncoder
+from agents.logger import SessionLogger
+from agents.memory_pool import MemoryPool
+from agents.monitor import BehaviorMonitorAgent, FleetMonitor
+from agents.prompt_generator import PromptLLMGenerator
+from agents.prompt_index import PromptIndex
+from agents.prompt_pool import PromptPool
+from agents.tutor import AdaptiveTutorAgent
+from lesson_engine import LessonEngine
+
+# Logging setup
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Many lesson sessions in one asyncio process, all sharing the encoder, LLM client, caches and
+# memory store. Lessons run over a WebSocket (GET /ws?user=<id>) or as one HTTP request
+# (POST /lessons with a "user_id"), GET /health and GET /stats report load. The learner id is
+# required: it picks the memory shard and behavior window, anonymous learners would share them.
+# Usage: python lesson_server.py --port 8080 [--max-sessions 500] [--encoder hashing]
+#
+# WebSocket messages are JSON. The client sends {"type": "start"} to begin a lesson (optionally
+# with "prompts"), {"type": "gloss", "gloss": "..."} after each prompt event and {"type": "end"}
+# to leave; the server sends the lesson engine's events (prompt, result, behavior, lesson_end).
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC11B85"
+OP_CONTINUATION, OP_TEXT, OP_BINARY, OP_CLOSE, OP_PING, OP_PONG = 0x0, 0x1, 0x2, 0x8, 0x9, 0xA
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found", 408: "Request Timeout",
+               413: "Payload Too Large", 503: "Service Unavailable"}
+
+
+class ConnectionClosed(Exception):
+    pass
+
+
+# Minimal RFC 6455 framing, shared with the load generator (clients mask, servers do not)
+
+def ws_accept_key(key):
+    return base64.b64encode(hashlib.sha1((key + WS_GUID).encode("ascii")).digest()).decode("ascii")
+
+
+def ws_encode(opcode, payload, mask=False):
+    header = bytearray([0x80 | opcode])
+    length = len(payload)
+    mask_bit = 0x80 if mask else 0
+    if length < 126:
+        header.append(mask_bit | length)
+    elif length < 1 << 16:
+        header.append(mask_bit | 126)
+        header += struct.pack("!H", length)
+    else:
+        header.append(mask_bit | 127)
+        header += struct.pack("!Q", length)
+    if mask:
+        key = os.urandom(4)
+        header += key
+        payload = ws_mask(payload, key)
+    return bytes(header) + payload
+
+
+def ws_mask(payload, key):
+    # XOR with the repeating 4-byte key, done on one big integer instead of byte by byte
+    repeated = (key * (len(payload) // 4 + 1))[:len(payload)]
+    return (int.from_bytes(payload, "big") ^ int.from_bytes(repeated, "big")).to_bytes(len(payload), "big")
+
+
+async def ws_read_frame(reader, max_bytes):
+    try:
+        first, second = await reader.readexactly(2)
+        length = second & 0x7F
+        if length == 126:
+            length = struct.unpack("!H", await reader.readexactly(2))[0]
+        elif length == 127:
+            length = struct.unpack("!Q", await reader.readexactly(8))[0]
+        if length > max_bytes:
+            raise ConnectionClosed("message too large")
+        key = await reader.readexactly(4) if second & 0x80 else None
+        payload = await reader.readexactly(length)
+    except (asyncio.IncompleteReadError, ConnectionError) as e:
+        raise ConnectionClosed(str(e))
+    return first & 0x80, first & 0x0F, ws_mask(payload, key) if key else payload
+
+
+async def ws_read_message(reader, writer, max_bytes, mask=False):
+    # Next text or binary message, answering pings and joining fragments; None on close
+    parts, opcode = [], None
+    while True:
+        fin, frame_opcode, payload = await ws_read_frame(reader, max_bytes)
+        if frame_opcode == OP_CLOSE:
+            return None
+        if frame_opcode == OP_PING:
+            writer.write(ws_encode(OP_PONG, payload, mask))
+            continue
+        if frame_opcode == OP_PONG:
+            continue
+        if frame_opcode != OP_CONTINUATION:
+            opcode = frame_opcode
+        parts.append(payload)
+        if sum(len(p) for p in parts) > max_bytes:
+            raise ConnectionClosed("message too large")
+        if fin:
+            data = b"".join(parts)
+            return data.decode("utf-8") if opcode == OP_TEXT else data
+
+
+async def read_http_head(reader, limit=16384):
+    # (method, target, headers) of the next request, None when the client went away
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+        return None
+    if len(head) > limit:
+        return None
+    lines = head.decode("latin-1").split("\r\n")
+    parts = lines[0].split(" ")
+    if len(parts) != 3:
+        return None
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+    return parts[0], parts[1], headers
+
+
+def http_response(status, body, headers=None):
+    data = orjson.dumps(body, option=orjson.OPT_SERIALIZE_NUMPY)
+    lines = [f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}", "Content-Type: application/json",
+             f"Content-Length: {len(data)}", "Connection: close"]
+    lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + data
+
+
+class LearnerConnection:
+    # Per-session state: the learner's tutor and engine plus two bounded queues. Messages from
+    # the socket wait in inbox (when it is full we stop reading and TCP pushes back on the
+    # client); events for the client wait in outbox, and a client that lets it fill up is cut off.
+    def __init__(self, server, user_id, reader, writer):
+        self.server = server
+        self.user_id = user_id
+        self.reader = reader
+        self.writer = writer
+        self.inbox = asyncio.Queue(maxsize=server.inbox_size)
+        self.outbox = asyncio.Queue(maxsize=server.outbox_size)
+        self.engine = server.new_engine(user_id)
+        self.sender = None
+        self.closing = None
+
+    def emit(self, event):
+        if self.closing:
+            return
+        try:
+            self.outbox.put_nowait(event)
+        except asyncio.QueueFull:
+            self.server.counts["dropped"] += 1
+            self.close("client is not reading its events")
+
+    def close(self, reason):
+        if self.closing is None:
+            self.closing = reason
+            # Wake up whatever is waiting on the learner; a full outbox is abandoned
+            if not self.inbox.full():
+                self.inbox.put_nowait(None)
+            if not self.outbox.full():
+                self.outbox.put_nowait(None)
+            elif self.sender is not None:
+                self.sender.cancel()
+
+    async def receive_loop(self):
+        try:
+            while not self.closing:
+                text = await ws_read_message(self.reader, self.writer, self.server.max_message_bytes)
+                if text is None:
+                    break
+                try:
+                    message = orjson.loads(text)
+                except orjson.JSONDecodeError:
+                    message = None
+                if not isinstance(message, dict):
+                    self.emit({"event": "error", "error": "messages must be JSON objects"})
+                    continue
+                await self.inbox.put(message)
+        except ConnectionClosed as e:
+            logger.debug(f"Learner {self.user_id} disconnected: {e}")
+        self.close("client closed the connection")
+
+    async def send_loop(self):
+        try:
+            while True:
+                event = await self.outbox.get()
+                if event is None:
+                    break
+                self.writer.write(ws_encode(OP_TEXT, orjson.dumps(event, option=orjson.OPT_SERIALIZE_NUMPY)))
+                await self.writer.drain()
+        except ConnectionError:
+            self.close("client closed the connection")
+
+    async def next_message(self):
+        # None when the learner leaves, goes quiet for idle_timeout or the connection closes
+        if self.closing:
+            return None
+        try:
+            message = await asyncio.wait_for(self.inbox.get(), self.server.idle_timeout)
+        except asyncio.TimeoutError:
+            self.server.counts["timeouts"] += 1
+            self.emit({"event": "timeout", "idle_seconds": self.server.idle_timeout})
+            self.close("idle timeout")
+            return None
+        if message is None or message.get("type") == "end":
+            return None
+        return message
+
+    async def responses(self):
+        # Glosses for the running lesson; stopping early counts the remaining prompts as skipped
+        while True:
+            message = await self.next_message()
+            if message is None:
+                return
+            if message.get("type") == "gloss":
+                yield str(message.get("gloss", ""))
+            else:
+                self.emit({"event": "error", "error": f"expected a gloss, got {message.get('type')!r}"})
+
+    async def run(self):
+        receiver = asyncio.create_task(self.receive_loop())
+        self.sender = asyncio.create_task(self.send_loop())
+        self.emit({"event": "ready", "user_id": self.user_id})
+        try:
+            while not self.closing:
+                message = await self.next_message()
+                if message is None:
+                    break
+                if message.get("type") != "start":
+                    self.emit({"event": "error", "error": f"expected start, got {message.get('type')!r}"})
+                    continue
+                await self.engine.arun_lesson(self.responses(), self.emit, message.get("prompts"))
+                self.server.counts["lessons"] += 1
+        finally:
+            self.close(self.closing or "session finished")
+            await asyncio.gather(self.sender, return_exceptions=True)
+            receiver.cancel()
+            try:
+                self.writer.write(ws_encode(OP_CLOSE, struct.pack("!H", 1000)))
+                await self.writer.drain()
+            except ConnectionError:
+                pass
+
+
+class LessonServer:
+    def __init__(self, log_dir="logs", encoder="minilm", max_sessions=500, idle_timeout=120.0,
+                 session_timeout=3600.0, inbox_size=16, outbox_size=256, max_message_bytes=65536,
+                 threads=32, save_every=60.0, threshold=0.75, batch_captions=False, embedding_model=None,
+                 state_dir=None):
+        self.log_dir = log_dir
+        # Caches, prompt pool and prompt index are single-writer files; lesson_supervisor.py gives
+        # each worker its own state_dir while the learner memories and session logs stay shared
+        self.state_dir = state_dir or log_dir
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.session_timeout = session_timeout
+        self.inbox_size = inbox_size
+        self.outbox_size = outbox_size
+        self.max_message_bytes = max_message_bytes
+        self.threads = threads
+        self.save_every = save_every
+        self.threshold = threshold
+        self.batch_captions = batch_captions
+
+        # Loaded once for the whole process (or passed in, already loaded, by the supervisor);
+        # the hashing encoder is for load tests
+        if encoder == "hashing":
+            self.embeddings = EmbeddingEngine(cache_path=None, model=embedding_model or HashingEncoder())
+            self.prompt_index = None
+        else:
+            # SIGN_ENCODER_BACKEND / SIGN_ENCODER_THREADS select the grading encoder as in controller.py
+            self.embeddings = EmbeddingEngine("all-MiniLM-L6-v2", model=embedding_model,
+                                              cache_path=os.path.join(self.state_dir, "embedding_cache.npz"),
+                                              backend=os.environ.get("SIGN_ENCODER_BACKEND", "torch"),
+                                              threads=int(os.environ.get("SIGN_ENCODER_THREADS", 0)) or None)
+            self.prompt_index = PromptIndex(self.embeddings, path=os.path.join(self.state_dir, "prompt_index"))
+        self.captioner = Captioner(backend=os.environ.get("SIGN_CAPTION_BACKEND", "remote"),
+                                   cache=CaptionCache(os.path.join(self.state_dir, "caption_cache.json")))
+        self.memory_pool = MemoryPool(log_dir=log_dir)
+        self.prompt_pool = PromptPool(PromptLLMGenerator(), path=os.path.join(self.state_dir, "prompt_pool.json"),
+                                      index=self.prompt_index)
+        self.monitor = BehaviorMonitorAgent()
+        self.fleet = FleetMonitor()
+        self.session_log = SessionLogger(log_dir)
+
+        self.active = set()
+        self.counts = {"sessions": 0, "lessons": 0, "rejected": 0, "timeouts": 0, "dropped": 0, "errors": 0}
+        self.process = psutil.Process()
+        self.started = time.time()
+
+    def grade(self, expected, actual):
+        score = self.embeddings.similarity(expected, actual)
+        return score >= self.threshold, score
+
+    def new_engine(self, user_id):
+        tutor = AdaptiveTutorAgent(user_id=user_id, memory_pool=self.memory_pool,
+                                   prompt_pool=self.prompt_pool, prompt_index=self.prompt_index)
+        tutor.prompt_generator = self.prompt_pool.generator
+        return LessonEngine(self.captioner, tutor, self.monitor, self.grade, self.embeddings,
+                            log_dir=None, batch_captions=self.batch_captions, fleet=self.fleet,
+                            session_log=self.session_log, save_caches=False)
+
+    def stats(self):
+        return {
+            "pid": os.getpid(),
+            "sessions_active": len(self.active),
+            "max_sessions": self.max_sessions,
+            **self.counts,
+            "uptime_s": round(time.time() - self.started, 1),
+            "rss_mb": round(self.process.memory_info().rss / 2 ** 20, 1),
+            "learner_memories": len(self.memory_pool),
+            "fleet": self.fleet.rollup(),
+            "caption_cache": self.captioner.cache_stats(),
+            "embedding_cache": self.embeddings.stats(),
+        }
+
+    def save_caches(self):
+        self.captioner.save_cache()
+        self.embeddings.save_cache()
+
+    async def housekeeping(self):
+        while True:
+            await asyncio.sleep(self.save_every)
+            try:
+                await asyncio.to_thread(self.save_caches)
+                await asyncio.to_thread(self.memory_pool.evict_idle)
+                self.fleet.evict_idle()
+            except Exception as e:
+                logger.error(f"Housekeeping failed: {e}")
+
+    def admit(self, session):
+        # Refuse new sessions outright when full, queueing them would only add latency
+        if len(self.active) >= self.max_sessions:
+            self.counts["rejected"] += 1
+            return False
+        self.active.add(session)
+        self.counts["sessions"] += 1
+        return True
+
+    async def handle(self, reader, writer):
+        try:
+            request = await asyncio.wait_for(read_http_head(reader), self.idle_timeout)
+            if request is None:
+                return
+            method, target, headers = request
+            url = urlsplit(target)
+            query = {k: v[0] for k, v in parse_qs(url.query).items()}
+            if method == "GET" and url.path == "/ws" and headers.get("upgrade", "").lower() == "websocket":
+                await self.handle_websocket(reader, writer, headers, query)
+            elif method == "POST" and url.path == "/lessons":
+                await self.handle_lesson_request(reader, writer, headers)
+            elif method == "GET" and url.path == "/health":
+                writer.write(http_response(200, {"status": "ok", "sessions_active": len(self.active)}))
+            elif method == "GET" and url.path == "/stats":
+                writer.write(http_response(200, self.stats()))
+            else:
+                writer.write(http_response(404, {"error": "not found"}))
+            await writer.drain()
+        except asyncio.TimeoutError:
+            self.counts["timeouts"] += 1
+        except (ConnectionError, ConnectionClosed):
+            pass
+        except Exception as e:
+            self.counts["errors"] += 1
+            logger.error(f"Request failed: {e}")
+        finally:
+            writer.close()
+
+    async def handle_websocket(self, reader, writer, headers, query):
+        user_id = query.get("user")
+        if not user_id:
+            writer.write(http_response(400, {"error": "missing user"}))
+            return
+        connection = LearnerConnection(self, user_id, reader, writer)
+        if not self.admit(connection):
+            writer.write(http_response(503, {"error": "server busy"}, {"Retry-After": "1"}))
+            return
+        try:
+            writer.write(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                          f"Sec-WebSocket-Accept: {ws_accept_key(headers.get('sec-websocket-key', ''))}\r\n\r\n")
+                         .encode("latin-1"))
+            await writer.drain()
+            await asyncio.wait_for(connection.run(), self.session_timeout)
+        except asyncio.TimeoutError:
+            self.counts["timeouts"] += 1
+        finally:
+            self.active.discard(connection)
+
+    async def handle_lesson_request(self, reader, writer, headers):
+        # A whole lesson in one request: {"user_id", "glosses", optional "prompts"} -> lesson_end
+        try:
+            length = int(headers.get("content-length", 0))
+        except ValueError:
+            length = -1
+        if length < 0:
+            writer.write(http_response(400, {"error": "invalid Content-Length"}))
+            return
+        if length > self.max_message_bytes:
+            writer.write(http_response(413, {"error": "request too large"}))
+            return
+        try:
+            body = orjson.loads(await asyncio.wait_for(reader.readexactly(length), self.idle_timeout))
+            glosses = [str(g) for g in body["glosses"]]
+            user_id = body.get("user_id")
+        except (orjson.JSONDecodeError, KeyError, TypeError):
+            writer.write(http_response(400, {"error": "expected JSON with a glosses list"}))
+            return
+        if not user_id:
+            writer.write(http_response(400, {"error": "missing user_id"}))
+            return
+
+        async def responses():
+            for gloss in glosses:
+                yield gloss
+
+        token = object()
+        if not self.admit(token):
+            writer.write(http_response(503, {"error": "server busy"}, {"Retry-After": "1"}))
+            return
+        try:
+            engine = self.new_engine(user_id)
+            summary = await asyncio.wait_for(engine.arun_lesson(responses(), lambda event: None, body.get("prompts")),
+                                             self.session_timeout)
+            self.counts["lessons"] += 1
+            writer.write(http_response(200, summary))
+        except asyncio.TimeoutError:
+            self.counts["timeouts"] += 1
+            writer.write(http_response(408, {"error": "lesson timed out"}))
+        finally:
+            self.active.discard(token)
+
+    async def serve(self, host="127.0.0.1", port=8080, sock=None):
+        loop = asyncio.get_running_loop()
+        # Captioning, grading and file writes run here; bounded, so a burst queues instead of
+        # starting a thread per request
+        loop.set_default_executor(ThreadPoolExecutor(self.threads, thread_name_prefix="lesson"))
+        self.prompt_pool.start()
+        if self.prompt_index is not None and len(self.prompt_index) == 0:
+            # First run: index the prompt history in the background
+            self.indexer = asyncio.create_task(
+                asyncio.to_thread(self.prompt_index.build, self.memory_pool.get(None), self.log_dir))
+        housekeeping = asyncio.create_task(self.housekeeping())
+        if sock is not None:
+            # Already bound and listening, e.g. inherited from lesson_supervisor.py
+            server = await asyncio.start_server(self.handle, sock=sock)
+        else:
+            server = await asyncio.start_server(self.handle, host, port, backlog=1024)
+        print(f"🎓 Lesson server listening on {host}:{server.sockets[0].getsockname()[1]}", flush=True)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            housekeeping.cancel()
+            self.prompt_pool.stop()
+            await asyncio.to_thread(self.save_caches)
+            await asyncio.to_thread(self.memory_pool.close)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve lessons to many learners from one process.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--log-dir", default="logs")
+    parser.add_argument("--encoder", choices=["hashing", "minilm"], default="minilm")
+    parser.add_argument("--max-sessions", type=int, default=500, help="concurrent sessions before new ones get 503")
+    parser.add_argument("--idle-timeout", type=float, default=120.0, help="seconds to wait for a learner message")
+    parser.add_argument("--session-timeout", type=float, default=3600.0, help="longest a connection may stay open")
+    parser.add_argument("--threads", type=int, default=32, help="worker threads for captioning and grading")
+    parser.add_argument("--batch-captions", action="store_true", help="one captioning request per lesson")
+    args = parser.parse_args()
+
+    server = LessonServer(args.log_dir, args.encoder, args.max_sessions, args.idle_timeout, args.session_timeout,
+                          threads=args.threads, batch_captions=args.batch_captions)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
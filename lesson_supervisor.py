@@ -0,0 +1,357 @@
+import argparse
+import asyncio
+import gc
+import itertools
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import time
+import zlib
+from urllib.parse import parse_qs, urlsplit
+
+import orjson
+import psutil
+
+from agents.embedding_engine import HashingEncoder, load_encoder
+from agents.summary import SUMMARY_MODELS, load_seq2seq_model
+from lesson_server import LessonServer, http_response, read_http_head
+
+# Logging setup
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Pre-fork lesson server for multi-core nodes. The supervisor loads the models once, moves their
+# tensors to shared memory and forks N lesson_server workers that use them without a copy, plus a
+# router that owns the public port. The router sends every learner to the same worker (by user id)
+# so their memory has one writer, answers GET /health and GET /stats for the whole fleet, and
+# proxies everything else. A crashed worker is forked again from the supervisor, models and all.
+# Usage: python lesson_supervisor.py --port 8080 --workers 4 [--encoder hashing] [--summary-model base]
+
+
+def share_weights(model):
+    # Read-only weights would be shared copy-on-write anyway; in shared memory they are shared
+    # outright, so nothing a worker allocates next to them can make it copy a page of them
+    import torch
+
+    if isinstance(model, torch.nn.Module):
+        model.share_memory()
+    return model
+
+
+def preload_models(encoder="minilm", summary_model=None, threads=None):
+    # Everything heavy, loaded before the fork. Nothing here runs inference: thread pools
+    # started in the parent would not exist in the workers.
+    os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+    embedding_model = None
+    backend = os.environ.get("SIGN_ENCODER_BACKEND", "torch")
+    if encoder == "hashing":
+        embedding_model = HashingEncoder()
+    elif backend == "onnx":
+        # onnxruntime sessions own their thread pools, each worker opens the exported model itself
+        logger.info("ONNX encoder sessions are created per worker.")
+    else:
+        embedding_model = share_weights(load_encoder("all-MiniLM-L6-v2", backend, threads))
+    if os.environ.get("SIGN_CAPTION_BACKEND") == "local":
+        # Cached by load_seq2seq_model, so the workers' local caption backends find it loaded
+        share_weights(load_seq2seq_model("google/flan-t5-base", True)[1])
+    if summary_model:
+        share_weights(load_seq2seq_model(SUMMARY_MODELS.get(summary_model, summary_model), False)[1])
+    return embedding_model
+
+
+def listen(host, port, backlog=1024):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.setblocking(False)
+    return sock
+
+
+async def fetch_json(port, path, timeout=5.0):
+    reader, writer = await asyncio.wait_for(asyncio.open_connection("127.0.0.1", port), timeout)
+    try:
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n".encode("latin-1"))
+        await writer.drain()
+        # The lesson server answers with Connection: close
+        response = await asyncio.wait_for(reader.read(), timeout)
+    finally:
+        writer.close()
+    return orjson.loads(response.split(b"\r\n\r\n", 1)[1])
+
+
+async def pipe(reader, writer):
+    try:
+        while data := await reader.read(65536):
+            writer.write(data)
+            await writer.drain()
+        if writer.can_write_eof():
+            writer.write_eof()
+    except (ConnectionError, OSError):
+        writer.close()
+
+
+class Router:
+    # Runs in its own process on the public socket. Workers listen on sockets the supervisor
+    # keeps open across restarts, so a connection routed to a restarting worker waits in its
+    # backlog instead of failing.
+    def __init__(self, sock, ports, restarts, idle_timeout=120.0, max_message_bytes=65536):
+        self.sock = sock
+        self.ports = ports
+        self.restarts = restarts
+        self.idle_timeout = idle_timeout
+        self.max_message_bytes = max_message_bytes
+        self.round_robin = itertools.cycle(range(len(ports)))
+        self.started = time.time()
+
+    def pick(self, user_id):
+        # Sticky per learner; requests without a user id take turns (the worker rejects them)
+        if user_id:
+            return zlib.crc32(str(user_id).encode("utf-8")) % len(self.ports)
+        return next(self.round_robin)
+
+    async def stats(self):
+        results = await asyncio.gather(*(fetch_json(port, "/stats") for port in self.ports), return_exceptions=True)
+        workers, states, max_sessions = [], {}, 0
+        for i, result in enumerate(results):
+            try:
+                if isinstance(result, Exception):
+                    raise result
+                memory = psutil.Process(result["pid"]).memory_full_info()
+                worker = {
+                    "worker": i, "up": True, "pid": result["pid"], "restarts": self.restarts[i],
+                    "sessions_active": result["sessions_active"], "sessions": result["sessions"],
+                    "lessons": result["lessons"], "rejected": result["rejected"], "timeouts": result["timeouts"],
+                    "rss_mb": round(memory.rss / 2 ** 20, 1),
+                    # Pages only this worker has: what one more worker costs
+                    "uss_mb": round(memory.uss / 2 ** 20, 1),
+                    "pss_mb": round(memory.pss / 2 ** 20, 1),
+                }
+                worker_states = dict(result["fleet"]["states"])
+                worker_max = result["max_sessions"]
+            except (OSError, asyncio.TimeoutError, IndexError, KeyError, TypeError, ValueError, psutil.Error):
+                # Down, restarting or a partial or garbled reply (ValueError covers JSON decode errors)
+                workers.append({"worker": i, "up": False, "restarts": self.restarts[i]})
+                continue
+            workers.append(worker)
+            max_sessions += worker_max
+            for state, n in worker_states.items():
+                states[state] = states.get(state, 0) + n
+        up = [w for w in workers if w["up"]]
+        supervisor = psutil.Process(os.getppid()).memory_info().rss
+        router = psutil.Process().memory_full_info().uss
+        total = lambda key: sum(w[key] for w in up)
+        return {
+            "workers": workers,
+            "workers_up": len(up),
+            "sessions_active": total("sessions_active"),
+            "max_sessions": max_sessions,
+            "sessions": total("sessions"),
+            "lessons": total("lessons"),
+            "rejected": total("rejected"),
+            "timeouts": total("timeouts"),
+            "restarts": sum(self.restarts),
+            "uptime_s": round(time.time() - self.started, 1),
+            "supervisor_rss_mb": round(supervisor / 2 ** 20, 1),
+            # Whole fleet: the supervisor with the shared models plus what each process adds
+            "rss_mb": round((supervisor + router) / 2 ** 20 + total("uss_mb"), 1),
+            "fleet": {"states": states},
+        }
+
+    async def handle(self, reader, writer):
+        upstream = None
+        try:
+            request = await asyncio.wait_for(read_http_head(reader), self.idle_timeout)
+            if request is None:
+                return
+            method, target, headers = request
+            url = urlsplit(target)
+            if method == "GET" and url.path == "/health":
+                writer.write(http_response(200, {"status": "ok", "workers": len(self.ports)}))
+                await writer.drain()
+                return
+            if method == "GET" and url.path == "/stats":
+                writer.write(http_response(200, await self.stats()))
+                await writer.drain()
+                return
+
+            user_id = parse_qs(url.query).get("user", [None])[0]
+            body = b""
+            try:
+                length = int(headers.get("content-length", 0))
+            except ValueError:
+                length = -1
+            if length < 0:
+                writer.write(http_response(400, {"error": "invalid Content-Length"}))
+                await writer.drain()
+                return
+            if length > self.max_message_bytes:
+                writer.write(http_response(413, {"error": "request too large"}))
+                await writer.drain()
+                return
+            if length:
+                body = await asyncio.wait_for(reader.readexactly(length), self.idle_timeout)
+                try:
+                    user_id = orjson.loads(body).get("user_id") or user_id
+                except (orjson.JSONDecodeError, AttributeError):
+                    pass  # the worker answers 400
+
+            upstream = await asyncio.open_connection("127.0.0.1", self.ports[self.pick(user_id)])
+            head = f"{method} {target} HTTP/1.1\r\n" + "".join(f"{k}: {v}\r\n" for k, v in headers.items())
+            upstream[1].write((head + "\r\n").encode("latin-1") + body)
+            # Done once the worker closes; a client closing first is passed on as EOF
+            to_worker = asyncio.create_task(pipe(reader, upstream[1]))
+            await pipe(upstream[0], writer)
+            to_worker.cancel()
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except Exception as e:
+            logger.error(f"Routing failed: {e}")
+        finally:
+            if upstream is not None:
+                upstream[1].close()
+            writer.close()
+
+    async def serve(self):
+        server = await asyncio.start_server(self.handle, sock=self.sock)
+        async with server:
+            await server.serve_forever()
+
+
+class Supervisor:
+    # Parent process: holds the models and every listening socket, forks the router and the
+    # workers, and forks a replacement whenever one exits. It never runs an event loop itself.
+    def __init__(self, args):
+        self.args = args
+        self.sock = listen(args.host, args.port)
+        self.worker_socks = [listen("127.0.0.1", 0) for _ in range(args.workers)]
+        self.ports = [s.getsockname()[1] for s in self.worker_socks]
+        # Restart counts, in shared memory so the router can report them
+        self.restarts = multiprocessing.Array("i", args.workers, lock=False)
+        self.children = {}
+        self.started = {}
+        self.embedding_model = None
+
+    def fork(self, name, target):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                signal.signal(signal.SIGTERM, signal.default_int_handler)
+                target()
+            except KeyboardInterrupt:
+                pass
+            except BaseException as e:
+                logger.error(f"{name} failed: {e}")
+                code = 1
+            finally:
+                # Skip the parent's cleanup handlers inherited by the fork
+                os._exit(code)
+        self.children[pid] = name
+        self.started[name] = time.time()
+        return pid
+
+    def run_router(self):
+        for sock in self.worker_socks:
+            sock.close()
+        router = Router(self.sock, self.ports, self.restarts, self.args.idle_timeout)
+        asyncio.run(router.serve())
+
+    def run_worker(self, i):
+        self.sock.close()
+        for j, sock in enumerate(self.worker_socks):
+            if j != i:
+                sock.close()
+        args = self.args
+        server = LessonServer(args.log_dir, args.encoder, args.max_sessions, args.idle_timeout, args.session_timeout,
+                              threads=args.threads, batch_captions=args.batch_captions,
+                              embedding_model=self.embedding_model,
+                              state_dir=os.path.join(args.log_dir, "workers", str(i)))
+        asyncio.run(server.serve("127.0.0.1", self.ports[i], sock=self.worker_socks[i]))
+
+    def spawn(self, name):
+        if name == "router":
+            return self.fork(name, self.run_router)
+        i = int(name.split("-")[1])
+        return self.fork(name, lambda: self.run_worker(i))
+
+    def run(self):
+        args = self.args
+        start = time.perf_counter()
+        # Split the cores between the workers unless told otherwise
+        threads = args.encoder_threads or max(1, (os.cpu_count() or 1) // args.workers)
+        self.embedding_model = preload_models(args.encoder, args.summary_model, threads)
+        # Objects that exist now are never collected, so the workers' collector does not write to their pages
+        gc.collect()
+        gc.freeze()
+        logger.info(f"Models loaded in {time.perf_counter() - start:.1f} s, "
+                    f"{psutil.Process().memory_info().rss / 2 ** 20:.0f} MB")
+
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+        for i in range(args.workers):
+            self.spawn(f"worker-{i}")
+        self.spawn("router")
+        print(f"🎓 Lesson supervisor listening on {args.host}:{self.sock.getsockname()[1]} "
+              f"with {args.workers} workers", flush=True)
+        try:
+            while True:
+                pid, status = os.wait()
+                name = self.children.pop(pid, None)
+                if name is None:
+                    continue
+                logger.warning(f"{name} (pid {pid}) exited with status {os.waitstatus_to_exitcode(status)}, restarting")
+                if name.startswith("worker-"):
+                    self.restarts[int(name.split("-")[1])] += 1
+                # Do not fork in a tight loop when a child dies right after starting
+                if time.time() - self.started[name] < 1.0:
+                    time.sleep(1.0)
+                self.spawn(name)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def stop(self, timeout=10.0):
+        for pid in self.children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.time() + timeout
+        while self.children and time.time() < deadline:
+            pid, _ = os.waitpid(-1, os.WNOHANG)
+            if pid:
+                self.children.pop(pid, None)
+            else:
+                time.sleep(0.05)
+        for pid in self.children:
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                # Exited between the last wait and now
+                pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve lessons from several worker processes sharing one copy of the models.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--log-dir", default="logs")
+    parser.add_argument("--encoder", choices=["hashing", "minilm"], default="minilm")
+    parser.add_argument("--encoder-threads", type=int, default=None, help="per worker, default: cores / workers")
+    parser.add_argument("--summary-model", default=None, help="also preload a SummaryAgent model, e.g. base")
+    parser.add_argument("--max-sessions", type=int, default=500, help="per worker")
+    parser.add_argument("--idle-timeout", type=float, default=120.0)
+    parser.add_argument("--session-timeout", type=float, default=3600.0)
+    parser.add_argument("--threads", type=int, default=32, help="per worker, for captioning and grading")
+    parser.add_argument("--batch-captions", action="store_true")
+    args = parser.parse_args()
+
+    Supervisor(args).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,31 @@
-from controller import ControllerAgent
+import os
+import sys
+
+from agents.metrics import metrics
+from agents.startup import startup_timer
+
+with startup_timer.phase("import controller"):
+    from controller import ControllerAgent
 
 if __name__ == "__main__":
-    controller = ControllerAgent()
-    controller.run_lesson()
+    # --user <id> keeps a separate reinforcement memory per learner
+    user_id = sys.argv[sys.argv.index("--user") + 1] if "--user" in sys.argv else None
+
+    # Stage latencies go to logs/metrics.prom and logs/trace.jsonl, same as SIGN_METRICS=1;
+    # --profile cprofile|sample also profiles every lesson into logs/profiles/
+    if "--metrics" in sys.argv:
+        metrics.enabled = True
+    if "--profile" in sys.argv:
+        metrics.enabled = True
+        metrics.profiler = sys.argv[sys.argv.index("--profile") + 1]
 
+    with startup_timer.phase("construct controller"):
+        controller = ControllerAgent(user_id=user_id)
+
+    # Cold start breakdown, also written to a file when SIGN_STARTUP_REPORT is set
+    if "--startup-report" in sys.argv:
+        startup_timer.print_report()
+    if os.environ.get("SIGN_STARTUP_REPORT"):
+        startup_timer.write_report(os.environ["SIGN_STARTUP_REPORT"])
+
+    controller.run_lesson()
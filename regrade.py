@@ -0,0 +1,195 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+from filelock import FileLock
+
+from agents.embedding_engine import HashingEncoder, normalize_text
+from agents.logger import SessionLogger
+from agents.reinforce_memory import learner_dir
+
+# Offline re-grading of every recorded attempt with new thresholds.
+# Usage: python regrade.py --log-dir logs --threshold 0.75 --workers 4 [--encoder hashing]
+
+SWEEP = [round(float(t), 2) for t in np.arange(0.50, 0.96, 0.05)]
+
+encoder = None
+
+
+def init_worker(encoder_name):
+    global encoder
+    logging.getLogger().setLevel(logging.WARNING)
+    if encoder_name == "hashing":
+        encoder = HashingEncoder()
+        return
+    import torch
+    from sentence_transformers import SentenceTransformer
+    # One thread per process, the pool provides the parallelism
+    torch.set_num_threads(1)
+    encoder = SentenceTransformer(encoder_name)
+
+
+def encode_chunk(texts):
+    return encoder.encode(texts, batch_size=256, convert_to_numpy=True, normalize_embeddings=True,
+                          show_progress_bar=False).astype(np.float32)
+
+
+def iter_attempts(log_dir):
+    # Streamed from the session log store one record at a time, oldest first. Timestamps are
+    # in the memory's "%Y-%m-%d %H:%M:%S" format, not the session log's file-name friendly one
+    for record in SessionLogger(log_dir).read():
+        timestamp = datetime.fromtimestamp(record["ts"]).strftime("%Y-%m-%d %H:%M:%S")
+        for r in record.get("results", []):
+            yield r, timestamp, record.get("user_id")
+
+
+def embed_texts(texts, encoder_name, workers, chunk_size):
+    chunks = [texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size)]
+    if workers <= 1:
+        init_worker(encoder_name)
+        parts = [encode_chunk(c) for c in chunks]
+    else:
+        with ProcessPoolExecutor(workers, initializer=init_worker, initargs=(encoder_name,)) as pool:
+            parts = list(pool.map(encode_chunk, chunks))
+    return np.concatenate(parts) if parts else np.zeros((0, 1), dtype=np.float32)
+
+
+def regrade(log_dir, encoder_name="all-MiniLM-L6-v2", workers=1, chunk_size=2048):
+    # Deduplicate texts so every distinct prompt/caption is embedded exactly once
+    text_ids = {}
+    texts = []
+    attempts = []
+    expected_ids = []
+    actual_ids = []
+    for r, timestamp, user_id in iter_attempts(log_dir):
+        ids = []
+        for text in (r["prompt"], r["caption"]):
+            key = normalize_text(text)
+            if key not in text_ids:
+                text_ids[key] = len(texts)
+                texts.append(key)
+            ids.append(text_ids[key])
+        expected_ids.append(ids[0])
+        actual_ids.append(ids[1])
+        attempts.append((r, timestamp, user_id))
+
+    start = time.perf_counter()
+    embeddings = embed_texts(texts, encoder_name, workers, chunk_size)
+    embed_s = time.perf_counter() - start
+
+    # Row-wise cosine similarity of unit vectors, one matrix operation for every attempt
+    if attempts:
+        scores = np.einsum("ij,ij->i", embeddings[np.array(expected_ids)], embeddings[np.array(actual_ids)])
+    else:
+        scores = np.zeros(0, dtype=np.float32)
+    return attempts, scores, {"attempts": len(attempts), "unique_texts": len(texts), "embed_seconds": round(embed_s, 2)}
+
+
+def threshold_sweep(attempts, scores, weak_threshold, strong_threshold, min_failures=2, min_successes=2):
+    prompts = {}
+    prompt_ids = np.array([prompts.setdefault(r["prompt"], len(prompts)) for r, *_ in attempts], dtype=np.int64)
+    recorded = np.array([r["result"] == "Correct" for r, *_ in attempts], dtype=bool)
+
+    sweep = []
+    for t in SWEEP:
+        correct = scores >= t
+        sweep.append({
+            "threshold": t,
+            "accuracy": round(float(correct.mean()), 4) if len(scores) else 0.0,
+            "changed_vs_recorded": int((correct != recorded).sum()),
+        })
+
+    failures = np.bincount(prompt_ids, weights=scores < weak_threshold, minlength=len(prompts))
+    successes = np.bincount(prompt_ids, weights=scores >= strong_threshold, minlength=len(prompts))
+    return {
+        "sweep": sweep,
+        "weak_prompts": int((failures >= min_failures).sum()),
+        "strong_prompts": int((successes >= min_successes).sum()),
+    }
+
+
+def build_memory(attempts, scores, threshold, strong_threshold, min_successes=2):
+    # {user_id: {prompt: records}}, one memory per learner as ReinforcementMemory shards them
+    memories = defaultdict(lambda: defaultdict(list))
+    for (r, timestamp, user_id), score in zip(attempts, scores):
+        memories[user_id][r["prompt"]].append({
+            "gloss": r["gloss"],
+            "caption": r["caption"],
+            "similarity": round(float(score), 2),
+            "result": "Correct" if score >= threshold else "Incorrect",
+            "timestamp": timestamp
+        })
+    # Same pruning rule as ReinforcementMemory: consistently strong prompts are dropped
+    return {
+        user_id: {
+            prompt: records for prompt, records in memory.items()
+            if sum(1 for rec in records if rec["similarity"] >= strong_threshold) < min_successes
+        }
+        for user_id, memory in memories.items()
+    }
+
+
+def write_memories(memories, output_dir, memory_file="reinforcement_memory.json"):
+    # Snapshots in the layout ReinforcementMemory reads. Any journal or review schedule left
+    # next to a snapshot belongs to the old data, so both go; the schedule is rebuilt on load.
+    for user_id, memory in memories.items():
+        shard_dir = learner_dir(output_dir, user_id)
+        os.makedirs(shard_dir, exist_ok=True)
+        path = os.path.join(shard_dir, memory_file)
+        base = os.path.splitext(path)[0]
+        with FileLock(path + ".lock"):
+            with open(path + ".tmp", "w") as f:
+                json.dump({"version": 2, "seq": 0, "memory": memory}, f)
+            os.replace(path + ".tmp", path)
+            for stale in (base + ".journal.jsonl", base + ".schedule.json"):
+                if os.path.exists(stale):
+                    os.remove(stale)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-score historical sessions with new thresholds.")
+    parser.add_argument("--log-dir", default="logs")
+    parser.add_argument("--encoder", default="all-MiniLM-L6-v2", help="sentence-transformers model or 'hashing'")
+    parser.add_argument("--threshold", type=float, default=0.75, help="grading threshold")
+    parser.add_argument("--weak-threshold", type=float, default=0.6)
+    parser.add_argument("--strong-threshold", type=float, default=0.9)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-size", type=int, default=2048)
+    parser.add_argument("--output-dir", default="logs/regraded",
+                        help="memory shards are written here, use the log dir to replace the live memory")
+    parser.add_argument("--report", default="logs/regrade_report.json")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    attempts, scores, stats = regrade(args.log_dir, args.encoder, args.workers, args.chunk_size)
+    report = {
+        **stats,
+        "threshold": args.threshold,
+        **threshold_sweep(attempts, scores, args.weak_threshold, args.strong_threshold),
+    }
+    memories = build_memory(attempts, scores, args.threshold, args.strong_threshold)
+    report["total_seconds"] = round(time.perf_counter() - start, 2)
+
+    write_memories(memories, args.output_dir)
+    os.makedirs(os.path.dirname(args.report) or ".", exist_ok=True)
+    with open(args.report, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"Re-graded {stats['attempts']} attempts ({stats['unique_texts']} unique texts) in {report['total_seconds']}s")
+    print(f"{'threshold':>10} {'accuracy':>9} {'changed':>8}")
+    for row in report["sweep"]:
+        print(f"{row['threshold']:>10} {row['accuracy']:>9} {row['changed_vs_recorded']:>8}")
+    print(f"Weak prompts: {report['weak_prompts']}, strong prompts: {report['strong_prompts']}")
+    print(f"💾 Memory of {len(memories)} learners written to {args.output_dir}, report to {args.report}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,136 @@
+import argparse
+import logging
+import os
+import re
+import sys
+import tempfile
+import time
+from multiprocessing import Pool
+
+from agents.caption_cache import CaptionCache
+from agents.captioner import Captioner
+from agents.embedding_engine import EmbeddingEngine, HashingEncoder
+from agents.logger import SessionLogger
+from agents.memory_pool import MemoryPool
+from agents.monitor import BehaviorMonitorAgent
+from agents.tutor import AdaptiveTutorAgent
+from lesson_engine import LessonEngine
+
+# Replays recorded sessions through the full lesson pipeline with mocked LLM backends.
+# Usage: python replay.py --log-dir logs --workers 4 --repeat 10 [--encoder hashing] [--min-sessions-per-sec 50]
+
+
+def load_sessions(log_dir):
+    return [record["results"] for record in SessionLogger(log_dir).read() if record.get("results")]
+
+
+class ReplayClient:
+    # Stands in for the captioner's LLMClient and answers with the recorded captions
+    def __init__(self, sessions, latency=0.0):
+        self.latency = latency
+        self.captions = {}
+        for results in sessions:
+            for r in results:
+                self.captions[r["gloss"].strip().upper()] = r["caption"]
+
+        self.requests = 0
+
+    def answer(self, gloss):
+        return self.captions.get(gloss, gloss.capitalize())
+
+    def chat(self, messages, **kwargs):
+        self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+        content = messages[-1]["content"]
+        if not content.endswith("→"):
+            # Batch prompt: a numbered list of glosses, answered the same way
+            glosses = re.findall(r"^(\d+)\. (.+)$", content.rsplit("nothing else:", 1)[-1], flags=re.MULTILINE)
+            return "\n".join(f"{n}. {self.answer(gloss)}" for n, gloss in glosses)
+        # The gloss is the last line of the prompt, just before the closing arrow
+        return self.answer(content.rsplit("\n→", 1)[0].rsplit("\n", 1)[-1])
+
+
+class ReplayPromptGenerator:
+    def generate_prompts(self, difficulty="beginner", count=5):
+        return [f"{difficulty.capitalize()} replay sentence {i}." for i in range(count)]
+
+
+def build_engine(sessions, work_dir, encoder="hashing", llm_latency=0.0, threshold=0.75, batch_captions=False):
+    captioner = Captioner(cache=CaptionCache(path=None), use_exact_matches=False,
+                          client=ReplayClient(sessions, llm_latency))
+
+    tutor = AdaptiveTutorAgent(user_id="replay", memory_pool=MemoryPool(log_dir=work_dir))
+    tutor.prompt_generator = ReplayPromptGenerator()
+
+    model = HashingEncoder() if encoder == "hashing" else None
+    embeddings = EmbeddingEngine(cache_path=None, model=model)
+
+    def grade(expected, actual):
+        score = embeddings.similarity(expected, actual)
+        return score >= threshold, score
+
+    return LessonEngine(captioner, tutor, BehaviorMonitorAgent(), grade, embeddings,
+                        log_dir=os.path.join(work_dir, "sessions"), batch_captions=batch_captions)
+
+
+def replay_worker(job):
+    log_dir, repeat, encoder, llm_latency, batch_captions = job
+    logging.getLogger().setLevel(logging.WARNING)
+    sessions = load_sessions(log_dir)
+    with tempfile.TemporaryDirectory() as work_dir:
+        engine = build_engine(sessions, work_dir, encoder, llm_latency, batch_captions=batch_captions)
+        replayed = 0
+        changed = 0
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for results in sessions:
+                summary = engine.run_lesson(
+                    [r["gloss"] for r in results],
+                    prompts=[r["prompt"] for r in results],
+                )
+                replayed += 1
+                changed += sum(1 for old, new in zip(results, summary["results"]) if old["result"] != new["result"])
+        elapsed = time.perf_counter() - start
+        requests = engine.captioner.client.requests
+    return replayed, changed, elapsed, requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded lesson sessions headlessly.")
+    parser.add_argument("--log-dir", default="logs")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--encoder", choices=["hashing", "minilm"], default="hashing")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0)
+    parser.add_argument("--batch-captions", action="store_true", help="one captioning request per lesson")
+    parser.add_argument("--min-sessions-per-sec", type=float, default=None,
+                        help="exit with status 1 if per-core throughput falls below this")
+    args = parser.parse_args()
+
+    if not load_sessions(args.log_dir):
+        print(f"No session logs found in {args.log_dir}")
+        return 1
+
+    job = (args.log_dir, args.repeat, args.encoder, args.llm_latency_ms / 1000, args.batch_captions)
+    start = time.perf_counter()
+    with Pool(args.workers) as pool:
+        outcomes = pool.map(replay_worker, [job] * args.workers)
+    wall = time.perf_counter() - start
+
+    sessions = sum(o[0] for o in outcomes)
+    changed = sum(o[1] for o in outcomes)
+    per_core = sessions / wall / args.workers
+    print(f"Replayed {sessions} sessions on {args.workers} worker(s) in {wall:.2f}s")
+    print(f"Sessions/sec: {sessions / wall:.1f} total, {per_core:.1f} per core")
+    print(f"Results that differ from the recorded grade: {changed}")
+    print(f"Captioning requests: {sum(o[3] for o in outcomes)}")
+
+    if args.min_sessions_per_sec is not None and per_core < args.min_sessions_per_sec:
+        print(f"❌ Throughput {per_core:.1f}/s per core is below {args.min_sessions_per_sec}/s")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,61 @@
+from agents.caption_cache import CaptionCache
+from agents.captioner import Captioner
+
+
+class FakeClient:
+    def __init__(self, answers):
+        # stage -> list of replies, popped in order
+        self.answers = answers
+        self.calls = []
+
+    def chat(self, messages, model=None, temperature=None, stage=None):
+        self.calls.append((stage, messages[0]["content"]))
+        return self.answers[stage].pop(0)
+
+
+def captioner(answers):
+    return Captioner(cache=CaptionCache(path=None), use_exact_matches=False, client=FakeClient(answers))
+
+
+def test_batch_skips_empty_glosses():
+    c = captioner({"caption_batch": ["1. I want food.\n2. Where is the park?"]})
+    captions = c.caption_batch(["me want food", "", "  ", "where park"])
+    assert captions == ["I want food.", "", "", "Where is the park?"]
+    assert [stage for stage, _ in c.client.calls] == ["caption_batch"]
+
+
+def test_empty_captions_are_not_cached():
+    c = captioner({"caption": ["", "Hello."]})
+    assert c.caption("hello") == ""
+    assert len(c.cache.entries) == 0
+    # Asked again instead of answered from the cache
+    assert c.caption("hello") == "Hello."
+    assert c.caption("hello") == "Hello."
+    assert len(c.client.calls) == 2
+    assert c.caption("") == ""
+    assert len(c.client.calls) == 2
+
+
+def test_learned_exact_matches_are_saved_next_to_the_cache(tmp_path):
+    path = str(tmp_path / "caption_cache.json")
+    c = Captioner(cache=CaptionCache(path), client=FakeClient({}))
+    c.learn_from_results([{"gloss": "me happy", "caption": "I am happy.", "similarity": 0.95},
+                          {"gloss": "me sad", "caption": "I am bad.", "similarity": 0.4}])
+    c.save_cache()
+
+    reloaded = Captioner(cache=CaptionCache(path), client=FakeClient({}))
+    assert reloaded.learned_matches == {"ME HAPPY": "I am happy."}
+    assert reloaded.caption("me happy") == "I am happy."
+    assert reloaded.client.calls == []
+
+
+def test_import_exact_matches_from_history(tmp_path):
+    from agents.logger import SessionLogger
+
+    SessionLogger(str(tmp_path)).append({"results": [
+        {"prompt": "Good morning.", "gloss": "good morning", "caption": "Good morning.", "similarity": 1.0}]})
+    path = str(tmp_path / "caption_cache.json")
+    # Building a captioner does not scan the history
+    assert Captioner(cache=CaptionCache(path)).learned_matches == {}
+    assert Captioner(cache=CaptionCache(path)).import_exact_matches(str(tmp_path)) == 1
+    assert Captioner(cache=CaptionCache(path)).learned_matches == {"GOOD MORNING": "Good morning."}
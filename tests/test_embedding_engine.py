@@ -0,0 +1,18 @@
+from collections import Counter
+
+from agents.embedding_engine import EmbeddingEngine, HashingEncoder
+from agents.metrics import metrics
+
+
+def test_cache_metrics_match_hit_and_miss_counts(monkeypatch):
+    monkeypatch.setattr(metrics, "enabled", True)
+    monkeypatch.setattr(metrics, "counters", Counter())
+    engine = EmbeddingEngine(cache_path=None, model=HashingEncoder())
+
+    engine.embed(["Hello.", "hello", "bye", "bye"])
+    engine.embed(["hello", "new", "new"])
+
+    counters = metrics.report()["counters"]
+    assert (engine.hits, engine.misses) == (1, 4)
+    assert counters["embedding_cache_total{result=hit}"] == engine.hits
+    assert counters["embedding_cache_total{result=miss}"] == engine.misses
@@ -0,0 +1,45 @@
+import asyncio
+
+import orjson
+
+from lesson_server import LessonServer
+
+
+async def request(server, raw):
+    listener = await asyncio.start_server(server.handle, "127.0.0.1", 0)
+    port = listener.sockets[0].getsockname()[1]
+    async with listener:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(raw)
+        await writer.drain()
+        response = await reader.read()
+        writer.close()
+    head, _, body = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), orjson.loads(body) if body else None
+
+
+def post_lesson(body, length=None):
+    length = len(body) if length is None else length
+    return (f"POST /lessons HTTP/1.1\r\nHost: x\r\nContent-Length: {length}\r\n\r\n").encode() + body
+
+
+def test_learner_id_is_required(tmp_path):
+    server = LessonServer(log_dir=str(tmp_path), encoder="hashing")
+    status, body = asyncio.run(request(server, b"GET /ws HTTP/1.1\r\nHost: x\r\nUpgrade: websocket\r\n"
+                                               b"Sec-WebSocket-Key: dGhlIHNhbXBsZSBub25jZQ==\r\n\r\n"))
+    assert (status, body) == (400, {"error": "missing user"})
+
+    status, body = asyncio.run(request(server, post_lesson(orjson.dumps({"glosses": ["HELLO"]}))))
+    assert (status, body) == (400, {"error": "missing user_id"})
+    assert len(server.memory_pool) == 0 and server.counts["errors"] == 0
+
+
+def test_invalid_content_length_is_a_bad_request(tmp_path):
+    server = LessonServer(log_dir=str(tmp_path), encoder="hashing")
+    body = orjson.dumps({"user_id": "ana", "glosses": ["HELLO"]})
+    for length in ["abc", "-5", "1.5"]:
+        status, reply = asyncio.run(request(server, post_lesson(body, length)))
+        assert (status, reply) == (400, {"error": "invalid Content-Length"})
+    status, _ = asyncio.run(request(server, post_lesson(body, 10 ** 9)))
+    assert status == 413
+    assert server.counts["errors"] == 0
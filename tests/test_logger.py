@@ -0,0 +1,28 @@
+import time
+from datetime import datetime
+
+from agents.logger import SessionLogger
+
+
+def session_id_at(ts):
+    return f"{datetime.fromtimestamp(ts).strftime('%Y%m%dT%H%M%S')}-0123abcd"
+
+
+def test_find_long_lesson(tmp_path):
+    store = SessionLogger(str(tmp_path))
+    started = time.time() - 3600
+    session_id = session_id_at(started)
+    # Logged when the lesson ended, 40 minutes after its id was made
+    store.append({"session_id": session_id, "ts": started + 40 * 60, "results": []})
+    store.append({"session_id": session_id_at(started + 1), "ts": started + 60, "results": []})
+
+    assert store.find(session_id)["session_id"] == session_id
+    store.rotate()
+    store.wait_for_compression()
+    assert store.find(session_id)["session_id"] == session_id
+
+
+def test_find_missing(tmp_path):
+    store = SessionLogger(str(tmp_path))
+    store.append({"results": []})
+    assert store.find(session_id_at(time.time() - 10 * 24 * 3600)) is None
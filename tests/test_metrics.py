@@ -0,0 +1,35 @@
+import asyncio
+import os
+
+from agents.metrics import Metrics
+
+
+def test_overlapping_profiles_run_one_at_a_time(tmp_path):
+    metrics = Metrics(enabled=True, log_dir=str(tmp_path), profiler="cprofile")
+
+    async def lesson(name):
+        with metrics.profile(name):
+            await asyncio.sleep(0.01)
+
+    async def lessons():
+        await asyncio.gather(lesson("first"), lesson("second"))
+
+    asyncio.run(lessons())
+    assert os.listdir(tmp_path / "profiles") == ["first.prof"]
+    assert metrics.report()["counters"]["profiles_skipped_total"] == 1
+
+    # Free again once the first one finished
+    asyncio.run(lesson("third"))
+    assert sorted(os.listdir(tmp_path / "profiles")) == ["first.prof", "third.prof"]
+
+
+def test_export_writes_spans_and_prometheus_text(tmp_path):
+    metrics = Metrics(enabled=True, log_dir=str(tmp_path))
+    with metrics.span("caption"):
+        pass
+    metrics.export()
+    metrics.export()
+    with open(metrics.trace_path) as f:
+        assert len(f.readlines()) == 1
+    with open(metrics.prometheus_path) as f:
+        assert 'stage="caption"' in f.read()
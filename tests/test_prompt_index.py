@@ -0,0 +1,40 @@
+import numpy as np
+
+from agents.embedding_engine import EmbeddingEngine, HashingEncoder
+from agents.logger import SessionLogger
+from agents.prompt_index import PromptIndex
+
+
+def engine():
+    return EmbeddingEngine(cache_path=None, model=HashingEncoder())
+
+
+def test_single_adds_grow_the_dense_copy_geometrically(tmp_path):
+    index = PromptIndex(path=str(tmp_path / "prompt_index"), dim=8)
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((3000, 8)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    buffers = set()
+    for i, vector in enumerate(vectors):
+        index.add_vectors([f"prompt {i}"], [vector])
+        buffers.add(id(index.dense_buffer))
+    assert len(index) == 3000 and index.dense.shape == (3000, 8)
+    # 1024 -> 2048 -> 4096
+    assert len(buffers) == 3
+    np.testing.assert_allclose(index.dense, vectors.astype(np.float16).astype(np.float32))
+    assert index.search_vector(vectors[1234], k=1)[0][0] == "prompt 1234"
+
+    reloaded = PromptIndex(path=str(tmp_path / "prompt_index"), dim=8)
+    assert len(reloaded) == 3000
+    assert reloaded.search_vector(vectors[42], k=1)[0][0] == "prompt 42"
+
+
+def test_build_does_not_fill_the_grading_cache(tmp_path):
+    store = SessionLogger(str(tmp_path))
+    store.append({"results": [{"prompt": f"We visit the park number {i}.", "caption": "", "similarity": 0.0}
+                              for i in range(50)]})
+    embeddings = engine()
+    index = PromptIndex(embeddings, path=str(tmp_path / "prompt_index"))
+    assert index.build(log_dir=str(tmp_path)) == 50
+    assert embeddings.stats()["size"] == 0
+    assert index.search("we visit the park number 7", k=1)[0][0] == "We visit the park number 7."
@@ -0,0 +1,45 @@
+import json
+import os
+
+from agents.logger import SessionLogger
+from agents.reinforce_memory import ReinforcementMemory
+from agents.review_scheduler import record_time
+from regrade import build_memory, regrade, write_memories
+
+
+def log_lesson(store, user_id, caption):
+    store.append({"user_id": user_id, "results": [
+        {"prompt": "Where is the library?", "gloss": "LIBRARY WHERE", "caption": caption,
+         "similarity": 0.0, "result": "Incorrect"},
+    ]})
+
+
+def test_regraded_memory_is_sharded_per_learner(tmp_path):
+    log_dir, out_dir = str(tmp_path / "logs"), str(tmp_path / "out")
+    store = SessionLogger(log_dir)
+    log_lesson(store, "ana", "Cooking dinner now.")
+    log_lesson(store, "ana", "Playing music today.")
+    log_lesson(store, "ben", "Where is the library?")
+
+    attempts, scores, _ = regrade(log_dir, "hashing")
+    memories = build_memory(attempts, scores, threshold=0.75, strong_threshold=0.9)
+    assert set(memories) == {"ana", "ben"}
+
+    # Leftovers of an older memory must not be replayed over the regraded one
+    stale = ReinforcementMemory(out_dir, user_id="ana")
+    stale.update([{"prompt": "Old prompt", "gloss": "OLD", "caption": "Old.", "similarity": 0.1,
+                   "result": "Incorrect"}])
+    assert os.path.exists(stale.journal_path)
+    write_memories(memories, out_dir)
+
+    ana = ReinforcementMemory(out_dir, user_id="ana")
+    assert list(ana.memory) == ["Where is the library?"]
+    records = ana.memory["Where is the library?"]
+    assert len(records) == 2
+    assert all(record_time(r) > 0 for r in records)
+    assert ana.due_prompts(5, now=4e9) == ["Where is the library?"]
+
+    ben = ReinforcementMemory(out_dir, user_id="ben")
+    assert ben.memory["Where is the library?"][0]["result"] == "Correct"
+    with open(ben.memory_path) as f:
+        assert json.load(f)["version"] == 2
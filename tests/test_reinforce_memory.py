@@ -0,0 +1,111 @@
+import json
+import multiprocessing
+import os
+
+from agents.reinforce_memory import ReinforcementMemory, learner_dir
+
+
+def attempt(prompt, similarity=0.3):
+    return {"prompt": prompt, "gloss": prompt.upper(), "caption": prompt, "similarity": similarity,
+            "result": "Correct" if similarity >= 0.75 else "Incorrect"}
+
+
+def test_replay_skips_torn_last_journal_line(tmp_path):
+    memory = ReinforcementMemory(str(tmp_path))
+    memory.update([attempt("one"), attempt("two")])
+    # A crash in the middle of an append
+    with open(memory.journal_path, "ab") as f:
+        f.write(b'{"op": "add", "prompt": "torn", "rec')
+
+    reloaded = ReinforcementMemory(str(tmp_path))
+    assert sorted(reloaded.memory) == ["one", "two"]
+
+    # The next append starts on a fresh line and survives the next replay
+    reloaded.update([attempt("three")])
+    assert sorted(ReinforcementMemory(str(tmp_path)).memory) == ["one", "three", "two"]
+
+
+def test_compaction_keeps_appends_made_while_it_writes(tmp_path):
+    compactor = ReinforcementMemory(str(tmp_path))
+    other = ReinforcementMemory(str(tmp_path))
+    compactor.update([attempt("before")])
+
+    write_snapshot = compactor.write_snapshot
+
+    def write_while_appending(path, snapshot, snapshot_seq):
+        # Another process appends after the state was copied but before the swap
+        other.update([attempt("during")])
+        write_snapshot(path, snapshot, snapshot_seq)
+
+    compactor.write_snapshot = write_while_appending
+    compactor.compact()
+
+    with open(compactor.memory_path) as f:
+        assert list(json.load(f)["memory"]) == ["before"]
+    reloaded = ReinforcementMemory(str(tmp_path))
+    assert sorted(reloaded.memory) == ["before", "during"]
+    assert len(reloaded.memory["before"]) == 1
+
+    other.update([attempt("after")])
+    assert sorted(ReinforcementMemory(str(tmp_path)).memory) == ["after", "before", "during"]
+
+
+def test_clear_memory_is_seen_by_another_instance(tmp_path):
+    first = ReinforcementMemory(str(tmp_path))
+    second = ReinforcementMemory(str(tmp_path))
+    first.update([attempt("old")])
+    second.update([attempt("also old")])
+
+    first.clear_memory()
+    second.update([attempt("new")])
+
+    assert list(second.memory) == ["new"]
+    assert list(ReinforcementMemory(str(tmp_path)).memory) == ["new"]
+
+
+def test_loads_legacy_bare_mapping(tmp_path):
+    record = {"gloss": "HELLO", "caption": "Hello.", "similarity": 0.2, "result": "Incorrect",
+              "timestamp": "2024-01-02 03:04:05"}
+    with open(tmp_path / "reinforcement_memory.json", "w") as f:
+        json.dump({"hello": [record, record, dict(record, similarity=0.95, result="Correct")]}, f)
+
+    memory = ReinforcementMemory(str(tmp_path))
+    assert len(memory.memory["hello"]) == 3
+    assert memory.failures["hello"] == 2 and memory.successes["hello"] == 1
+    assert memory.due_prompts(5) == ["hello"]
+
+    memory.update([attempt("bye")])
+    memory.compact()
+    with open(memory.memory_path) as f:
+        data = json.load(f)
+    assert data["version"] == 2 and sorted(data["memory"]) == ["bye", "hello"]
+
+
+def test_learner_shards_do_not_collide(tmp_path):
+    ids = ["a/b", "a_b", "é", "_", ".", "..", "a%2Fb"]
+    dirs = {learner_dir(str(tmp_path), user_id) for user_id in ids}
+    assert len(dirs) == len(ids)
+    assert all(os.path.dirname(d) == str(tmp_path / "learners") for d in dirs)
+
+    ReinforcementMemory(str(tmp_path), user_id="a/b").update([attempt("slash")])
+    assert not ReinforcementMemory(str(tmp_path), user_id="a_b").memory
+
+
+def update_shard(log_dir, worker, count):
+    memory = ReinforcementMemory(log_dir, user_id="shared learner", compact_every=25)
+    for i in range(count):
+        memory.update([attempt(f"prompt {worker}-{i}")])
+    memory.wait_for_compaction()
+
+
+def test_one_shard_written_by_several_processes(tmp_path):
+    processes = [multiprocessing.Process(target=update_shard, args=(str(tmp_path), worker, 40)) for worker in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+        assert process.exitcode == 0
+
+    memory = ReinforcementMemory(str(tmp_path), user_id="shared learner")
+    assert len(memory.memory) == 4 * 40
+    assert all(len(records) == 1 for records in memory.memory.values())
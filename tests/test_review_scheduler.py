@@ -0,0 +1,85 @@
+import pytest
+
+from agents.review_scheduler import DAY, ReviewScheduler
+
+NOW = 1_700_000_000.0
+
+
+def scheduled(prompt="hello", now=NOW, **kwargs):
+    scheduler = ReviewScheduler(**kwargs)
+    scheduler.review(prompt, 0.2, now - 60)
+    scheduler.review(prompt, 0.2, now)
+    return scheduler
+
+
+def test_scheduled_after_min_failures():
+    scheduler = ReviewScheduler()
+    assert scheduler.review("hello", 0.2, NOW) is None
+    assert scheduler.due(5, NOW + DAY) == []
+    # Successes before the prompt is weak do not schedule it either
+    assert scheduler.review("hello", 0.9, NOW + 1) is None
+    assert scheduler.review("hello", 0.2, NOW + 2) == NOW + 2
+    # Due right away, so a lesson straight after re-drills it
+    assert scheduler.due(5, NOW + 2) == ["hello"]
+
+
+def test_interval_growth():
+    scheduler = scheduled()
+    assert scheduler.review("hello", 1.0, NOW) == NOW + DAY
+    assert scheduler.review("hello", 1.0, NOW) == NOW + 6 * DAY
+    _, interval, ease, reps = scheduler.entries["hello"]
+    assert reps == 2
+    due = scheduler.review("hello", 1.0, NOW)
+    assert due == pytest.approx(NOW + interval * (ease + 0.1))
+    assert scheduler.entries["hello"][2] == pytest.approx(ease + 0.1)
+
+
+def test_lapse_resets_interval_and_lowers_ease():
+    scheduler = scheduled(relearn_seconds=300)
+    scheduler.review("hello", 1.0, NOW)
+    scheduler.review("hello", 1.0, NOW)
+    ease = scheduler.entries["hello"][2]
+    assert scheduler.review("hello", 0.1, NOW) == NOW + 300
+    _, interval, new_ease, reps = scheduler.entries["hello"]
+    assert (interval, reps) == (300, 0)
+    assert new_ease < ease
+    for _ in range(20):
+        scheduler.review("hello", 0.0, NOW)
+    assert scheduler.entries["hello"][2] == 1.3
+
+
+def test_due_order_and_exclusion():
+    scheduler = ReviewScheduler(min_failures=1)
+    for i, prompt in enumerate(["c", "a", "b", "later"]):
+        scheduler.review(prompt, 0.1, NOW + i)
+    scheduler.review("later", 1.0, NOW + 10)
+
+    assert scheduler.due(10, NOW + 60) == ["c", "a", "b"]
+    assert scheduler.due(2, NOW + 60) == ["c", "a"]
+    assert scheduler.due(2, NOW + 60, exclude=[{"c"}, ["b"]]) == ["a"]
+    assert scheduler.due(10, NOW + 1) == ["c", "a"]
+    # Picking does not reschedule
+    assert scheduler.due(10, NOW + 60) == ["c", "a", "b"]
+
+    scheduler.remove("a")
+    assert scheduler.due(10, NOW + 60) == ["c", "b"]
+
+
+def test_same_time_reviews_are_picked_once():
+    scheduler = scheduled()
+    scheduler.review("hello", 0.1, NOW)
+    assert scheduler.due(5, NOW) == ["hello"]
+
+
+def test_save_and_load(tmp_path):
+    scheduler = scheduled()
+    scheduler.review("once", 0.1, NOW)
+    path = str(tmp_path / "schedule.json")
+    scheduler.save(path, 7)
+
+    loaded = ReviewScheduler()
+    assert not loaded.load(path, 8)
+    assert loaded.load(path, 7)
+    assert loaded.entries == scheduler.entries
+    assert loaded.failed == {"once": 1}
+    assert loaded.review("once", 0.1, NOW) == NOW